@@ -1,9 +1,9 @@
 from django.contrib import admin
-from .models import JournalEntry, Comment, PathEvent, PathEventRegistration, PathEventComment, DiaryPage, DiaryComment, MediaItem, AboutPage
+from .models import JournalEntry, Comment, PathEvent, PathEventRegistration, PathEventComment, DiaryPage, DiaryComment, MediaItem, AboutPage, ImageJob, StoredBlob, UploadSession
 
 @admin.register(JournalEntry)
 class JournalEntryAdmin(admin.ModelAdmin):
-    list_display = ['title', 'author', 'is_published', 'created_at']
+    list_display = ['title', 'author', 'is_published', 'comment_count', 'created_at']
     list_filter = ['is_published', 'created_at']
     search_fields = ['title', 'content']
 
@@ -15,7 +15,7 @@ class CommentAdmin(admin.ModelAdmin):
 
 @admin.register(PathEvent)
 class PathEventAdmin(admin.ModelAdmin):
-    list_display = ['title', 'event_type', 'event_date', 'location', 'is_published', 'created_by']
+    list_display = ['title', 'event_type', 'event_date', 'location', 'participant_count', 'comment_count', 'is_published', 'created_by']
     list_filter = ['event_type', 'is_published', 'event_date']
     search_fields = ['title', 'description', 'location']
     date_hierarchy = 'event_date'
@@ -23,8 +23,8 @@ class PathEventAdmin(admin.ModelAdmin):
 
 @admin.register(PathEventRegistration)
 class PathEventRegistrationAdmin(admin.ModelAdmin):
-    list_display = ['event', 'user', 'joined_at']
-    list_filter = ['joined_at']
+    list_display = ['event', 'user', 'status', 'joined_at']
+    list_filter = ['status', 'joined_at']
 
 
 @admin.register(PathEventComment)
@@ -36,7 +36,7 @@ class PathEventCommentAdmin(admin.ModelAdmin):
 
 @admin.register(DiaryPage)
 class DiaryPageAdmin(admin.ModelAdmin):
-    list_display = ['title', 'author', 'status', 'created_at']
+    list_display = ['title', 'author', 'status', 'comment_count', 'created_at']
     list_filter = ['status', 'created_at']
     search_fields = ['title', 'content']
     date_hierarchy = 'created_at'
@@ -51,9 +51,9 @@ class DiaryCommentAdmin(admin.ModelAdmin):
 
 @admin.register(MediaItem)
 class MediaItemAdmin(admin.ModelAdmin):
-    list_display = ['title', 'file', 'uploaded_by', 'created_at']
+    list_display = ['title', 'original_name', 'file', 'uploaded_by', 'created_at']
     list_filter = ['created_at']
-    search_fields = ['title', 'file']
+    search_fields = ['title', 'original_name', 'file']
 
 
 @admin.register(AboutPage)
@@ -72,3 +72,24 @@ class AboutPageAdmin(admin.ModelAdmin):
         return bool(obj.image)
     has_image.boolean = True
     has_image.short_description = 'Has image'
+
+
+@admin.register(ImageJob)
+class ImageJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'model_label', 'object_id', 'field_name', 'status', 'attempts', 'run_after', 'updated_at']
+    list_filter = ['status', 'model_label']
+    search_fields = ['file_name', 'last_error']
+    readonly_fields = ['created_at', 'updated_at']
+
+
+@admin.register(StoredBlob)
+class StoredBlobAdmin(admin.ModelAdmin):
+    list_display = ['name', 'size', 'refcount', 'created_at']
+    search_fields = ['name']
+    readonly_fields = ['name', 'size', 'refcount', 'created_at']
+
+
+@admin.register(UploadSession)
+class UploadSessionAdmin(admin.ModelAdmin):
+    list_display = ['filename', 'uploaded_by', 'offset', 'size', 'updated_at']
+    readonly_fields = ['id', 'uploaded_by', 'filename', 'size', 'offset', 'created_at', 'updated_at']
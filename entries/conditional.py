@@ -0,0 +1,78 @@
+"""
+Conditional GET (ETag / Last-Modified) for the detail pages.
+
+Before the view runs, a single query reads the row's updated_at plus, for each
+related list shown on the page (comments, registrations), the newest timestamp
+and the row count (the count catches deletions). If the browser already has
+that version it gets a 304 and nothing is rendered.
+
+The ETag also covers who is looking (user id and staff flag), since the page
+shows different controls to different people. Responses are marked
+`private, no-cache` so browsers revalidate every time and shared caches
+don't keep per-user pages.
+"""
+import hashlib
+from functools import wraps
+
+from django.db.models import Count, IntegerField, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from .page_cache import has_pending_messages
+
+
+def _related_subqueries(model, relation, timestamp_field):
+    field = model._meta.get_field(relation)
+    related = field.related_model.objects.filter(**{field.field.name: OuterRef('pk')}).order_by()
+    grouped = related.values(field.field.name)
+    latest = Subquery(grouped.annotate(latest=Max(timestamp_field)).values('latest')[:1])
+    count = Coalesce(
+        Subquery(grouped.annotate(n=Count('pk')).values('n')[:1], output_field=IntegerField()), 0
+    )
+    return latest, count
+
+
+def content_state(model, pk, relations):
+    """[updated_at, latest, count, latest, count, ...] for the row, or None if it doesn't exist."""
+    annotations = {}
+    for relation, timestamp_field in relations:
+        latest, count = _related_subqueries(model, relation, timestamp_field)
+        annotations[f'{relation}_latest'] = latest
+        annotations[f'{relation}_count'] = count
+    row = model.objects.filter(pk=pk).annotate(**annotations).values('updated_at', *annotations).first()
+    return list(row.values()) if row else None
+
+
+def viewer_key(request):
+    user = request.user
+    return f'{user.pk}:{int(user.is_staff)}' if user.is_authenticated else 'anon'
+
+
+def conditional_detail(model, *relations):
+    """
+    Decorate a `view(request, pk)` so unchanged pages return 304. `relations` are
+    (related_name, timestamp field) pairs for the lists the page shows.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, pk, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD') or has_pending_messages(request):
+                return view(request, pk, *args, **kwargs)
+            state = content_state(model, pk, relations)
+            if state is None:
+                return view(request, pk, *args, **kwargs)  # let the view 404
+            raw = '|'.join(str(part) for part in (*state, viewer_key(request)))
+            etag = quote_etag(hashlib.md5(raw.encode(), usedforsecurity=False).hexdigest())
+            last_modified = int(max(value for value in state if hasattr(value, 'timestamp')).timestamp())
+
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = view(request, pk, *args, **kwargs)
+            if response.status_code in (200, 304):
+                response['ETag'] = etag
+                response['Last-Modified'] = http_date(last_modified)
+                patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return wrapper
+    return decorator
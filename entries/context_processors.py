@@ -0,0 +1,8 @@
+from django.utils.functional import SimpleLazyObject
+
+from .models import AboutPage
+
+
+def about(request):
+    """`site_about` in every template; only read (from the cache) when a template uses it."""
+    return {'site_about': SimpleLazyObject(AboutPage.load)}
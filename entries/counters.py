@@ -0,0 +1,64 @@
+"""
+Denormalized counters: comment_count on entries, diary pages and events, and
+participant_count on events.
+
+post_save (created) / post_delete of the child rows (see entries/signals.py)
+bump the parent's column with a single UPDATE ... SET n = n ± 1, so concurrent
+comments or joins can't lose increments and list/detail pages read the
+number without COUNT(*). `manage.py reconcile_counters` recomputes them from
+the child tables if they ever drift (raw SQL, restores from backup, ...).
+"""
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+# (child model name, FK field on the child, parent model name, counter column,
+#  field values a child row needs to be counted)
+COUNTERS = (
+    ('Comment', 'entry', 'JournalEntry', 'comment_count', {}),
+    ('DiaryComment', 'page', 'DiaryPage', 'comment_count', {}),
+    ('PathEventComment', 'event', 'PathEvent', 'comment_count', {}),
+    # Waitlisted registrations don't take a place (see entries/registrations.py).
+    ('PathEventRegistration', 'event', 'PathEvent', 'participant_count', {'status': 'confirmed'}),
+)
+
+
+def is_counted(instance, conditions):
+    return all(getattr(instance, name) == value for name, value in conditions.items())
+
+
+def adjust(parent_model, parent_id, field, delta):
+    if delta > 0:
+        value = F(field) + delta
+    else:
+        value = Greatest(F(field) + delta, Value(0))
+    parent_model.objects.filter(pk=parent_id).update(**{field: value})
+
+
+def actual_counts(child_model, fk_name, conditions):
+    """Subquery: number of counted child rows pointing at the outer parent row."""
+    return Coalesce(
+        Subquery(
+            child_model.objects.filter(**{fk_name: OuterRef('pk')}, **conditions).order_by()
+            .values(fk_name).annotate(n=Count('pk')).values('n')[:1],
+            output_field=IntegerField(),
+        ),
+        0,
+    )
+
+
+def reconcile(get_model, dry_run=False):
+    """
+    Fix every counter from the child tables; `get_model(name)` resolves model names.
+    Returns {(parent, field): rows that were wrong}.
+    """
+    results = {}
+    for child_name, fk_name, parent_name, field, conditions in COUNTERS:
+        child, parent = get_model(child_name), get_model(parent_name)
+        wrong = parent.objects.annotate(actual=actual_counts(child, fk_name, conditions)).exclude(**{field: F('actual')})
+        if dry_run:
+            results[(parent_name, field)] = wrong.count()
+        else:
+            results[(parent_name, field)] = parent.objects.filter(pk__in=wrong.values('pk')).update(
+                **{field: actual_counts(child, fk_name, conditions)}
+            )
+    return results
@@ -0,0 +1,111 @@
+"""
+Month calendar for Define Your Path.
+
+One query fetches every event that overlaps the displayed month plus every
+upcoming event; the month grid, the upcoming list and (when the month
+already contains enough of them) the recent/past list are all built from
+that single result set. Events are bucketed by local day, and multi-day
+events appear on every day between event_date and event_end_date.
+"""
+import calendar
+from datetime import datetime, timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+
+PAST_EVENTS_LIMIT = 5
+
+
+def parse_month(year, month, now):
+    """Validated (year, month) from query-string values; falls back to the current month."""
+    try:
+        year = int(year)
+        month = int(month)
+        if not 1 <= year < 9999:
+            raise ValueError(year)
+        datetime(year, month, 1)
+    except (ValueError, TypeError, OverflowError):
+        local_now = timezone.localtime(now)
+        return local_now.year, local_now.month
+    return year, month
+
+
+def month_bounds(year, month):
+    """Aware [start, end) datetimes for the month in the current timezone."""
+    start = timezone.make_aware(datetime(year, month, 1))
+    if month == 12:
+        end = timezone.make_aware(datetime(year + 1, 1, 1))
+    else:
+        end = timezone.make_aware(datetime(year, month + 1, 1))
+    return start, end
+
+
+def overlaps(start, end):
+    """Q for events that are on at any point in [start, end)."""
+    return Q(event_date__lt=end) & (
+        Q(event_date__gte=start) | Q(event_end_date__gte=start)
+    )
+
+
+def bucket_by_day(events, year, month):
+    """{day_of_month: [events]} with one localtime() per start/end date."""
+    first = datetime(year, month, 1).date()
+    last = first.replace(day=calendar.monthrange(year, month)[1])
+    by_day = {}
+    for event in events:
+        start = timezone.localtime(event.event_date).date()
+        end = timezone.localtime(event.event_end_date).date() if event.event_end_date else start
+        day = max(start, first)
+        end = min(max(end, start), last)
+        while day <= end:
+            by_day.setdefault(day.day, []).append(event)
+            day += timedelta(days=1)
+    return by_day
+
+
+def build_month(base_events, year, month, now, past_limit=PAST_EVENTS_LIMIT):
+    """Template context for the calendar page (grid, navigation, upcoming and past lists)."""
+    month_start, month_end = month_bounds(year, month)
+    events = list(
+        base_events.filter(overlaps(month_start, month_end) | Q(event_date__gte=now)).order_by('event_date', 'pk')
+    )
+
+    upcoming_events = [event for event in events if event.event_date >= now]
+    month_events = [
+        event for event in events
+        if event.event_date < month_end and (event.event_end_date or event.event_date) >= month_start
+    ]
+
+    # The fetch holds every event that started in [month_start, now) when the
+    # displayed month contains `now`; reuse it if that's enough for the list.
+    past_in_window = [event for event in events if month_start <= event.event_date < now][::-1]
+    if month_start <= now < month_end and len(past_in_window) >= past_limit:
+        past_events = past_in_window[:past_limit]
+    else:
+        past_events = list(base_events.filter(event_date__lt=now).order_by('-event_date')[:past_limit])
+
+    events_by_date = bucket_by_day(month_events, year, month)
+    # Sunday first, matching the template's header row.
+    weeks = calendar.Calendar(firstweekday=calendar.SUNDAY).monthdayscalendar(year, month)
+    calendar_with_events = [
+        [{'day': day, 'events': events_by_date.get(day, []) if day else []} for day in week]
+        for week in weeks
+    ]
+
+    prev_year, prev_month = (year - 1, 12) if month == 1 else (year, month - 1)
+    next_year, next_month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+    return {
+        'upcoming_events': upcoming_events,
+        'past_events': past_events,
+        'calendar': weeks,
+        'calendar_with_events': calendar_with_events,
+        'events_by_date': events_by_date,
+        'year': year,
+        'month': month,
+        'month_name': calendar.month_name[month],
+        'prev_month': prev_month,
+        'prev_year': prev_year,
+        'next_month': next_month,
+        'next_year': next_year,
+    }
@@ -0,0 +1,149 @@
+"""
+Stored image renditions for responsive <img srcset>.
+
+After the background job has resized an upload (see entries/tasks.py), it
+writes smaller copies next to it and records them in the model's
+`image_renditions` JSON field:
+
+    {'thumb': {'name': ..., 'width': 400, 'height': 300, 'formats': {'webp': ..., 'avif': ...}},
+     'medium': {...},
+     'full': {...}}        # 'full' is the resized upload itself
+
+Until that happens the field is empty and templates fall back to image.url.
+
+Every rendition also gets modern-format copies stored as `<name>.webp` /
+`<name>.avif` (AVIF only when Pillow was built with it). Templates keep
+linking the JPEG; the media view (entries/media.py) swaps in the best copy
+the browser's Accept header allows.
+"""
+import os
+from io import BytesIO
+
+from PIL import Image, features
+from django.core.files.base import ContentFile
+
+from .storage import is_blob_name
+
+# (label, max width/height) for the generated copies, smallest first.
+RENDITION_SIZES = (
+    ('thumb', 400),
+    ('medium', 800),
+)
+FULL = 'full'
+JPEG_QUALITY = 85
+
+# (extension, Pillow format, save options, MIME type), most preferred first.
+ALTERNATE_FORMATS = (
+    ('avif', 'AVIF', {'quality': 60}, 'image/avif'),
+    ('webp', 'WEBP', {'quality': 80, 'method': 4}, 'image/webp'),
+)
+NEGOTIABLE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+
+def available_formats():
+    return [fmt for fmt in ALTERNATE_FORMATS if features.check(fmt[1].lower())]
+
+
+def alternate_name(name, ext):
+    return f'{name}.{ext}'
+
+
+def write_alternates(storage, name, img):
+    """Store `img` in every available modern format next to `name`; returns {ext: stored name}."""
+    stored = {}
+    for ext, pil_format, options, _ in available_formats():
+        target = alternate_name(name, ext)
+        buffer = BytesIO()
+        try:
+            img.save(buffer, format=pil_format, **options)
+        except (OSError, ValueError):
+            continue  # encoder present but unusable for this image
+        if is_blob_name(target):
+            stored[ext] = storage.save(target, ContentFile(buffer.getvalue()))
+        else:
+            # Next to an upload from before the blob store, where negotiate() looks for it.
+            stored[ext] = storage.save_alongside(target, ContentFile(buffer.getvalue()))
+    return stored
+
+
+def rendition_name(name, label, ext='jpg'):
+    stem, _ = os.path.splitext(name)
+    return f'{stem}.{label}.{ext}'
+
+
+def make_renditions(field):
+    """Write the smaller copies of `field` to its storage and return the renditions dict."""
+    storage = field.storage
+    with storage.open(field.name, 'rb') as fh:
+        img = Image.open(fh)
+        img.load()
+    if img.mode in ('RGBA', 'P'):
+        img = img.convert('RGB')
+
+    renditions = {FULL: {
+        'name': field.name, 'width': img.width, 'height': img.height,
+        'formats': write_alternates(storage, field.name, img),
+    }}
+    for label, size in RENDITION_SIZES:
+        if img.width <= size and img.height <= size:
+            continue  # the full image is already this small
+        copy = img.copy()
+        copy.thumbnail((size, size))
+        buffer = BytesIO()
+        copy.save(buffer, format='JPEG', quality=JPEG_QUALITY)
+        name = storage.save(rendition_name(field.name, label), ContentFile(buffer.getvalue()))
+        renditions[label] = {
+            'name': name, 'width': copy.width, 'height': copy.height,
+            'formats': write_alternates(storage, name, copy),
+        }
+    return renditions
+
+
+def delete_renditions(storage, renditions):
+    """Remove generated copies (never the 'full' entry's own file, which is the upload itself)."""
+    for label, info in (renditions or {}).items():
+        for name in info.get('formats', {}).values():
+            storage.delete(name)
+        if label != FULL:
+            storage.delete(info['name'])
+
+
+def parse_accept(header):
+    """MIME types from an Accept header that the client didn't refuse with q=0."""
+    accepted = set()
+    for part in (header or '').split(','):
+        mime, _, params = part.strip().partition(';')
+        quality = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    pass
+        if mime and quality > 0:
+            accepted.add(mime.strip().lower())
+    return accepted
+
+
+def negotiate(name, accept_header, exists):
+    """
+    Best stored variant of `name` for the Accept header: `name.avif`, `name.webp`
+    or `name` itself. `exists` checks whether a storage name is present.
+    Returns (name, content_type or None).
+    """
+    if not name.lower().endswith(NEGOTIABLE_EXTENSIONS):
+        return name, None
+    accepted = parse_accept(accept_header)
+    for ext, _, _, mime in ALTERNATE_FORMATS:
+        if mime in accepted:
+            candidate = alternate_name(name, ext)
+            if exists(candidate):
+                return candidate, mime
+    return name, None
+
+
+def srcset(storage, renditions):
+    """'url 400w, url 800w, ...' for the stored renditions, smallest first."""
+    ordered = sorted((renditions or {}).values(), key=lambda info: info['width'])
+    return ', '.join(f"{storage.url(info['name'])} {info['width']}w" for info in ordered)
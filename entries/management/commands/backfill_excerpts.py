@@ -0,0 +1,28 @@
+"""
+Management command to (re)compute the stored excerpts shown on list cards.
+Run after changing excerpt length, or if rows were written with raw SQL.
+"""
+from django.core.management.base import BaseCommand
+
+from entries.models import JournalEntry, DiaryPage, PathEvent, backfill_excerpts
+
+
+class Command(BaseCommand):
+    help = 'Fills the excerpt column for journal entries, diary pages and path events'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Recompute every row, not just empty excerpts')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        for model in (JournalEntry, DiaryPage, PathEvent):
+            updated = backfill_excerpts(
+                model,
+                model.excerpt_source,
+                model.excerpt_words,
+                batch_size=options['batch_size'],
+                only_missing=not options['all'],
+            )
+            self.stdout.write(
+                self.style.SUCCESS(f'{model._meta.verbose_name_plural}: {updated} excerpt(s) updated')
+            )
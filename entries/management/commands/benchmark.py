@@ -0,0 +1,154 @@
+"""
+Management command that requests every URL in journal/urls.py through the
+Django test client and reports latency (p50/p95) and query count per view.
+
+    python manage.py seed_data                     # once, on a scratch database
+    python manage.py benchmark --json bench.json   # record a baseline
+    python manage.py benchmark --baseline bench.json
+
+Each named route is requested as an anonymous visitor and as a staff user
+(seed_user_0 from seed_data, or --username), with URL arguments filled from
+existing rows. Only GET is sent, so POST-only views show their redirect and
+nothing is modified (the two routes that act on GET are skipped). Server
+errors are reported, not raised. With --baseline the command fails when a
+view's p95 grew by more than --tolerance percent or it runs more queries
+than before, so a regression shows up before deploying.
+"""
+import json
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, get_resolver, reverse
+
+from entries.management.commands.seed_data import USERNAME_PREFIX
+from entries.models import JournalEntry, PathEvent, DiaryPage, MediaItem, UploadSession
+
+# Uploaded files, and routes that change state even on GET (logging the staff
+# client out, flipping an entry's published flag).
+SKIPPED_ROUTES = {'media_file', 'logout', 'entry_toggle_publish'}
+
+# URL kwarg values per route prefix, resolved against the database.
+SAMPLE_OBJECTS = (
+    (('entry_', 'add_comment'), lambda: JournalEntry.objects.filter(is_published=True).order_by('-comment_count')),
+    (('path_event_',), lambda: PathEvent.objects.filter(is_published=True).order_by('-participant_count')),
+    (('diary_page_',), lambda: DiaryPage.objects.filter(status='public').order_by('-comment_count')),
+    (('media_upload_',), lambda: UploadSession.objects.order_by('-updated_at')),
+    (('media_',), lambda: MediaItem.objects.order_by('-created_at')),
+)
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def named_routes():
+    """Names of the project's own routes that take no arguments or a single object id."""
+    for pattern in get_resolver().url_patterns:
+        if isinstance(pattern, URLPattern) and pattern.name and pattern.name not in SKIPPED_ROUTES:
+            yield pattern.name, list(pattern.pattern.converters)
+
+
+def sample_kwargs(name, params):
+    if not params:
+        return {}
+    for prefixes, queryset in SAMPLE_OBJECTS:
+        if name.startswith(prefixes):
+            pk = queryset().values_list('pk', flat=True).first()
+            if pk is None:
+                return None
+            return {params[0]: pk}
+    return None
+
+
+class Command(BaseCommand):
+    help = 'Requests every page through the test client and reports p50/p95 latency and query counts per view'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20, help='Timed requests per URL (default 20)')
+        parser.add_argument('--warmup', type=int, default=2, help='Untimed requests per URL first')
+        parser.add_argument('--username', help=f'Staff user to log in as (default {USERNAME_PREFIX}0)')
+        parser.add_argument('--anonymous-only', action='store_true')
+        parser.add_argument('--no-page-cache', action='store_true', help='Measure anonymous pages without the page cache')
+        parser.add_argument('--json', help='Write the results to this file')
+        parser.add_argument('--baseline', help='Compare with results written earlier by --json')
+        parser.add_argument('--tolerance', type=float, default=25.0, help='Allowed p95 growth against --baseline, percent')
+
+    def handle(self, *args, **options):
+        clients = {'anonymous': Client(raise_request_exception=False)}
+        if not options['anonymous_only']:
+            username = options['username'] or f'{USERNAME_PREFIX}0'
+            user = User.objects.filter(username=username).first()
+            if user is None:
+                raise CommandError(f'No user {username!r}; run seed_data or pass --username.')
+            clients['staff'] = Client(raise_request_exception=False)
+            clients['staff'].force_login(user)
+
+        overrides = {'ALLOWED_HOSTS': ['testserver']}
+        if options['no_page_cache']:
+            overrides['PAGE_CACHE_TIMEOUT'] = 0
+        results = {}
+        with override_settings(**overrides):
+            for name, params in named_routes():
+                kwargs = sample_kwargs(name, params)
+                if kwargs is None:
+                    self.stdout.write(self.style.WARNING(f'{name}: skipped, no row to request'))
+                    continue
+                url = reverse(name, kwargs=kwargs)
+                for role, client in clients.items():
+                    results[f'{name} [{role}]'] = self.measure(client, url, options['requests'], options['warmup'])
+
+        self.report(results)
+        if options['json']:
+            with open(options['json'], 'w') as fh:
+                json.dump(results, fh, indent=2, sort_keys=True)
+        if options['baseline']:
+            self.compare(results, options['baseline'], options['tolerance'])
+
+    def measure(self, client, url, requests, warmup):
+        for _ in range(warmup):
+            client.get(url)
+        timings, queries, statuses = [], [], set()
+        for _ in range(max(requests, 1)):
+            with CaptureQueriesContext(connection) as ctx:
+                start = time.perf_counter()
+                response = client.get(url)
+                timings.append((time.perf_counter() - start) * 1000)
+            queries.append(len(ctx.captured_queries))
+            statuses.add(response.status_code)
+        return {
+            'url': url,
+            'status': sorted(statuses),
+            'p50_ms': round(statistics.median(timings), 2),
+            'p95_ms': round(percentile(timings, 0.95), 2),
+            'queries': max(queries),
+        }
+
+    def report(self, results):
+        width = max((len(label) for label in results), default=10)
+        self.stdout.write(f'{"view":<{width}}  {"status":>7}  {"p50 ms":>8}  {"p95 ms":>8}  {"queries":>7}')
+        for label, result in results.items():
+            status = ','.join(str(code) for code in result['status'])
+            line = f'{label:<{width}}  {status:>7}  {result["p50_ms"]:>8.1f}  {result["p95_ms"]:>8.1f}  {result["queries"]:>7}'
+            self.stdout.write(self.style.ERROR(line) if any(code >= 500 for code in result['status']) else line)
+
+    def compare(self, results, path, tolerance):
+        with open(path) as fh:
+            baseline = json.load(fh)
+        regressions = []
+        for label, result in results.items():
+            before = baseline.get(label)
+            if before is None:
+                continue
+            if result['p95_ms'] > before['p95_ms'] * (1 + tolerance / 100):
+                regressions.append(f'{label}: p95 {before["p95_ms"]:.1f} -> {result["p95_ms"]:.1f} ms')
+            if result['queries'] > before['queries']:
+                regressions.append(f'{label}: queries {before["queries"]} -> {result["queries"]}')
+        if regressions:
+            raise CommandError('Slower than the baseline:\n' + '\n'.join(regressions))
+        self.stdout.write(self.style.SUCCESS(f'No regressions against {path} (tolerance {tolerance:g}%)'))
@@ -0,0 +1,169 @@
+"""
+Management command that checks MEDIA_ROOT against the database:
+
+- orphans: files no row points at (left behind by old deletes/replacements),
+- dangling references: rows whose file is missing (the broken images in RAILWAY_MEDIA.md),
+- blob refcounts in StoredBlob that no longer match the references.
+
+Nothing is changed unless --delete / --clear-dangling / --fix-refcounts is given.
+Files and blobs are looked up in the database a batch at a time, so memory use
+stays flat however large the media store grows.
+Unfinished chunked uploads are left to their own expiry (--delete purges stale ones).
+"""
+import os
+import time
+from collections import Counter
+from itertools import islice
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import models
+from django.db.models import Q
+from django.template.defaultfilters import filesizeformat
+
+from entries import images, uploads
+from entries.models import StoredBlob
+
+# Names checked against the database per round of queries; memory use is
+# bounded by this, not by the size of the media store.
+BATCH_SIZE = 500
+
+
+def file_fields():
+    for model in apps.get_models():
+        for field in model._meta.concrete_fields:
+            if isinstance(field, models.FileField):
+                yield model, field
+
+
+def has_renditions(model, field):
+    return field.name == 'image' and any(f.name == 'image_renditions' for f in model._meta.concrete_fields)
+
+
+def rendition_lookups():
+    """JSON paths in image_renditions that hold a stored name (see entries/images.py)."""
+    labels = [images.FULL] + [label for label, _ in images.RENDITION_SIZES]
+    for label in labels:
+        if label != images.FULL:  # the full rendition is the image itself
+            yield f'image_renditions__{label}__name'
+        for ext, _, _, _ in images.ALTERNATE_FORMATS:
+            yield f'image_renditions__{label}__formats__{ext}'
+
+
+def reference_counts(names):
+    """Counter of how many times the database refers to each of `names` (one batch)."""
+    names = list(names)
+    wanted = set(names)
+    references = Counter()
+    for model, field in file_fields():
+        rows = model._default_manager.filter(**{f'{field.name}__in': names})
+        references.update(rows.values_list(field.name, flat=True).iterator())
+        if not has_renditions(model, field):
+            continue
+        mentions = Q()
+        for lookup in rendition_lookups():
+            mentions |= Q(**{f'{lookup}__in': names})
+        rows = model._default_manager.filter(mentions).values_list('image_renditions', flat=True)
+        for renditions in rows.iterator():
+            for label, info in renditions.items():
+                if label != images.FULL and info['name'] in wanted:
+                    references[info['name']] += 1
+                references.update(name for name in info.get('formats', {}).values() if name in wanted)
+    return references
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def walk(root, skip=()):
+    """Yield (relative name, os.stat) for every file below root without building a list."""
+    stack = [root]
+    while stack:
+        with os.scandir(stack.pop()) as it:
+            for entry in it:
+                if entry.path in skip:
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    name = os.path.relpath(entry.path, root).replace(os.sep, '/')
+                    yield name, entry.stat(follow_symlinks=False)
+
+
+class Command(BaseCommand):
+    help = 'Reports (and optionally removes) orphaned media files and dangling file references'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--delete', action='store_true', help='Delete orphaned files')
+        parser.add_argument('--clear-dangling', action='store_true', help='Blank file fields whose file is missing')
+        parser.add_argument('--fix-refcounts', action='store_true', help='Rewrite StoredBlob refcounts from the database')
+        parser.add_argument(
+            '--min-age', type=float, default=24,
+            help='Only treat files older than this many hours as orphans (protects in-flight uploads)',
+        )
+        parser.add_argument('--list', action='store_true', help='Print every orphan and dangling reference')
+
+    def handle(self, *args, **options):
+        root = str(settings.MEDIA_ROOT)
+        cutoff = time.time() - options['min_age'] * 3600
+
+        orphan_count = orphan_bytes = total_bytes = 0
+        if os.path.isdir(root):
+            files = walk(root, skip={os.path.join(root, uploads.UPLOAD_DIR)})
+            for batch in batched(files, BATCH_SIZE):
+                references = reference_counts(name for name, _ in batch)
+                for name, st in batch:
+                    total_bytes += st.st_size
+                    if name in references or st.st_mtime > cutoff:
+                        continue
+                    orphan_count += 1
+                    orphan_bytes += st.st_size
+                    if options['list']:
+                        self.stdout.write(f'orphan  {name} ({filesizeformat(st.st_size)})')
+                    if options['delete']:
+                        os.remove(os.path.join(root, name))
+                        StoredBlob.objects.filter(name=name).delete()
+
+        dangling = 0
+        for model, field in file_fields():
+            rows = model._default_manager.exclude(**{field.name: ''}).exclude(**{f'{field.name}__isnull': True})
+            for pk, name in rows.values_list('pk', field.name).iterator(chunk_size=2000):
+                if os.path.isfile(os.path.join(root, name)):
+                    continue
+                dangling += 1
+                if options['list']:
+                    self.stdout.write(f'missing {name} ({model._meta.label} #{pk}.{field.name})')
+                if options['clear_dangling']:
+                    updates = {field.name: ''}
+                    if has_renditions(model, field):
+                        updates['image_renditions'] = {}
+                    model._default_manager.filter(pk=pk).update(**updates)
+
+        if options['delete']:
+            purged = uploads.purge_stale_sessions()
+            if purged:
+                self.stdout.write(f'Abandoned uploads removed: {purged}')
+
+        mismatched = 0
+        blobs = StoredBlob.objects.only('pk', 'name', 'refcount').order_by('pk').iterator(chunk_size=2000)
+        for batch in batched(blobs, BATCH_SIZE):
+            references = reference_counts(blob.name for blob in batch)
+            for blob in batch:
+                if blob.refcount != references[blob.name]:
+                    mismatched += 1
+                    if options['fix_refcounts']:
+                        StoredBlob.objects.filter(pk=blob.pk).update(refcount=references[blob.name])
+
+        action = 'deleted' if options['delete'] else 'found (dry run, use --delete)'
+        self.stdout.write(f'Media on disk: {filesizeformat(total_bytes)}')
+        self.stdout.write(
+            self.style.SUCCESS(f'Orphans {action}: {orphan_count} file(s), {filesizeformat(orphan_bytes)}')
+        )
+        style = self.style.WARNING if dangling else self.style.SUCCESS
+        self.stdout.write(style(f'Dangling references: {dangling}' + (' (cleared)' if options['clear_dangling'] else '')))
+        style = self.style.WARNING if mismatched else self.style.SUCCESS
+        self.stdout.write(style(f'Blob refcount mismatches: {mismatched}' + (' (fixed)' if options['fix_refcounts'] else '')))
@@ -0,0 +1,64 @@
+"""
+Management command that moves uploads made before the content-addressed storage
+into blobs/, so existing duplicates collapse into a single file. Media items
+keep the name they were uploaded under in original_name.
+Afterwards run `process_image_jobs --enqueue-missing` to rebuild renditions.
+"""
+import os
+
+from django.core.files import File
+from django.core.management.base import BaseCommand
+from django.db import models
+
+from entries import images
+from entries.models import JournalEntry, PathEvent, DiaryPage, MediaItem, AboutPage
+from entries.storage import is_blob_name
+
+
+class Command(BaseCommand):
+    help = 'Moves legacy uploads into the content-addressed blob store'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would move')
+
+    def handle(self, *args, **options):
+        moved = missing = 0
+        for model in (JournalEntry, PathEvent, DiaryPage, MediaItem, AboutPage):
+            file_fields = [f for f in model._meta.concrete_fields if isinstance(f, models.FileField)]
+            for field in file_fields:
+                rows = (
+                    model.objects.exclude(**{field.name: ''}).exclude(**{f'{field.name}__isnull': True})
+                    .exclude(**{f'{field.name}__startswith': 'blobs/'})
+                )
+                has_renditions = hasattr(model, 'image_renditions') and field.name == 'image'
+                # The blob name is a hash, so keep what the file was called.
+                keeps_name = model is MediaItem and field.name == 'file'
+                only = ['pk', field.name] + (['image_renditions'] if has_renditions else [])
+                only += ['original_name'] if keeps_name else []
+                for row in rows.only(*only).iterator():
+                    fieldfile = getattr(row, field.name)
+                    storage = fieldfile.storage
+                    old_name = fieldfile.name
+                    if is_blob_name(old_name):
+                        continue
+                    if not storage.exists(old_name):
+                        missing += 1
+                        self.stdout.write(self.style.WARNING(f'Missing: {old_name} ({model.__name__} #{row.pk})'))
+                        continue
+                    if options['dry_run']:
+                        moved += 1
+                        self.stdout.write(f'Would move {old_name}')
+                        continue
+                    with storage.open(old_name, 'rb') as fh:
+                        new_name = storage.save(old_name, File(fh, name=old_name))
+                    updates = {field.name: new_name}
+                    if has_renditions:
+                        images.delete_renditions(storage, row.image_renditions)
+                        updates['image_renditions'] = {}
+                    if keeps_name and not row.original_name:
+                        updates['original_name'] = os.path.basename(old_name)[:255]
+                    model.objects.filter(pk=row.pk).update(**updates)
+                    storage.delete(old_name)
+                    moved += 1
+        verb = 'Would move' if options['dry_run'] else 'Moved'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {moved} file(s); {missing} missing'))
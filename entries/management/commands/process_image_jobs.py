@@ -0,0 +1,33 @@
+"""
+Management command that runs the background upload queue (see entries/tasks.py).
+Run it as a separate worker process next to gunicorn, or with --once from cron.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from entries.tasks import enqueue_missing_metadata, enqueue_missing_renditions, process_jobs
+
+
+class Command(BaseCommand):
+    help = 'Processes queued image jobs (resizing uploads and reading media metadata in the background)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Drain the queue once and exit')
+        parser.add_argument('--sleep', type=float, default=2.0, help='Seconds to wait when the queue is empty')
+        parser.add_argument(
+            '--enqueue-missing', action='store_true',
+            help='First queue jobs for existing images without renditions and media without metadata',
+        )
+
+    def handle(self, *args, **options):
+        if options['enqueue_missing']:
+            queued = enqueue_missing_renditions() + enqueue_missing_metadata()
+            self.stdout.write(f'Queued {queued} image job(s) for existing uploads')
+        while True:
+            processed = process_jobs()
+            if processed:
+                self.stdout.write(f'Processed {processed} image job(s)')
+            if options['once']:
+                break
+            time.sleep(options['sleep'])
@@ -0,0 +1,21 @@
+"""
+Management command to rebuild the full-text search index from the source tables.
+Needed after loading data with raw SQL or bulk_create (which skip signals).
+"""
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+
+from entries import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the full-text search index for entries, diary pages and path events'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        with transaction.atomic(using=connection.alias):
+            search.rebuild(connection)
+        self.stdout.write(self.style.SUCCESS(f'Search index rebuilt ({connection.vendor})'))
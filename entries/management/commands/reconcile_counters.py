@@ -0,0 +1,30 @@
+"""
+Management command that recomputes the denormalized comment/participant
+counters (entries/counters.py) from the comment and registration tables.
+
+The counters are kept up to date by signals; run this after raw SQL changes,
+restores or bulk deletes that bypass them. --dry-run only reports.
+"""
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from entries import counters
+
+
+class Command(BaseCommand):
+    help = 'Recompute comment_count / participant_count columns from the underlying rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report wrong counters without fixing them')
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        results = counters.reconcile(lambda name: apps.get_model('entries', name), dry_run=dry_run)
+        for (model, field), wrong in results.items():
+            verb = 'wrong' if dry_run else 'fixed'
+            self.stdout.write(f'{model}.{field}: {wrong} {verb}')
+        total = sum(results.values())
+        if total and dry_run:
+            self.stdout.write(self.style.WARNING(f'{total} counter(s) out of date; run without --dry-run to fix'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'{total} counter(s) fixed' if total else 'All counters are correct'))
@@ -0,0 +1,255 @@
+"""
+Management command that fills the database with a realistic volume of
+synthetic data for benchmarking (see `manage.py benchmark`):
+
+    python manage.py seed_data                      # 100k entries and the rest to scale
+    python manage.py seed_data --entries 5000 --users 50
+
+Rows are written with bulk_create in batches, so signals don't run; the command
+fills in what they would have done afterwards (excerpts up front, then the
+comment/participant counters and the search index). Timestamps are spread over
+the past --days so cursor pagination and the calendar see realistic data.
+Seeded users are named `seed_user_<n>` and `--clear` deletes them with
+everything they own. Never run it against production.
+"""
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+from io import BytesIO
+
+from PIL import Image
+from django.apps import apps
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from entries import counters, search
+from entries.models import (
+    JournalEntry, Comment, PathEvent, PathEventRegistration, PathEventComment,
+    DiaryPage, DiaryComment, MediaItem, StoredBlob,
+)
+
+USERNAME_PREFIX = 'seed_user_'
+WORDS = (
+    'run trail morning sunrise coffee notes journey breath mile river hill quiet city friends '
+    'training rest focus gratitude ocean forest path step strength patience rain light community '
+    'stretch recovery goal race water mountain dusk rhythm story plan heart season week'
+).split()
+PLACEHOLDER_COLOURS = ('#d9825b', '#6b9080', '#a4c3b2', '#f6bd60', '#84a59d', '#5e6472')
+
+
+@contextmanager
+def explicit_timestamps(*models):
+    """Let bulk_create keep the created_at/updated_at/joined_at values we set."""
+    fields = [
+        field for model in models for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Command(BaseCommand):
+    help = 'Seeds users, entries, comments, events, registrations, diary pages and media items for benchmarks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=500)
+        parser.add_argument('--entries', type=int, default=100_000)
+        parser.add_argument('--comments-per-entry', type=float, default=2.0, help='Average; also used for events and diary pages')
+        parser.add_argument('--events', type=int, default=1_000)
+        parser.add_argument('--registrations-per-event', type=int, default=25, help='Upper bound per event')
+        parser.add_argument('--diary-pages', type=int, default=2_000)
+        parser.add_argument('--media', type=int, default=2_000)
+        parser.add_argument('--days', type=int, default=3 * 365, help='Spread timestamps over this many past days')
+        parser.add_argument('--batch-size', type=int, default=2_000)
+        parser.add_argument('--seed', type=int, default=1, help='Random seed, so runs are repeatable')
+        parser.add_argument('--clear', action='store_true', help='Delete previously seeded users (and their content) first')
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.now = timezone.now()
+        self.days = max(options['days'], 1)
+
+        if options['clear']:
+            deleted = User.objects.filter(username__startswith=USERNAME_PREFIX).delete()[0]
+            self.stdout.write(f'Deleted {deleted} seeded row(s)')
+        if User.objects.filter(username__startswith=USERNAME_PREFIX).exists():
+            raise CommandError('Seeded data already exists; pass --clear to replace it.')
+        if options['users'] < 1:
+            raise CommandError('--users must be at least 1.')
+
+        with transaction.atomic(), explicit_timestamps(
+            JournalEntry, Comment, PathEvent, PathEventRegistration, PathEventComment,
+            DiaryPage, DiaryComment, MediaItem,
+        ):
+            users = self.seed_users(options['users'])
+            staff = users[0]
+            comments = options['comments_per_entry']
+            entry_ids = self.seed_entries(users, options['entries'])
+            self.seed_comments(Comment, 'entry_id', entry_ids, users, comments)
+            event_ids = self.seed_events(staff, options['events'])
+            self.seed_registrations(event_ids, users, options['registrations_per_event'])
+            self.seed_comments(PathEventComment, 'event_id', event_ids, users, comments)
+            page_ids = self.seed_diary_pages(staff, options['diary_pages'])
+            self.seed_comments(DiaryComment, 'page_id', page_ids, users, comments)
+            self.seed_media(users, options['media'])
+
+            counters.reconcile(lambda name: apps.get_model('entries', name))
+            search.rebuild(connections['default'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded {len(users)} users ({staff.username} is staff, password "seed"), {len(entry_ids)} entries, '
+            f'{len(event_ids)} events, {len(page_ids)} diary pages, {options["media"]} media items'
+        ))
+
+    # Helpers
+
+    def words(self, low, high):
+        return ' '.join(self.random.choices(WORDS, k=self.random.randint(low, high)))
+
+    def paragraphs(self):
+        return '\n\n'.join(self.words(40, 90).capitalize() + '.' for _ in range(self.random.randint(1, 4)))
+
+    def past(self):
+        return self.now - timedelta(seconds=self.random.randint(0, self.days * 86400))
+
+    def bulk(self, model, rows):
+        """bulk_create in batches; returns the new primary keys."""
+        ids = []
+        for start in range(0, len(rows), self.batch_size):
+            created = model.objects.bulk_create(rows[start:start + self.batch_size])
+            ids.extend(obj.pk for obj in created)
+        if ids and ids[0] is None:
+            # Backends that can't return ids from bulk_create (MySQL): the seeded rows are the newest.
+            ids = list(model.objects.order_by('-pk').values_list('pk', flat=True)[:len(rows)])
+        self.stdout.write(f'  {model._meta.verbose_name_plural}: {len(rows)}')
+        return ids
+
+    # Seeders
+
+    def seed_users(self, count):
+        password = make_password('seed')
+        users = [
+            User(
+                username=f'{USERNAME_PREFIX}{i}', email=f'{USERNAME_PREFIX}{i}@example.com', password=password,
+                first_name=self.random.choice(WORDS).capitalize(), is_staff=i == 0, date_joined=self.past(),
+            )
+            for i in range(count)
+        ]
+        User.objects.bulk_create(users, batch_size=self.batch_size)
+        self.stdout.write(f'  users: {count}')
+        return list(User.objects.filter(username__startswith=USERNAME_PREFIX).order_by('pk'))
+
+    def seed_entries(self, users, count):
+        rows = []
+        for _ in range(count):
+            created = self.past()
+            entry = JournalEntry(
+                title=self.words(2, 7).capitalize(), content=self.paragraphs(),
+                author=self.random.choice(users), is_published=self.random.random() < 0.85,
+                created_at=created, updated_at=created,
+            )
+            entry.update_excerpt()
+            rows.append(entry)
+        return self.bulk(JournalEntry, rows)
+
+    def seed_comments(self, model, fk_name, parent_ids, users, per_parent):
+        rows = []
+        has_updated_at = any(field.name == 'updated_at' for field in model._meta.concrete_fields)
+        for parent_id in parent_ids:
+            for _ in range(int(self.random.expovariate(1 / per_parent)) if per_parent else 0):
+                created = self.past()
+                row = model(
+                    **{fk_name: parent_id}, author=self.random.choice(users),
+                    content=self.words(5, 40).capitalize() + '.', created_at=created,
+                )
+                if has_updated_at:
+                    row.updated_at = created
+                rows.append(row)
+        return self.bulk(model, rows)
+
+    def seed_events(self, staff, count):
+        event_types = [value for value, _ in PathEvent.EVENT_TYPES]
+        rows = []
+        for _ in range(count):
+            # Mostly past events, plus a year of upcoming ones.
+            start = self.now + timedelta(days=self.random.uniform(-self.days, 365))
+            start = start.replace(minute=0, second=0, microsecond=0)
+            end = start + timedelta(hours=self.random.choice((1, 2, 3, 24, 48))) if self.random.random() < 0.5 else None
+            created = min(start, self.now) - timedelta(days=self.random.randint(1, 60))
+            event = PathEvent(
+                title=self.words(2, 5).capitalize(), description=self.paragraphs(),
+                event_type=self.random.choice(event_types), event_date=start, event_end_date=end,
+                location=self.words(1, 3).title(), max_participants=self.random.choice((None, 10, 20, 50)),
+                is_published=self.random.random() < 0.9, created_by=staff, created_at=created, updated_at=created,
+            )
+            event.update_excerpt()
+            rows.append(event)
+        return self.bulk(PathEvent, rows)
+
+    def seed_registrations(self, event_ids, users, per_event):
+        limits = dict(PathEvent.objects.filter(pk__in=event_ids).values_list('pk', 'max_participants'))
+        rows = []
+        for event_id in event_ids:
+            joined = self.random.sample(users, min(len(users), self.random.randint(0, per_event)))
+            for position, user in enumerate(joined):
+                full = limits[event_id] and position >= limits[event_id]
+                rows.append(PathEventRegistration(
+                    event_id=event_id, user=user, joined_at=self.past(),
+                    status=PathEventRegistration.STATUS_WAITLISTED if full else PathEventRegistration.STATUS_CONFIRMED,
+                ))
+        return self.bulk(PathEventRegistration, rows)
+
+    def seed_diary_pages(self, staff, count):
+        rows = []
+        for _ in range(count):
+            created = self.past()
+            page = DiaryPage(
+                title=self.words(2, 6).capitalize(), content=self.paragraphs(),
+                status='public' if self.random.random() < 0.8 else 'draft', author=staff,
+                created_at=created, updated_at=created,
+            )
+            page.update_excerpt()
+            rows.append(page)
+        return self.bulk(DiaryPage, rows)
+
+    def seed_media(self, users, count):
+        """Media items sharing a few small stored placeholder images (one blob each, refcounted)."""
+        if not count:
+            return []
+        placeholders = []
+        for colour in PLACEHOLDER_COLOURS:
+            buffer = BytesIO()
+            Image.new('RGB', (320, 240), colour).save(buffer, format='JPEG')
+            name = default_storage.save(f'media_library/seed/{colour[1:]}.jpg', ContentFile(buffer.getvalue()))
+            placeholders.append((name, buffer.tell()))
+        rows = []
+        uses = {name: 0 for name, _ in placeholders}
+        for _ in range(count):
+            name, size = self.random.choice(placeholders)
+            uses[name] += 1
+            created = self.past()
+            rows.append(MediaItem(
+                file=name, title=self.words(1, 4).capitalize(), uploaded_by=self.random.choice(users),
+                file_type=MediaItem.FILE_TYPE_IMAGE, mime_type='image/jpeg', file_size=size, width=320, height=240,
+                metadata_extracted_at=created, created_at=created,
+            ))
+        ids = self.bulk(MediaItem, rows)
+        # Each save() above added one reference; every further row shares the blob.
+        for name, used in uses.items():
+            if used:
+                StoredBlob.objects.filter(name=name).update(refcount=F('refcount') + used - 1)
+            else:
+                default_storage.delete(name)
+        return ids
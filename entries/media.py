@@ -0,0 +1,152 @@
+"""
+Serving of user uploads under MEDIA_URL.
+
+JPEG/PNG requests are content-negotiated: if the browser's Accept header allows
+AVIF or WebP and the image job stored such a copy (see entries/images.py), that
+copy is served in place of the original, with `Vary: Accept` so caches keep
+the variants apart.
+
+Responses carry a strong ETag and Last-Modified (conditional GETs get a 304),
+honour single byte ranges (so videos can seek) and are sent with FileResponse,
+which lets gunicorn use sendfile() for the body. Content-addressed blob paths
+never change and are marked `immutable` for a year.
+"""
+import mimetypes
+import os
+import re
+import stat
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotAllowed
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from . import images
+from .storage import is_blob_name
+
+IMMUTABLE_MAX_AGE = 60 * 60 * 24 * 365
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def media_file_exists(name):
+    try:
+        return os.path.isfile(safe_join(settings.MEDIA_ROOT, name))
+    except SuspiciousFileOperation:
+        return False
+
+
+class RangeFile:
+    """File-like view of `length` bytes from `start`; FileResponse reads it like a file."""
+
+    def __init__(self, fh, start, length):
+        self.fh = fh
+        self.remaining = length
+        fh.seek(start)
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.fh.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.fh.close()
+
+
+def parse_range(header, size):
+    """
+    (start, end) inclusive for a single `bytes=` range, None to ignore the
+    header (absent, malformed or multi-range) or False if it can't be satisfied.
+    """
+    match = RANGE_RE.match((header or '').strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if first == '':
+        # Suffix range: the last N bytes.
+        length = int(last)
+        if length == 0 or size == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def file_etag(name, st):
+    if is_blob_name(name):
+        # The name already contains the content hash (plus variant suffixes).
+        return quote_etag(os.path.basename(name))
+    return quote_etag(f'{st.st_mtime_ns:x}-{st.st_size:x}')
+
+
+def serve_media(request, path):
+    if request.method not in ('GET', 'HEAD'):
+        return HttpResponseNotAllowed(['GET', 'HEAD'])
+    chosen, content_type = images.negotiate(path, request.META.get('HTTP_ACCEPT'), media_file_exists)
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, chosen)
+        st = os.stat(full_path)
+    except (SuspiciousFileOperation, OSError):
+        raise Http404('File not found')
+    if not stat.S_ISREG(st.st_mode):
+        raise Http404('File not found')
+
+    # Headers shared by 200, 206 and 304 responses.
+    headers = HttpResponse()
+    headers['ETag'] = file_etag(chosen, st)
+    headers['Last-Modified'] = http_date(st.st_mtime)
+    headers['Accept-Ranges'] = 'bytes'
+    if is_blob_name(chosen):
+        patch_cache_control(headers, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True)
+    else:
+        patch_cache_control(headers, public=True, max_age=settings.MEDIA_CACHE_MAX_AGE)
+    if path.lower().endswith(images.NEGOTIABLE_EXTENSIONS):
+        patch_vary_headers(headers, ['Accept'])
+
+    conditional = get_conditional_response(
+        request, etag=headers['ETag'], last_modified=int(st.st_mtime), response=headers
+    )
+    if conditional is not headers:
+        return conditional
+
+    content_type = content_type or mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+    byte_range = parse_range(request.META.get('HTTP_RANGE'), st.st_size)
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if byte_range is not None and if_range and if_range.strip() not in (headers['ETag'], headers['Last-Modified']):
+        byte_range = None  # the client's partial copy is stale: send everything, even for an unsatisfiable range
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{st.st_size}'
+        return response
+
+    if settings.MEDIA_ACCEL_REDIRECT_PREFIX:
+        # nginx serves the body (and ranges) from an internal location.
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_REDIRECT_PREFIX.rstrip('/') + '/' + chosen
+    elif byte_range:
+        start, end = byte_range
+        fh = open(full_path, 'rb')
+        if end == st.st_size - 1:
+            # Open-ended range: a seeked real file keeps the sendfile() path.
+            fh.seek(start)
+            response = FileResponse(fh, status=206, content_type=content_type)
+        else:
+            response = FileResponse(RangeFile(fh, start, end - start + 1), status=206, content_type=content_type)
+        response['Content-Length'] = str(end - start + 1)
+        response['Content-Range'] = f'bytes {start}-{end}/{st.st_size}'
+    else:
+        response = FileResponse(open(full_path, 'rb'), content_type=content_type)
+        response['Content-Length'] = str(st.st_size)
+
+    for header, value in headers.items():
+        if header != 'Content-Type':
+            response[header] = value
+    return response
@@ -0,0 +1,146 @@
+"""
+File metadata for the media library.
+
+The cheap part (type from the extension, MIME type, byte size) is filled in by
+MediaItem.save() so the library can filter straight away; dimensions and video
+duration are read by the background worker (entries/tasks.py), with Pillow for
+images and `ffprobe` for videos when it is installed. Without ffprobe, video
+dimensions/duration simply stay empty.
+
+Videos also get a poster frame (a JPEG shown before playback) from `ffmpeg`,
+or OpenCV if that's what is installed; with neither, the library shows a
+plain placeholder instead. Large images get a small preview copy the same way,
+so the library grid doesn't download full-size photos.
+"""
+import json
+import mimetypes
+import os
+import shutil
+import subprocess
+from io import BytesIO
+
+from PIL import Image, UnidentifiedImageError
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.webp', '.svg', '.avif')
+VIDEO_EXTENSIONS = ('.mp4', '.webm', '.mov', '.avi', '.mkv', '.m4v')
+FFPROBE_TIMEOUT = 30
+POSTER_MAX_SIZE = 640
+POSTER_AT_SECONDS = 1.0
+POSTER_QUALITY = 80
+IMAGE_PREVIEW_SIZE = 400
+
+
+def classify(name):
+    """'image', 'video' or 'other' from the file name (matches MediaItem.FILE_TYPE_*)."""
+    ext = os.path.splitext(name or '')[1].lower()
+    if ext in IMAGE_EXTENSIONS:
+        return 'image'
+    if ext in VIDEO_EXTENSIONS:
+        return 'video'
+    return 'other'
+
+
+def guess_mime(name):
+    return mimetypes.guess_type(name or '')[0] or 'application/octet-stream'
+
+
+def probe_image(path):
+    """(width, height) or (None, None) if Pillow can't read it (e.g. SVG)."""
+    try:
+        with Image.open(path) as img:
+            return img.width, img.height
+    except (UnidentifiedImageError, OSError):
+        return None, None
+
+
+def probe_video(path):
+    """(width, height, duration in seconds) via ffprobe; Nones when unavailable."""
+    ffprobe = shutil.which('ffprobe')
+    if not ffprobe:
+        return None, None, None
+    try:
+        result = subprocess.run(
+            [ffprobe, '-v', 'error', '-select_streams', 'v:0', '-show_entries',
+             'stream=width,height:format=duration', '-of', 'json', path],
+            capture_output=True, check=True, timeout=FFPROBE_TIMEOUT,
+        )
+        info = json.loads(result.stdout or b'{}')
+    except (OSError, subprocess.SubprocessError, ValueError):
+        return None, None, None
+    stream = (info.get('streams') or [{}])[0]
+    try:
+        duration = float(info.get('format', {}).get('duration'))
+    except (TypeError, ValueError):
+        duration = None
+    return stream.get('width'), stream.get('height'), duration
+
+
+def _jpeg(img, max_size):
+    img = img.convert('RGB')
+    img.thumbnail((max_size, max_size))
+    buffer = BytesIO()
+    img.save(buffer, format='JPEG', quality=POSTER_QUALITY)
+    return buffer.getvalue()
+
+
+def image_preview(path):
+    """JPEG bytes of a grid-sized copy, or None if the image is already small (or unreadable)."""
+    try:
+        with Image.open(path) as img:
+            if img.width <= IMAGE_PREVIEW_SIZE and img.height <= IMAGE_PREVIEW_SIZE:
+                return None
+            img.load()
+            return _jpeg(img, IMAGE_PREVIEW_SIZE)
+    except (UnidentifiedImageError, OSError):
+        return None
+
+
+def _poster_with_ffmpeg(path, at):
+    ffmpeg = shutil.which('ffmpeg')
+    if not ffmpeg:
+        return None
+    try:
+        result = subprocess.run(
+            [ffmpeg, '-v', 'error', '-ss', str(at), '-i', path, '-frames:v', '1',
+             '-f', 'image2pipe', '-vcodec', 'png', 'pipe:1'],
+            capture_output=True, check=True, timeout=FFPROBE_TIMEOUT,
+        )
+        if not result.stdout:
+            return None
+        return Image.open(BytesIO(result.stdout))
+    except (OSError, subprocess.SubprocessError, UnidentifiedImageError):
+        return None
+
+
+def _poster_with_opencv(path, at):
+    try:
+        import cv2
+    except ImportError:
+        return None
+    capture = cv2.VideoCapture(path)
+    try:
+        capture.set(cv2.CAP_PROP_POS_MSEC, at * 1000)
+        ok, frame = capture.read()
+        if not ok:
+            capture.set(cv2.CAP_PROP_POS_MSEC, 0)
+            ok, frame = capture.read()
+    finally:
+        capture.release()
+    if not ok:
+        return None
+    return Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+
+
+def extract_poster(path, duration=None):
+    """JPEG bytes of an early frame (scaled down), or None if no decoder could read one."""
+    at = POSTER_AT_SECONDS
+    if duration is not None and duration < at * 2:
+        at = 0
+    img = _poster_with_ffmpeg(path, at)
+    if img is None and at:
+        img = _poster_with_ffmpeg(path, 0)  # very short clip, or seeking failed
+    if img is None:
+        img = _poster_with_opencv(path, at)
+    if img is None:
+        return None
+    return _jpeg(img, POSTER_MAX_SIZE)
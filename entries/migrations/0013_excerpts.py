@@ -0,0 +1,55 @@
+# Generated by Django 6.0.1
+
+from django.db import migrations, models
+from django.utils.text import Truncator
+
+# Frozen copies of the excerpt settings when this migration was written; later
+# changes go through `manage.py backfill_excerpts --all`, not through here.
+EXCERPT_MAX_LENGTH = 500
+EXCERPT_SOURCES = (
+    ('JournalEntry', 'content', 30),
+    ('DiaryPage', 'content', 30),
+    ('PathEvent', 'description', 25),
+)
+BATCH_SIZE = 500
+
+
+def fill_excerpts(apps, schema_editor):
+    for model_name, source_field, num_words in EXCERPT_SOURCES:
+        model = apps.get_model('entries', model_name)
+        batch = []
+        for obj in model.objects.only('pk', source_field).order_by('pk').iterator(chunk_size=BATCH_SIZE):
+            text = getattr(obj, source_field) or ''
+            obj.excerpt = Truncator(text).words(num_words, truncate=' …')[:EXCERPT_MAX_LENGTH]
+            batch.append(obj)
+            if len(batch) >= BATCH_SIZE:
+                model.objects.bulk_update(batch, ['excerpt'])
+                batch = []
+        if batch:
+            model.objects.bulk_update(batch, ['excerpt'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('entries', '0012_aboutpage_image'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='journalentry',
+            name='excerpt',
+            field=models.CharField(blank=True, editable=False, max_length=500),
+        ),
+        migrations.AddField(
+            model_name='diarypage',
+            name='excerpt',
+            field=models.CharField(blank=True, editable=False, max_length=500),
+        ),
+        migrations.AddField(
+            model_name='pathevent',
+            name='excerpt',
+            field=models.CharField(blank=True, editable=False, max_length=500),
+        ),
+        migrations.RunPython(fill_excerpts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 6.0.1
+
+from django.db import OperationalError, migrations
+
+# Frozen copy of the DDL in entries/search.py as of this migration, so later
+# edits to that module can't change what this migration does.
+SEARCH_CONFIG = 'pg_catalog.english'
+SEARCH_FIELDS = {
+    'entries_journalentry': (('title', 'A'), ('content', 'C')),
+    'entries_diarypage': (('title', 'A'), ('content', 'C')),
+    'entries_pathevent': (('title', 'A'), ('location', 'B'), ('event_type', 'B'), ('description', 'C')),
+}
+
+
+def pg_vector_sql(fields, prefix=''):
+    return ' || '.join(
+        f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce({prefix}{name}, '')), '{weight}')"
+        for name, weight in fields
+    )
+
+
+def install_sql(table, fields):
+    columns = ', '.join(name for name, _ in fields)
+    return [
+        f'ALTER TABLE {table} ADD COLUMN IF NOT EXISTS search_vector tsvector',
+        f"""CREATE OR REPLACE FUNCTION {table}_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := {pg_vector_sql(fields, 'NEW.')};
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql""",
+        f'DROP TRIGGER IF EXISTS {table}_search_vector_trigger ON {table}',
+        f"""CREATE TRIGGER {table}_search_vector_trigger
+BEFORE INSERT OR UPDATE OF {columns} ON {table}
+FOR EACH ROW EXECUTE FUNCTION {table}_search_vector_update()""",
+        f'CREATE INDEX IF NOT EXISTS {table}_search_vector_gin ON {table} USING gin (search_vector)',
+        f'UPDATE {table} SET search_vector = {pg_vector_sql(fields)}',
+    ]
+
+
+def install_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    for table, fields in SEARCH_FIELDS.items():
+        columns = ', '.join(name for name, _ in fields)
+        if vendor == 'postgresql':
+            for sql in install_sql(table, fields):
+                schema_editor.execute(sql, params=None)
+        elif vendor == 'sqlite':
+            try:
+                schema_editor.execute(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {table}_fts USING fts5({columns}, tokenize='porter unicode61')",
+                    params=None,
+                )
+            except OperationalError:
+                continue  # SQLite compiled without FTS5: search falls back to icontains.
+            schema_editor.execute(f'DELETE FROM {table}_fts', params=None)
+            schema_editor.execute(
+                f'INSERT INTO {table}_fts (rowid, {columns}) SELECT id, {columns} FROM {table}', params=None,
+            )
+
+
+def uninstall_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    for table in SEARCH_FIELDS:
+        if vendor == 'postgresql':
+            schema_editor.execute(f'DROP TRIGGER IF EXISTS {table}_search_vector_trigger ON {table}', params=None)
+            schema_editor.execute(f'DROP FUNCTION IF EXISTS {table}_search_vector_update()', params=None)
+            schema_editor.execute(f'DROP INDEX IF EXISTS {table}_search_vector_gin', params=None)
+            schema_editor.execute(f'ALTER TABLE {table} DROP COLUMN IF EXISTS search_vector', params=None)
+        elif vendor == 'sqlite':
+            schema_editor.execute(f'DROP TABLE IF EXISTS {table}_fts', params=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('entries', '0013_excerpts'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_search_index, uninstall_search_index),
+    ]
@@ -0,0 +1,90 @@
+# Generated by Django 6.0.1
+
+import mimetypes
+import os
+
+from django.conf import settings
+from django.db import migrations, models
+
+# Frozen copies of entries.metadata.classify() / guess_mime() as of this migration.
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.webp', '.svg', '.avif')
+VIDEO_EXTENSIONS = ('.mp4', '.webm', '.mov', '.avi', '.mkv', '.m4v')
+
+
+def classify(name):
+    ext = os.path.splitext(name or '')[1].lower()
+    if ext in IMAGE_EXTENSIONS:
+        return 'image'
+    if ext in VIDEO_EXTENSIONS:
+        return 'video'
+    return 'other'
+
+
+def guess_mime(name):
+    return mimetypes.guess_type(name or '')[0] or 'application/octet-stream'
+
+
+def classify_existing(apps, schema_editor):
+    """Type and MIME from the file name; sizes and dimensions come from `process_image_jobs --enqueue-missing`."""
+    MediaItem = apps.get_model('entries', 'MediaItem')
+    batch = []
+    for item in MediaItem.objects.only('pk', 'file').iterator(chunk_size=500):
+        item.file_type = classify(item.file.name)
+        item.mime_type = guess_mime(item.file.name)
+        batch.append(item)
+        if len(batch) >= 500:
+            MediaItem.objects.bulk_update(batch, ['file_type', 'mime_type'])
+            batch = []
+    if batch:
+        MediaItem.objects.bulk_update(batch, ['file_type', 'mime_type'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('entries', '0018_uploadsession'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mediaitem',
+            name='duration',
+            field=models.FloatField(blank=True, editable=False, help_text='Seconds (videos)', null=True),
+        ),
+        migrations.AddField(
+            model_name='mediaitem',
+            name='file_size',
+            field=models.BigIntegerField(blank=True, editable=False, help_text='Bytes', null=True),
+        ),
+        migrations.AddField(
+            model_name='mediaitem',
+            name='file_type',
+            field=models.CharField(choices=[('image', 'Image'), ('video', 'Video'), ('other', 'Other')], default='other', editable=False, max_length=10),
+        ),
+        migrations.AddField(
+            model_name='mediaitem',
+            name='height',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='mediaitem',
+            name='metadata_extracted_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='mediaitem',
+            name='mime_type',
+            field=models.CharField(blank=True, editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='mediaitem',
+            name='width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='mediaitem',
+            index=models.Index(fields=['file_type', '-created_at'], name='entries_media_type_idx'),
+        ),
+        migrations.RunPython(classify_existing, migrations.RunPython.noop),
+    ]
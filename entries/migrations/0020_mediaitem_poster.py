@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('entries', '0019_mediaitem_metadata'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mediaitem',
+            name='poster',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='posters/'),
+        ),
+    ]
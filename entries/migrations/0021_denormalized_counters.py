@@ -0,0 +1,57 @@
+# Generated by Django 6.0.1
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+# (child model, FK on the child, parent model, counter column) as they were at
+# this point; registrations had no status yet, so every one is counted.
+COUNTERS = (
+    ('Comment', 'entry', 'JournalEntry', 'comment_count'),
+    ('DiaryComment', 'page', 'DiaryPage', 'comment_count'),
+    ('PathEventComment', 'event', 'PathEvent', 'comment_count'),
+    ('PathEventRegistration', 'event', 'PathEvent', 'participant_count'),
+)
+
+
+def count_existing(apps, schema_editor):
+    for child_name, fk_name, parent_name, field in COUNTERS:
+        child = apps.get_model('entries', child_name)
+        parent = apps.get_model('entries', parent_name)
+        counts = Subquery(
+            child.objects.filter(**{fk_name: OuterRef('pk')}).order_by()
+            .values(fk_name).annotate(n=Count('pk')).values('n')[:1],
+            output_field=IntegerField(),
+        )
+        parent.objects.update(**{field: Coalesce(counts, 0)})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('entries', '0020_mediaitem_poster'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='diarypage',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='journalentry',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='pathevent',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='pathevent',
+            name='participant_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_existing, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 6.0.1
+
+from django.conf import settings
+from django.db import migrations, models
+
+# login_view falls back to User.objects.get(email=...); auth_user has no index on
+# email, and the user model belongs to django.contrib.auth, so add it from here.
+USER_EMAIL_INDEX = models.Index(fields=['email'], name='entries_user_email_idx')
+
+
+def add_user_email_index(apps, schema_editor):
+    schema_editor.add_index(apps.get_model(settings.AUTH_USER_MODEL), USER_EMAIL_INDEX)
+
+
+def remove_user_email_index(apps, schema_editor):
+    schema_editor.remove_index(apps.get_model(settings.AUTH_USER_MODEL), USER_EMAIL_INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('entries', '0022_registration_waitlist'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='diarypage',
+            index=models.Index(condition=models.Q(('status', 'public')), fields=['-created_at', '-id'], name='entries_diary_public_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='journalentry',
+            index=models.Index(condition=models.Q(('is_published', True)), fields=['-created_at', '-id'], name='entries_entry_published_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='journalentry',
+            index=models.Index(fields=['author', '-created_at', '-id'], name='entries_entry_author_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pathevent',
+            index=models.Index(condition=models.Q(('is_published', True)), fields=['event_date'], name='entries_event_published_idx'),
+        ),
+        migrations.RunPython(add_user_email_index, remove_user_email_index),
+    ]
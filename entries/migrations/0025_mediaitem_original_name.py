@@ -0,0 +1,38 @@
+# Generated by Django 6.0.1
+
+import os
+
+from django.db import migrations, models
+
+BATCH_SIZE = 500
+
+
+def fill_original_names(apps, schema_editor):
+    """Keep the readable name of existing uploads; blob paths (a hash) say nothing, so they stay empty."""
+    MediaItem = apps.get_model('entries', 'MediaItem')
+    batch = []
+    rows = MediaItem.objects.filter(original_name='').exclude(file__startswith='blobs/').only('pk', 'file')
+    for item in rows.order_by('pk').iterator(chunk_size=BATCH_SIZE):
+        item.original_name = os.path.basename(item.file.name)[:255]
+        batch.append(item)
+        if len(batch) >= BATCH_SIZE:
+            MediaItem.objects.bulk_update(batch, ['original_name'])
+            batch = []
+    if batch:
+        MediaItem.objects.bulk_update(batch, ['original_name'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('entries', '0024_uploadsession_writer'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mediaitem',
+            name='original_name',
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.RunPython(fill_original_names, migrations.RunPython.noop),
+    ]
@@ -1,11 +1,19 @@
 from PIL import Image
 from django.core.files.base import ContentFile
 from io import BytesIO
-from django.db import models
+from django.core.cache import cache
+from django.db import models, transaction
+from django.db.models import Q
 from django.contrib.auth.models import User
 from django.utils import timezone
 from django.urls import reverse
+from django.utils.text import Truncator
 import os
+import uuid
+
+from . import images, metadata
+
+EXCERPT_MAX_LENGTH = 500
 
 
 def resize_image(image_field, max_width=1200, max_height=1200):
@@ -22,6 +30,131 @@ def resize_image(image_field, max_width=1200, max_height=1200):
         image_field.save(image_field.name, ContentFile(buffer.getvalue()), save=False)
 
 
+def make_excerpt(text, num_words):
+    """Same output as the |truncatewords filter, computed once at save time."""
+    return Truncator(text or '').words(num_words, truncate=' …')[:EXCERPT_MAX_LENGTH]
+
+
+def backfill_excerpts(model, source_field, num_words, batch_size=500, only_missing=True):
+    """
+    Fill `excerpt` for existing rows in batches. Streams rows with iterator()
+    so large tables aren't loaded into memory. Returns the number of rows updated.
+    """
+    queryset = model.objects.only('pk', source_field).order_by('pk')
+    if only_missing:
+        queryset = queryset.filter(excerpt='')
+    updated = 0
+    batch = []
+    for obj in queryset.iterator(chunk_size=batch_size):
+        obj.excerpt = make_excerpt(getattr(obj, source_field), num_words)
+        batch.append(obj)
+        if len(batch) >= batch_size:
+            model.objects.bulk_update(batch, ['excerpt'])
+            updated += len(batch)
+            batch = []
+    if batch:
+        model.objects.bulk_update(batch, ['excerpt'])
+        updated += len(batch)
+    return updated
+
+
+class ExcerptMixin:
+    """Keeps `excerpt` in sync with the body field so list views can defer() the body."""
+    excerpt_source = 'content'
+    excerpt_words = 30
+
+    def update_excerpt(self):
+        self.excerpt = make_excerpt(getattr(self, self.excerpt_source), self.excerpt_words)
+
+
+_NOT_LOADED = object()
+
+
+class QueuedImageMixin:
+    """
+    Resizing happens in the background (see entries/tasks.py): save() only queues
+    an ImageJob when `image` is new or replaced, and the original file is served
+    until the job finishes. The job also fills `image_renditions` (entries/images.py)
+    which the templates use for srcset.
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._saved_image_name = instance.__dict__.get('image', _NOT_LOADED)
+        return instance
+
+    def image_changed(self):
+        saved = getattr(self, '_saved_image_name', None)
+        if saved is _NOT_LOADED:
+            return False  # loaded with only()/defer() and never given a new image
+        return (self.image.name if self.image else '') != (saved or '')
+
+    def reset_image_renditions(self):
+        """
+        When the image is replaced or removed, drop its renditions and release the
+        old file; the files are deleted (or dereferenced) once the save commits.
+        """
+        if not self.image_changed():
+            return
+        stale_renditions = self.image_renditions
+        stale_name = getattr(self, '_saved_image_name', None)
+        storage = self._meta.get_field('image').storage
+        self.image_renditions = {}
+        # Re-uploading the same bytes keeps the blob name, so image_changed() is
+        # False again after the save; the new job must not depend on it.
+        self._renditions_reset = True
+
+        def release():
+            images.delete_renditions(storage, stale_renditions)
+            if stale_name:
+                storage.delete(stale_name)
+        transaction.on_commit(release)
+
+    def queue_image_processing(self):
+        if self.image and (self.image_changed() or getattr(self, '_renditions_reset', False)):
+            from .tasks import enqueue_image_job
+            enqueue_image_job(self, 'image')
+        self._renditions_reset = False
+        if getattr(self, '_saved_image_name', None) is not _NOT_LOADED:
+            self._saved_image_name = self.image.name if self.image else ''
+
+    def image_rendition_url(self, *labels):
+        """URL of the first available rendition in `labels`, else the uploaded image."""
+        for label in labels:
+            info = (self.image_renditions or {}).get(label)
+            if info:
+                return self.image.storage.url(info['name'])
+        return self.image.url if self.image else ''
+
+    @property
+    def image_card_url(self):
+        return self.image_rendition_url('thumb', 'medium')
+
+    @property
+    def image_srcset(self):
+        return images.srcset(self.image.storage, self.image_renditions)
+
+
+class CounterFieldsMixin:
+    """
+    Counter columns are only ever changed with UPDATE ... F() (see entries/counters.py),
+    so save() of an already stored row leaves them out instead of writing back the
+    possibly stale values it loaded. Otherwise it writes what Django would: every
+    field, or only the loaded ones for an instance from only()/defer().
+    """
+    COUNTER_FIELDS = ()
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname not in deferred and field.name not in self.COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
+
 def get_upload_path(instance, filename):
     user_id = None
     if hasattr(instance, 'author') and instance.author:
@@ -48,18 +181,32 @@ def media_library_upload_path(instance, filename):
     return os.path.join('media_library', str(user_id), filename)
 
 
-class JournalEntry(models.Model):
+class JournalEntry(ExcerptMixin, QueuedImageMixin, CounterFieldsMixin, models.Model):
+    COUNTER_FIELDS = ('comment_count',)
+
     title = models.CharField(max_length=200)
     content = models.TextField()
+    excerpt = models.CharField(max_length=EXCERPT_MAX_LENGTH, blank=True, editable=False)
     image = models.ImageField(upload_to=get_upload_path, blank=True, null=True)
+    image_renditions = models.JSONField(default=dict, blank=True, editable=False)
     author = models.ForeignKey(User, on_delete=models.CASCADE)
     is_published = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
 
     class Meta:
         ordering = ['-created_at']
         verbose_name_plural = 'Journal Entries'
+        indexes = [
+            # Public lists: is_published=True, newest first, keyset-paginated on (created_at, id).
+            # Partial where the database supports it (PostgreSQL, SQLite), a plain index elsewhere.
+            models.Index(
+                fields=['-created_at', '-id'], condition=Q(is_published=True), name='entries_entry_published_idx',
+            ),
+            # The other half of Q(is_published=True) | Q(author=user).
+            models.Index(fields=['author', '-created_at', '-id'], name='entries_entry_author_idx'),
+        ]
 
     def __str__(self):
         return self.title
@@ -68,10 +215,10 @@ class JournalEntry(models.Model):
         return reverse('entry_detail', kwargs={'pk': self.pk})
 
     def save(self, *args, **kwargs):
+        self.update_excerpt()
+        self.reset_image_renditions()
         super().save(*args, **kwargs)
-        if self.image:
-            resize_image(self.image)
-            super().save(update_fields=["image"])
+        self.queue_image_processing()
 
 
 class Comment(models.Model):
@@ -88,7 +235,7 @@ class Comment(models.Model):
         return f'Comment by {self.author.username} on {self.entry.title}'
 
 
-class PathEvent(models.Model):
+class PathEvent(ExcerptMixin, QueuedImageMixin, CounterFieldsMixin, models.Model):
     EVENT_TYPES = [
         ('run', 'Run'),
         ('hike', 'Hike'),
@@ -98,21 +245,32 @@ class PathEvent(models.Model):
         ('other', 'Other'),
     ]
 
+    excerpt_source = 'description'
+    excerpt_words = 25
+    COUNTER_FIELDS = ('participant_count', 'comment_count')
+
     title = models.CharField(max_length=200)
     description = models.TextField()
+    excerpt = models.CharField(max_length=EXCERPT_MAX_LENGTH, blank=True, editable=False)
     event_type = models.CharField(max_length=20, choices=EVENT_TYPES, default='adventure')
     event_date = models.DateTimeField(help_text='Start date & time')
     event_end_date = models.DateTimeField(null=True, blank=True, help_text='End date & time (optional)')
     location = models.CharField(max_length=200, blank=True)
     image = models.ImageField(upload_to=get_upload_path, blank=True, null=True)
+    image_renditions = models.JSONField(default=dict, blank=True, editable=False)
     max_participants = models.IntegerField(null=True, blank=True)
     is_published = models.BooleanField(default=True)
     created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='created_events')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    participant_count = models.PositiveIntegerField(default=0, editable=False)
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
 
     class Meta:
         ordering = ['event_date']
+        indexes = [
+            models.Index(fields=['event_date'], condition=Q(is_published=True), name='entries_event_published_idx'),
+        ]
         verbose_name = 'Path Event'
         verbose_name_plural = 'Path Events'
 
@@ -123,21 +281,34 @@ class PathEvent(models.Model):
         return reverse('path_event_detail', kwargs={'pk': self.pk})
 
     def save(self, *args, **kwargs):
+        self.update_excerpt()
+        self.reset_image_renditions()
         super().save(*args, **kwargs)
-        if self.image:
-            resize_image(self.image)
-            super().save(update_fields=["image"])
+        self.queue_image_processing()
 
 
 class PathEventRegistration(models.Model):
+    """A place at an event, or a waitlist spot once max_participants is reached (see entries/registrations.py)."""
+    STATUS_CONFIRMED = 'confirmed'
+    STATUS_WAITLISTED = 'waitlisted'
+    STATUS_CHOICES = [
+        (STATUS_CONFIRMED, 'Confirmed'),
+        (STATUS_WAITLISTED, 'Waitlisted'),
+    ]
+
     event = models.ForeignKey(PathEvent, on_delete=models.CASCADE, related_name='registrations')
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='event_registrations')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_CONFIRMED)
     joined_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ['joined_at']
         unique_together = [['event', 'user']]
 
+    @property
+    def is_waitlisted(self):
+        return self.status == self.STATUS_WAITLISTED
+
     def __str__(self):
         return f'{self.user.username} → {self.event.title}'
 
@@ -155,7 +326,9 @@ class PathEventComment(models.Model):
         return f'Comment by {self.author.username} on {self.event.title}'
 
 
-class DiaryPage(models.Model):
+class DiaryPage(ExcerptMixin, QueuedImageMixin, CounterFieldsMixin, models.Model):
+    COUNTER_FIELDS = ('comment_count',)
+
     STATUS_CHOICES = [
         ('draft', 'Draft'),
         ('public', 'Public'),
@@ -163,14 +336,22 @@ class DiaryPage(models.Model):
 
     title = models.CharField(max_length=200)
     content = models.TextField()
+    excerpt = models.CharField(max_length=EXCERPT_MAX_LENGTH, blank=True, editable=False)
     image = models.ImageField(upload_to=get_upload_path, blank=True, null=True)
+    image_renditions = models.JSONField(default=dict, blank=True, editable=False)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='draft')
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='diary_pages')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(
+                fields=['-created_at', '-id'], condition=Q(status='public'), name='entries_diary_public_idx',
+            ),
+        ]
         verbose_name = 'Diary Page'
         verbose_name_plural = 'Diary Pages'
 
@@ -181,10 +362,10 @@ class DiaryPage(models.Model):
         return reverse('diary_page_detail', kwargs={'pk': self.pk})
 
     def save(self, *args, **kwargs):
+        self.update_excerpt()
+        self.reset_image_renditions()
         super().save(*args, **kwargs)
-        if self.image:
-            resize_image(self.image)
-            super().save(update_fields=["image"])
+        self.queue_image_processing()
 
 
 class DiaryComment(models.Model):
@@ -212,19 +393,100 @@ class MediaItem(models.Model):
 
     file = models.FileField(upload_to=media_library_upload_path)
     title = models.CharField(max_length=255, blank=True)
+    # The stored name is the content hash; this is what the uploader called the file.
+    original_name = models.CharField(max_length=255, blank=True, editable=False)
     uploaded_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='media_uploads')
     created_at = models.DateTimeField(auto_now_add=True)
+    # Filled on save (type, MIME, size) and by the background worker (the rest); see entries/metadata.py
+    file_type = models.CharField(max_length=10, choices=FILE_TYPE_CHOICES, default=FILE_TYPE_OTHER, editable=False)
+    mime_type = models.CharField(max_length=100, blank=True, editable=False)
+    file_size = models.BigIntegerField(null=True, blank=True, editable=False, help_text='Bytes')
+    width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    height = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    duration = models.FloatField(null=True, blank=True, editable=False, help_text='Seconds (videos)')
+    metadata_extracted_at = models.DateTimeField(null=True, blank=True, editable=False)
+    # Preview for the library grid: a video's poster frame or a downscaled copy of a large image
+    poster = models.ImageField(upload_to='posters/', blank=True, null=True, editable=False)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [models.Index(fields=['file_type', '-created_at'], name='entries_media_type_idx')]
         verbose_name = 'Media item'
         verbose_name_plural = 'Media library'
 
     def __str__(self):
-        return self.title or self.file.name
+        return self.title or self.display_filename
+
+    @property
+    def display_filename(self):
+        return self.original_name or os.path.basename(self.file.name or '')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._saved_file_name = instance.__dict__.get('file', _NOT_LOADED)
+        return instance
+
+    def file_changed(self):
+        saved = getattr(self, '_saved_file_name', None)
+        if saved is _NOT_LOADED:
+            return False
+        return (self.file.name if self.file else '') != (saved or '')
+
+    def save(self, *args, **kwargs):
+        changed = self.file_changed()
+        if changed:
+            self.release_saved_file()
+            if self.file and not self.file._committed:
+                # Still the uploaded name; storage renames it to the content hash on save.
+                self.original_name = os.path.basename(self.file.name)[:255]
+            self.file_type = metadata.classify(self.file.name)
+            self.mime_type = metadata.guess_mime(self.file.name)
+            self.file_size = self.file.size if self.file else None
+            self.width = self.height = self.duration = self.metadata_extracted_at = None
+            self.release_poster()
+        super().save(*args, **kwargs)
+        if changed and self.file:
+            from .tasks import enqueue_image_job
+            enqueue_image_job(self, 'file')
+        if getattr(self, '_saved_file_name', None) is not _NOT_LOADED:
+            self._saved_file_name = self.file.name if self.file else ''
+
+    def release_saved_file(self):
+        """Drop the reference to the file being replaced once the save commits."""
+        stale_name = getattr(self, '_saved_file_name', None)
+        if not stale_name:
+            return
+        storage = self._meta.get_field('file').storage
+        transaction.on_commit(lambda: storage.delete(stale_name))
+
+    def release_poster(self):
+        """Forget the current poster; its file is released once the save commits."""
+        if not self.poster:
+            return
+        storage, name = self.poster.storage, self.poster.name
+        self.poster = None
+        transaction.on_commit(lambda: storage.delete(name))
+
+    @property
+    def preview_url(self):
+        if self.poster:
+            return self.poster.url
+        return self.file.url if self.is_image else ''
+
+    @property
+    def is_image(self):
+        return self.file_type == self.FILE_TYPE_IMAGE
+
+    @property
+    def is_video(self):
+        return self.file_type == self.FILE_TYPE_VIDEO
 
 
 class AboutPage(models.Model):
+    SINGLETON_PK = 1
+    CACHE_KEY = 'entries:aboutpage'
+
     content = models.TextField(blank=True)
     image = models.ImageField(upload_to='about/', blank=True, null=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -235,3 +497,98 @@ class AboutPage(models.Model):
 
     def __str__(self):
         return 'About page'
+
+    @classmethod
+    def load(cls):
+        """The About page (created empty on first use), from the cache when possible."""
+        about = cache.get(cls.CACHE_KEY)
+        if about is None:
+            about, _ = cls.objects.get_or_create(pk=cls.SINGLETON_PK, defaults={'content': ''})
+            cache.set(cls.CACHE_KEY, about, timeout=None)
+        return about
+
+    @classmethod
+    def clear_cache(cls):
+        cache.delete(cls.CACHE_KEY)
+
+
+class ImageJob(models.Model):
+    """
+    Background work on an upload, processed by `manage.py process_image_jobs`:
+    resize + renditions for entry/event/diary images, metadata for media items.
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    model_label = models.CharField(max_length=100, help_text='e.g. entries.journalentry')
+    object_id = models.BigIntegerField()
+    field_name = models.CharField(max_length=50, default='image')
+    file_name = models.CharField(max_length=255, help_text='File the job was queued for')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    last_error = models.TextField(blank=True)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['run_after', 'id']
+        indexes = [models.Index(fields=['status', 'run_after'], name='entries_imagejob_queue_idx')]
+        verbose_name = 'Image job'
+        verbose_name_plural = 'Image jobs'
+
+    def __str__(self):
+        return f'{self.model_label}#{self.object_id} {self.field_name} ({self.status})'
+
+
+class StoredBlob(models.Model):
+    """Reference count for a file in the content-addressed media store (entries/storage.py)."""
+    name = models.CharField(max_length=255, unique=True)
+    size = models.BigIntegerField(default=0)
+    refcount = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['name']
+        verbose_name = 'Stored blob'
+        verbose_name_plural = 'Stored blobs'
+
+    def __str__(self):
+        return f'{self.name} ({self.refcount} refs)'
+
+
+class UploadSession(models.Model):
+    """A media library upload being sent in chunks (see entries/uploads.py)."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    uploaded_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_sessions')
+    filename = models.CharField(max_length=255)
+    title = models.CharField(max_length=255, blank=True)
+    size = models.BigIntegerField(help_text='Total bytes expected')
+    offset = models.BigIntegerField(default=0, help_text='Bytes received so far')
+    # Set while a request is writing the chunk at `offset`; see uploads.claim_chunk().
+    writer = models.UUIDField(null=True, blank=True, editable=False)
+    writer_since = models.DateTimeField(null=True, blank=True, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-updated_at']
+        verbose_name = 'Upload session'
+        verbose_name_plural = 'Upload sessions'
+
+    def __str__(self):
+        return f'{self.filename} ({self.offset}/{self.size})'
+
+    @property
+    def is_complete(self):
+        return self.offset >= self.size
@@ -0,0 +1,111 @@
+"""
+Whole-response cache for anonymous visitors on the public pages.
+
+Responses are stored per path + the query parameters the cached views read
+(CACHE_PARAMS; anything else, like utm_* tags or cache busters, is left out
+so it can't multiply the cached copies) under a "content generation" number. Any save or delete of a model that appears on those pages bumps the
+generation (see entries/signals.py), so every cached page goes stale at once
+and the next visitor gets fresh HTML; nothing has to know which page showed
+which row. Entries also expire after PAGE_CACHE_TIMEOUT as a backstop.
+
+Only plain GET/HEAD requests from anonymous users are cached, and never a
+response that sets cookies, carries a CSRF token or has flash messages waiting.
+"""
+import hashlib
+import time
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+
+GENERATION_KEY = 'pagecache:generation'
+CACHE_HEADER = 'X-Page-Cache'
+# Cursors and page size (lists), month and search (calendar).
+CACHE_PARAMS = ('before', 'after', 'per_page', 'year', 'month', 'search', 'search_date')
+MAX_PARAM_LENGTH = 100
+
+
+def get_cache():
+    return caches[settings.PAGE_CACHE_ALIAS]
+
+
+def current_generation():
+    cache = get_cache()
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        # Start from the clock rather than 0 so a lost counter can't reuse old keys.
+        generation = int(time.time() * 1000)
+        cache.add(GENERATION_KEY, generation, timeout=None)
+        generation = cache.get(GENERATION_KEY, generation)
+    return generation
+
+
+def invalidate():
+    """Make every cached page stale."""
+    cache = get_cache()
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, int(time.time() * 1000), timeout=None)
+
+
+def cache_params(request):
+    return [(name, request.GET[name]) for name in CACHE_PARAMS if request.GET.get(name)]
+
+
+def cache_key(request, generation):
+    raw = f'{request.path}?{urlencode(cache_params(request))}'
+    digest = hashlib.md5(raw.encode(), usedforsecurity=False).hexdigest()
+    return f'pagecache:{generation}:{digest}'
+
+
+def has_pending_messages(request):
+    if request.COOKIES.get('messages'):
+        return True
+    session_cookie = request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    return bool(session_cookie and request.session.get('_messages'))
+
+
+def is_cacheable_request(request):
+    return (
+        settings.PAGE_CACHE_TIMEOUT > 0
+        and request.method in ('GET', 'HEAD')
+        and not request.user.is_authenticated
+        and not has_pending_messages(request)
+        and all(len(value) <= MAX_PARAM_LENGTH for _, value in cache_params(request))
+    )
+
+
+def is_cacheable_response(request, response):
+    return (
+        response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+        and not request.META.get('CSRF_COOKIE_NEEDS_UPDATE')
+        and not request.META.get('CSRF_COOKIE_USED')
+        and not response.has_header('Vary')
+    )
+
+
+def cache_anonymous(view):
+    """Serve anonymous GETs of `view` from the page cache when possible."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not is_cacheable_request(request):
+            return view(request, *args, **kwargs)
+        cache = get_cache()
+        key = cache_key(request, current_generation())
+        cached = cache.get(key)
+        if cached is not None:
+            content, content_type = cached
+            response = HttpResponse(content, content_type=content_type)
+            response[CACHE_HEADER] = 'hit'
+            return response
+        response = view(request, *args, **kwargs)
+        if is_cacheable_response(request, response):
+            cache.set(key, (response.content, response['Content-Type']), settings.PAGE_CACHE_TIMEOUT)
+            response[CACHE_HEADER] = 'miss'
+        return response
+    return wrapper
@@ -0,0 +1,123 @@
+"""
+Keyset (cursor) pagination for the journal and diary lists.
+
+Pages are keyed on (created_at, id) instead of OFFSET, so fetching page 500
+costs the same as fetching page 1 and rows inserted while someone is reading
+don't shift the page boundaries. Cursors are opaque strings passed in the
+?before= (older) and ?after= (newer) query parameters.
+
+A list of disjoint querysets can be paginated as one: each is sliced on its
+own and the results merged, so "published OR mine" is two index range scans
+rather than a scan of the whole table and a sort.
+"""
+import base64
+import heapq
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import Q
+
+
+class CursorPage:
+    """One page of rows plus the cursors for the neighbouring pages."""
+
+    def __init__(self, items, older_cursor=None, newer_cursor=None):
+        self.items = items
+        self.older_cursor = older_cursor
+        self.newer_cursor = newer_cursor
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __bool__(self):
+        return bool(self.items)
+
+    @property
+    def has_older(self):
+        return self.older_cursor is not None
+
+    @property
+    def has_newer(self):
+        return self.newer_cursor is not None
+
+    @property
+    def has_other_pages(self):
+        return self.has_older or self.has_newer
+
+
+def encode_cursor(obj):
+    raw = f'{obj.created_at.isoformat()}|{obj.pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return (created_at, pk) for a cursor, or None if it is malformed."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, pk = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+        return datetime.fromisoformat(created_at), int(pk)
+    except (ValueError, TypeError, UnicodeDecodeError):
+        return None
+
+
+def get_page_size(request, default=None):
+    """Page size from ?per_page= (capped at LIST_MAX_PAGE_SIZE) or the setting."""
+    page_size = default or settings.LIST_PAGE_SIZE
+    try:
+        requested = int(request.GET.get('per_page', ''))
+    except ValueError:
+        return page_size
+    return max(1, min(requested, settings.LIST_MAX_PAGE_SIZE))
+
+
+def fetch(querysets, condition, ordering, limit):
+    """The first `limit` rows matching `condition` across `querysets`, in `ordering`."""
+    parts = [list(queryset.filter(condition).order_by(*ordering)[:limit]) for queryset in querysets]
+    if len(parts) == 1:
+        return parts[0]
+    merged = heapq.merge(*parts, key=lambda obj: (obj.created_at, obj.pk), reverse=ordering[0].startswith('-'))
+    return list(merged)[:limit]
+
+
+def cursor_paginate(request, queryset, page_size=None):
+    """
+    Slice `queryset` (newest first) into a CursorPage using the request's
+    ?before= / ?after= cursor. An invalid cursor falls back to the first page.
+    `queryset` may also be a list of querysets that share no rows.
+    """
+    querysets = queryset if isinstance(queryset, (list, tuple)) else [queryset]
+    page_size = get_page_size(request, page_size)
+    before = decode_cursor(request.GET.get('before', ''))
+    after = None if before else decode_cursor(request.GET.get('after', ''))
+
+    rows = []
+    if after:
+        created_at, pk = after
+        rows = fetch(
+            querysets, Q(created_at__gt=created_at) | Q(created_at=created_at, pk__gt=pk),
+            ('created_at', 'pk'), page_size + 1,
+        )
+        has_newer = len(rows) > page_size
+        items = rows[:page_size][::-1]
+        has_older = True
+    if not rows:
+        # No cursor, an older-page cursor, or nothing newer left: walk backwards.
+        condition = Q()
+        if before:
+            created_at, pk = before
+            condition = Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk)
+        rows = fetch(querysets, condition, ('-created_at', '-pk'), page_size + 1)
+        has_older = len(rows) > page_size
+        items = rows[:page_size]
+        has_newer = before is not None
+
+    if not items:
+        return CursorPage(items)
+    return CursorPage(
+        items,
+        older_cursor=encode_cursor(items[-1]) if has_older else None,
+        newer_cursor=encode_cursor(items[0]) if has_newer else None,
+    )
@@ -0,0 +1,125 @@
+"""
+On-demand profiling of a single request, for staff, against live data.
+
+Add `?_profile=1` to any URL (or send the header `X-Profile: 1`) while logged in
+as staff, and instead of the page you get a plain-text report: status and
+total time, every SQL query with its duration (plus the ones repeated), and
+the cProfile table of the functions the view spent its time in.
+
+    /define-your-path/?_profile=1            sorted by cumulative time
+    /define-your-path/?_profile=tottime      any pstats sort key: tottime, calls, ...
+    /deannas-diary/12/?_profile=prof         raw .prof download for a call-graph viewer
+                                             (snakeviz, gprof2dot + dot)
+
+Other users' requests, and requests without the parameter, pass straight
+through. Conditional-GET headers are dropped so the view really runs.
+REQUEST_PROFILING=False removes the middleware altogether.
+"""
+import cProfile
+import marshal
+import pstats
+import time
+from collections import Counter
+from contextlib import ExitStack
+from io import StringIO
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import HttpResponse
+
+PARAM = '_profile'
+HEADER = 'X-Profile'
+RAW = 'prof'
+DEFAULT_SORT = 'cumulative'
+SORT_KEYS = {key.value for key in pstats.SortKey} | {'tottime', 'cumtime', 'ncalls'}
+
+
+class QueryLog:
+    """execute_wrapper collecting (alias, sql, seconds) for every query."""
+
+    def __init__(self, alias):
+        self.alias = alias
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((self.alias, sql, time.perf_counter() - start))
+
+
+def sql_report(queries, limit):
+    total = sum(seconds for _, _, seconds in queries)
+    lines = [f'== SQL: {len(queries)} queries, {total * 1000:.1f} ms ==']
+    for alias, sql, seconds in queries[:limit]:
+        lines.append(f'{seconds * 1000:8.2f} ms  [{alias}] {sql}')
+    if len(queries) > limit:
+        lines.append(f'... {len(queries) - limit} more')
+    repeated = [(sql, count) for sql, count in Counter(sql for _, sql, _ in queries).most_common() if count > 1]
+    if repeated:
+        lines += ['', '== Repeated queries (same SQL, possibly different parameters) ==']
+        lines += [f'{count:5d}x  {sql}' for sql, count in repeated[:limit]]
+    return lines
+
+
+def profile_report(request, response, elapsed, stats, queries, sort):
+    limit = settings.REQUEST_PROFILING_LIMIT
+    match = request.resolver_match
+    lines = [
+        f'{request.method} {request.get_full_path()}',
+        f'view: {match.view_name if match else "unresolved"}   status: {response.status_code}   '
+        f'total: {elapsed * 1000:.1f} ms',
+        '',
+    ]
+    lines += sql_report(queries, limit)
+    buffer = StringIO()
+    stats.stream = buffer
+    stats.sort_stats(sort).print_stats(limit)
+    lines += ['', f'== cProfile, top {limit} by {sort} ==', buffer.getvalue()]
+    return '\n'.join(lines)
+
+
+class ProfilingMiddleware:
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_PROFILING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        mode = request.GET.get(PARAM) or request.headers.get(HEADER)
+        if not mode or not request.user.is_staff:
+            return self.get_response(request)
+
+        # A 304 from the browser's cached copy would profile nothing.
+        for header in ('HTTP_IF_NONE_MATCH', 'HTTP_IF_MODIFIED_SINCE'):
+            request.META.pop(header, None)
+        logs = [QueryLog(connection.alias) for connection in connections.all()]
+        profiler = cProfile.Profile()
+        with ExitStack() as stack:
+            for connection, log in zip(connections.all(), logs):
+                stack.enter_context(connection.execute_wrapper(log))
+            start = time.perf_counter()
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+            elapsed = time.perf_counter() - start
+
+        stats = pstats.Stats(profiler)
+        if mode == RAW:
+            report = HttpResponse(marshal.dumps(stats.stats), content_type='application/octet-stream')
+            name = (request.resolver_match.view_name if request.resolver_match else 'request').replace(':', '_')
+            report['Content-Disposition'] = f'attachment; filename="{name}.prof"'
+        else:
+            sort = mode if mode in SORT_KEYS else DEFAULT_SORT
+            queries = [query for log in logs for query in log.queries]
+            report = HttpResponse(
+                profile_report(request, response, elapsed, stats.strip_dirs(), queries, sort),
+                content_type='text/plain; charset=utf-8',
+            )
+        report['Cache-Control'] = 'no-store'
+        return report
@@ -0,0 +1,90 @@
+"""
+Joining and leaving events under concurrent load, with a waitlist.
+
+PathEvent.participant_count (entries/counters.py) is the number of confirmed
+registrations. A join takes a place with one conditional UPDATE:
+
+    UPDATE pathevent SET participant_count = participant_count + 1
+    WHERE id = %s AND (max_participants IS NULL OR participant_count < max_participants)
+
+which the database applies atomically, so a burst of joins can never confirm
+more people than there are places; whoever doesn't get one is waitlisted.
+Each join/leave first locks the event row (SELECT ... FOR UPDATE where the
+backend supports it; on SQLite every transaction starts with BEGIN IMMEDIATE,
+see settings.DATABASES, and waits its turn), so a leave and a join can't pass
+each other and strand a free place next to a waitlist.
+
+When a confirmed registration goes away (leave, admin delete) or an event's
+max_participants is raised, fill_places() promotes the waitlist in join order.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+
+from .models import PathEvent, PathEventRegistration
+
+CONFIRMED = PathEventRegistration.STATUS_CONFIRMED
+WAITLISTED = PathEventRegistration.STATUS_WAITLISTED
+ALREADY_JOINED = 'already'
+
+
+def has_space():
+    return Q(max_participants__isnull=True) | Q(max_participants=0) | Q(participant_count__lt=F('max_participants'))
+
+
+def lock_event(event_id):
+    list(PathEvent.objects.select_for_update().filter(pk=event_id).values_list('pk'))
+
+
+def claim_place(event_id):
+    """Take one place at the event if there is one left; True on success."""
+    return bool(
+        PathEvent.objects.filter(pk=event_id).filter(has_space())
+        .update(participant_count=F('participant_count') + 1)
+    )
+
+
+def join(event, user):
+    """Register `user`; returns CONFIRMED, WAITLISTED or ALREADY_JOINED."""
+    with transaction.atomic():
+        lock_event(event.pk)
+        try:
+            with transaction.atomic():
+                # Inserted waitlisted (not counted by the counter signals), then
+                # confirmed below if the conditional UPDATE got a place.
+                registration = PathEventRegistration.objects.create(event=event, user=user, status=WAITLISTED)
+        except IntegrityError:
+            return ALREADY_JOINED  # unique (event, user): a double submit or an earlier join
+        if not claim_place(event.pk):
+            return WAITLISTED
+        PathEventRegistration.objects.filter(pk=registration.pk).update(status=CONFIRMED)
+        return CONFIRMED
+
+
+def leave(event, user):
+    """Drop `user`'s registration or waitlist spot; a freed place goes to the waitlist. False if not registered."""
+    with transaction.atomic():
+        lock_event(event.pk)
+        registration = PathEventRegistration.objects.filter(event=event, user=user).first()
+        if registration is None:
+            return False
+        # post_delete gives the place back and calls fill_places() (entries/signals.py).
+        registration.delete()
+        return True
+
+
+def fill_places(event_id):
+    """Promote waitlisted registrations, oldest first, while the event has room. Returns how many."""
+    promoted = 0
+    while True:
+        with transaction.atomic():
+            candidate = (
+                PathEventRegistration.objects.filter(event_id=event_id, status=WAITLISTED)
+                .order_by('joined_at', 'pk').values_list('pk', flat=True).first()
+            )
+            if candidate is None or not claim_place(event_id):
+                return promoted
+            if not PathEventRegistration.objects.filter(pk=candidate, status=WAITLISTED).update(status=CONFIRMED):
+                # Left or promoted by someone else meanwhile; give the place back and look again.
+                PathEvent.objects.filter(pk=event_id).update(participant_count=F('participant_count') - 1)
+                continue
+        promoted += 1
@@ -0,0 +1,196 @@
+"""
+Full-text search for journal entries, diary pages and path events.
+
+- PostgreSQL (DATABASE_URL on Railway): each table gets a weighted `search_vector`
+  tsvector column kept current by a trigger, with a GIN index on it.
+- SQLite (local dev): a standalone FTS5 table per model (`<table>_fts`, rowid = pk),
+  kept current from the post_save/post_delete signals in entries/signals.py.
+- Anything else, or SQLite built without FTS5: falls back to icontains.
+
+search() returns the same queryset filtered to matches, annotated with
+`search_rank` (higher is better) and ordered best first.
+"""
+import re
+
+from django.db import connections, OperationalError
+from django.db.models import BooleanField, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+SEARCH_CONFIG = 'pg_catalog.english'
+
+# Searchable columns per table with their PostgreSQL weight (A is most important).
+SEARCH_FIELDS = {
+    'entries_journalentry': (('title', 'A'), ('content', 'C')),
+    'entries_diarypage': (('title', 'A'), ('content', 'C')),
+    'entries_pathevent': (('title', 'A'), ('location', 'B'), ('event_type', 'B'), ('description', 'C')),
+}
+
+# FTS5 bm25() column weights equivalent to the tsvector weights above.
+BM25_WEIGHTS = {'A': 10.0, 'B': 4.0, 'C': 1.0, 'D': 0.5}
+
+_fts_tables = set()
+
+
+def fts_table(table):
+    return f'{table}_fts'
+
+
+def _pg_vector_sql(fields, prefix=''):
+    return ' || '.join(
+        f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce({prefix}{name}, '')), '{weight}')"
+        for name, weight in fields
+    )
+
+
+def _install_sql(vendor, table, fields):
+    columns = ', '.join(name for name, _ in fields)
+    if vendor == 'postgresql':
+        return [
+            f'ALTER TABLE {table} ADD COLUMN IF NOT EXISTS search_vector tsvector',
+            f"""CREATE OR REPLACE FUNCTION {table}_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := {_pg_vector_sql(fields, 'NEW.')};
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql""",
+            f'DROP TRIGGER IF EXISTS {table}_search_vector_trigger ON {table}',
+            f"""CREATE TRIGGER {table}_search_vector_trigger
+BEFORE INSERT OR UPDATE OF {columns} ON {table}
+FOR EACH ROW EXECUTE FUNCTION {table}_search_vector_update()""",
+            f'CREATE INDEX IF NOT EXISTS {table}_search_vector_gin ON {table} USING gin (search_vector)',
+        ]
+    if vendor == 'sqlite':
+        return [f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table(table)} USING fts5({columns}, tokenize='porter unicode61')"]
+    return []
+
+
+def _uninstall_sql(vendor, table):
+    if vendor == 'postgresql':
+        return [
+            f'DROP TRIGGER IF EXISTS {table}_search_vector_trigger ON {table}',
+            f'DROP FUNCTION IF EXISTS {table}_search_vector_update()',
+            f'DROP INDEX IF EXISTS {table}_search_vector_gin',
+            f'ALTER TABLE {table} DROP COLUMN IF EXISTS search_vector',
+        ]
+    if vendor == 'sqlite':
+        return [f'DROP TABLE IF EXISTS {fts_table(table)}']
+    return []
+
+
+def install(schema_editor):
+    """Create the search columns/tables for the current backend and index existing rows."""
+    vendor = schema_editor.connection.vendor
+    for table, fields in SEARCH_FIELDS.items():
+        try:
+            for sql in _install_sql(vendor, table, fields):
+                schema_editor.execute(sql, params=None)
+        except OperationalError:
+            # SQLite compiled without FTS5: search() falls back to icontains.
+            if vendor != 'sqlite':
+                raise
+    rebuild(schema_editor.connection)
+
+
+def uninstall(schema_editor):
+    vendor = schema_editor.connection.vendor
+    for table in SEARCH_FIELDS:
+        for sql in _uninstall_sql(vendor, table):
+            schema_editor.execute(sql, params=None)
+    _fts_tables.clear()
+
+
+def rebuild(connection):
+    """Recompute the index for every row (after bulk loads or raw SQL writes)."""
+    with connection.cursor() as cursor:
+        for table, fields in SEARCH_FIELDS.items():
+            columns = ', '.join(name for name, _ in fields)
+            if connection.vendor == 'postgresql':
+                cursor.execute(f'UPDATE {table} SET search_vector = {_pg_vector_sql(fields)}')
+            elif has_fts_table(connection, table):
+                cursor.execute(f'DELETE FROM {fts_table(table)}')
+                cursor.execute(
+                    f'INSERT INTO {fts_table(table)} (rowid, {columns}) SELECT id, {columns} FROM {table}'
+                )
+
+
+def has_fts_table(connection, table):
+    if connection.vendor != 'sqlite':
+        return False
+    key = (connection.alias, table)
+    if key not in _fts_tables:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE name = %s", [fts_table(table)])
+            if cursor.fetchone() is None:
+                return False
+        _fts_tables.add(key)
+    return True
+
+
+def index_instance(instance):
+    """Refresh one row in the SQLite FTS table (PostgreSQL uses a trigger instead)."""
+    table = instance._meta.db_table
+    fields = SEARCH_FIELDS.get(table)
+    connection = connections[instance._state.db or 'default']
+    if not fields or not has_fts_table(connection, table):
+        return
+    columns = [name for name, _ in fields]
+    placeholders = ', '.join(['%s'] * (len(columns) + 1))
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {fts_table(table)} WHERE rowid = %s', [instance.pk])
+        cursor.execute(
+            f'INSERT INTO {fts_table(table)} (rowid, {", ".join(columns)}) VALUES ({placeholders})',
+            [instance.pk] + [getattr(instance, name) or '' for name in columns],
+        )
+
+
+def unindex_instance(instance):
+    table = instance._meta.db_table
+    connection = connections[instance._state.db or 'default']
+    if table in SEARCH_FIELDS and has_fts_table(connection, table):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {fts_table(table)} WHERE rowid = %s', [instance.pk])
+
+
+def fts5_match_expression(query):
+    """Turn free text into a safe FTS5 MATCH string: every word must match (as a prefix)."""
+    words = re.findall(r'\w+', query)
+    return ' '.join('"{}"*'.format(word.replace('"', '')) for word in words)
+
+
+def search(queryset, query):
+    query = (query or '').strip()
+    if not query:
+        return queryset.none()
+    connection = connections[queryset.db]
+    table = queryset.model._meta.db_table
+    fields = SEARCH_FIELDS[table]
+    quoted = connection.ops.quote_name(table)
+
+    if connection.vendor == 'postgresql':
+        tsquery = f"websearch_to_tsquery('{SEARCH_CONFIG}', %s)"
+        return queryset.filter(
+            RawSQL(f'{quoted}.search_vector @@ {tsquery}', [query], output_field=BooleanField())
+        ).annotate(
+            search_rank=RawSQL(f'ts_rank({quoted}.search_vector, {tsquery})', [query], output_field=FloatField())
+        ).order_by('-search_rank', '-pk')
+
+    if has_fts_table(connection, table):
+        match = fts5_match_expression(query)
+        if not match:
+            return queryset.none()
+        fts = fts_table(table)
+        weights = ', '.join(str(BM25_WEIGHTS[weight]) for _, weight in fields)
+        return queryset.filter(
+            pk__in=RawSQL(f'SELECT rowid FROM {fts} WHERE {fts} MATCH %s', [match])
+        ).annotate(
+            search_rank=RawSQL(
+                f'(SELECT -bm25({fts}, {weights}) FROM {fts} WHERE {fts} MATCH %s AND rowid = {quoted}.id)',
+                [match],
+                output_field=FloatField(),
+            )
+        ).order_by('-search_rank', '-pk')
+
+    condition = Q()
+    for name, _ in fields:
+        condition |= Q(**{f'{name}__icontains': query})
+    return queryset.filter(condition).annotate(search_rank=Value(0.0, output_field=FloatField()))
@@ -0,0 +1,110 @@
+from django.apps import apps
+from django.db import models, transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from . import counters, registrations, search, images, page_cache
+from .models import (
+    JournalEntry, Comment, PathEvent, PathEventRegistration, PathEventComment,
+    DiaryPage, DiaryComment, MediaItem, AboutPage,
+)
+
+# Models shown on the anonymously cached pages (entries/page_cache.py).
+PAGE_CACHE_MODELS = (
+    JournalEntry, Comment, PathEvent, PathEventRegistration, PathEventComment,
+    DiaryPage, DiaryComment, AboutPage,
+)
+
+
+@receiver(post_save, sender=JournalEntry)
+@receiver(post_save, sender=PathEvent)
+@receiver(post_save, sender=DiaryPage)
+def update_search_index(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_instance(instance)
+
+
+@receiver(post_delete, sender=JournalEntry)
+@receiver(post_delete, sender=PathEvent)
+@receiver(post_delete, sender=DiaryPage)
+def remove_from_search_index(sender, instance, **kwargs):
+    search.unindex_instance(instance)
+
+
+@receiver(post_delete, sender=JournalEntry)
+@receiver(post_delete, sender=PathEvent)
+@receiver(post_delete, sender=DiaryPage)
+@receiver(post_delete, sender=MediaItem)
+@receiver(post_delete, sender=AboutPage)
+def release_files(sender, instance, **kwargs):
+    """Drop this row's references to its files (and renditions) once the delete commits."""
+    files = [
+        (field.storage, getattr(instance, field.attname).name)
+        for field in instance._meta.concrete_fields
+        if isinstance(field, models.FileField) and getattr(instance, field.attname)
+    ]
+    renditions = getattr(instance, 'image_renditions', None)
+
+    def release():
+        for storage, name in files:
+            storage.delete(name)
+        if renditions:
+            images.delete_renditions(instance._meta.get_field('image').storage, renditions)
+    transaction.on_commit(release)
+
+
+@receiver(post_save, sender=AboutPage)
+@receiver(post_delete, sender=AboutPage)
+def forget_about_page(sender, **kwargs):
+    AboutPage.clear_cache()
+    transaction.on_commit(AboutPage.clear_cache)
+
+
+def invalidate_page_cache(sender, raw=False, **kwargs):
+    if raw:
+        return
+    # Now, so this request's redirect target is fresh, and again after commit so
+    # a page rendered mid-transaction (from the old rows) doesn't linger.
+    page_cache.invalidate()
+    transaction.on_commit(page_cache.invalidate)
+
+
+for _model in PAGE_CACHE_MODELS:
+    post_save.connect(invalidate_page_cache, sender=_model, dispatch_uid=f'page_cache_save_{_model.__name__}')
+    post_delete.connect(invalidate_page_cache, sender=_model, dispatch_uid=f'page_cache_delete_{_model.__name__}')
+
+
+def count_child_saved(sender, instance, created=False, raw=False, **kwargs):
+    if created and not raw:
+        for parent, fk_name, field, conditions in COUNTED[sender]:
+            if counters.is_counted(instance, conditions):
+                counters.adjust(parent, getattr(instance, f'{fk_name}_id'), field, 1)
+
+
+def count_child_deleted(sender, instance, **kwargs):
+    for parent, fk_name, field, conditions in COUNTED[sender]:
+        if counters.is_counted(instance, conditions):
+            counters.adjust(parent, getattr(instance, f'{fk_name}_id'), field, -1)
+
+
+# {child model: [(parent model, FK name, counter column, conditions)]} from counters.COUNTERS.
+COUNTED = {}
+for _child, _fk, _parent, _field, _conditions in counters.COUNTERS:
+    _child = apps.get_model('entries', _child)
+    COUNTED.setdefault(_child, []).append((apps.get_model('entries', _parent), _fk, _field, _conditions))
+for _model in COUNTED:
+    post_save.connect(count_child_saved, sender=_model, dispatch_uid=f'counters_save_{_model.__name__}')
+    post_delete.connect(count_child_deleted, sender=_model, dispatch_uid=f'counters_delete_{_model.__name__}')
+
+
+# Connected after the counters so the freed place has been given back already.
+@receiver(post_delete, sender=PathEventRegistration)
+def promote_waitlist(sender, instance, **kwargs):
+    if instance.status == PathEventRegistration.STATUS_CONFIRMED:
+        registrations.fill_places(instance.event_id)
+
+
+@receiver(post_save, sender=PathEvent)
+def fill_raised_capacity(sender, instance, created=False, raw=False, **kwargs):
+    if not created and not raw:
+        registrations.fill_places(instance.pk)
@@ -0,0 +1,110 @@
+// Resumable uploads for the media library: files bigger than one chunk are sent
+// in pieces to /media/uploads/ (see entries/uploads.py). If the connection
+// drops, the next attempt asks the server where it stopped and continues from
+// there, including after a page reload (the upload id is kept in localStorage).
+(function () {
+    var form = document.querySelector('form[data-chunked-upload-url]');
+    if (!form || !window.fetch || !window.Blob || !Blob.prototype.slice) {
+        return;
+    }
+    var startUrl = form.getAttribute('data-chunked-upload-url');
+    var chunkSize = parseInt(form.getAttribute('data-chunk-size'), 10);
+    var fileInput = form.querySelector('input[type=file]');
+    var titleInput = form.querySelector('input[name=title]');
+    var progress = form.querySelector('.upload-progress');
+    var csrf = form.querySelector('input[name=csrfmiddlewaretoken]').value;
+    var MAX_RETRIES = 5;
+
+    function storageKey(file) {
+        return 'chunked-upload:' + [file.name, file.size, file.lastModified].join(':');
+    }
+
+    function showProgress(text) {
+        if (progress) {
+            progress.textContent = text;
+        }
+    }
+
+    function request(url, options) {
+        options.headers = Object.assign({'X-CSRFToken': csrf}, options.headers || {});
+        options.credentials = 'same-origin';
+        return fetch(url, options).then(function (response) {
+            return response.json().catch(function () { return {}; }).then(function (data) {
+                data.status = response.status;
+                return data;
+            });
+        });
+    }
+
+    function openSession(file) {
+        var saved = localStorage.getItem(storageKey(file));
+        var resume = saved ? request(saved, {method: 'GET'}) : Promise.resolve({status: 404});
+        return resume.then(function (data) {
+            if (data.status === 200) {
+                return data;
+            }
+            return request(startUrl, {
+                method: 'POST',
+                headers: {'Content-Type': 'application/json'},
+                body: JSON.stringify({filename: file.name, size: file.size, title: titleInput ? titleInput.value : ''})
+            }).then(function (created) {
+                if (created.status !== 201) {
+                    throw new Error(created.error || 'Upload could not be started.');
+                }
+                localStorage.setItem(storageKey(file), created.url);
+                return created;
+            });
+        });
+    }
+
+    function sendFrom(file, session, offset, retries) {
+        if (offset >= file.size) {
+            return Promise.resolve();
+        }
+        showProgress('Uploading… ' + Math.floor(offset * 100 / file.size) + '%');
+        var chunk = file.slice(offset, Math.min(offset + session.chunk_size, file.size));
+        return request(session.url, {
+            method: 'PATCH',
+            headers: {'Upload-Offset': String(offset), 'Content-Type': 'application/octet-stream'},
+            body: chunk
+        }).then(function (data) {
+            if (data.status === 200 || data.status === 409) {
+                // 409: the server has a different offset (e.g. a lost response); continue from it.
+                return sendFrom(file, session, data.offset, MAX_RETRIES);
+            }
+            throw new Error(data.error || 'Upload failed.');
+        }, function () {
+            if (retries <= 0) {
+                throw new Error('Connection lost. Submit again to resume.');
+            }
+            // Network error: wait a little, ask where the server got to, and carry on.
+            return new Promise(function (resolve) { setTimeout(resolve, 2000); }).then(function () {
+                return request(session.url, {method: 'GET'});
+            }).then(function (data) {
+                return sendFrom(file, session, data.offset, retries - 1);
+            }, function () {
+                return sendFrom(file, session, offset, retries - 1);
+            });
+        });
+    }
+
+    form.addEventListener('submit', function (event) {
+        var file = fileInput.files[0];
+        if (!file || file.size <= chunkSize) {
+            return;  // small files use the normal form post
+        }
+        event.preventDefault();
+        var button = form.querySelector('button[type=submit]');
+        button.disabled = true;
+        openSession(file).then(function (session) {
+            return sendFrom(file, session, session.offset, MAX_RETRIES);
+        }).then(function () {
+            localStorage.removeItem(storageKey(file));
+            showProgress('Upload complete.');
+            window.location.reload();
+        }).catch(function (error) {
+            showProgress(error.message);
+            button.disabled = false;
+        });
+    });
+})();
@@ -0,0 +1,47 @@
+// Infinite scroll for the media library: when the pagination links come into
+// view, fetch the next page of cards from /media/items.json and append them.
+// Without JavaScript (or IntersectionObserver) the Older/Newer links still work.
+(function () {
+    var grid = document.querySelector('.media-grid[data-next-url]');
+    var nav = document.querySelector('.cursor-nav');
+    if (!grid || !nav || !window.IntersectionObserver || !window.fetch) {
+        return;
+    }
+    var nextUrl = grid.getAttribute('data-next-url');
+    var loading = false;
+
+    var observer = new IntersectionObserver(function (entries) {
+        if (!entries[0].isIntersecting || loading || !nextUrl) {
+            return;
+        }
+        loading = true;
+        fetch(nextUrl, {credentials: 'same-origin', headers: {'Accept': 'application/json'}})
+            .then(function (response) {
+                if (!response.ok) {
+                    throw new Error(response.statusText);
+                }
+                return response.json();
+            })
+            .then(function (data) {
+                data.items.forEach(function (item) {
+                    grid.insertAdjacentHTML('beforeend', item.html);
+                });
+                nextUrl = data.next;
+                if (!nextUrl) {
+                    observer.disconnect();
+                    nav.remove();
+                }
+            })
+            .catch(function () {
+                observer.disconnect();  // leave the plain links for the user to click
+            })
+            .then(function () {
+                loading = false;
+            });
+    }, {rootMargin: '600px'});
+
+    nav.querySelectorAll('a[rel=prev]').forEach(function (link) {
+        link.style.visibility = 'hidden';  // scrolled pages only ever add older items
+    });
+    observer.observe(nav);
+})();
@@ -0,0 +1,132 @@
+"""
+Content-addressed, reference-counted storage for uploads (the default storage).
+
+Every uploaded file is stored once under its SHA-256:
+
+    blobs/ab/cd/abcd…64 hex….jpg
+
+so the same photo attached to an entry, a diary page and the media library
+takes disk space once, and a stored file never changes (safe to cache forever).
+Files derived from a blob (renditions, WebP/AVIF copies, posters) are named
+after it — `<blob stem>.thumb.jpg`, `<blob>.webp` — and are shared the same way.
+
+Each save() of a blob adds a reference and each delete() drops one; the file
+is removed when the last reference goes. Counts live in the StoredBlob table.
+save() takes its reference before it looks for the file, and delete() unlinks
+while it still holds the row it just dropped, so a save racing the last delete
+either keeps the file alive or waits and writes it again. The blob name says
+nothing about the upload, so MediaItem keeps the original file name itself.
+Names outside blobs/ (uploads from before this storage) behave as before, and
+save_alongside() writes the WebP/AVIF copies of such an upload next to it.
+"""
+import hashlib
+import os
+import re
+import tempfile
+
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+BLOB_DIR = 'blobs'
+BLOB_NAME_RE = re.compile(r'^%s/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}(\.[A-Za-z0-9]{1,10})?$' % BLOB_DIR)
+# A blob name plus at least one more suffix, e.g. '<hash>.thumb.jpg' or '<hash>.jpg.webp'.
+DERIVED_NAME_RE = re.compile(r'^%s/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}(\.[A-Za-z0-9]{1,10}){2,}$' % BLOB_DIR)
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def is_blob_name(name):
+    name = (name or '').replace('\\', '/')
+    return bool(BLOB_NAME_RE.match(name) or DERIVED_NAME_RE.match(name))
+
+
+def blob_name(digest, original_name):
+    ext = os.path.splitext(original_name)[1].lower()
+    if not re.fullmatch(r'\.[a-z0-9]{1,10}', ext):
+        ext = ''
+    return f'{BLOB_DIR}/{digest[:2]}/{digest[2:4]}/{digest}{ext}'
+
+
+def hash_content(content):
+    digest = hashlib.sha256()
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    for chunk in content.chunks(HASH_CHUNK_SIZE):
+        digest.update(chunk if isinstance(chunk, bytes) else chunk.encode())
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    return digest.hexdigest()
+
+
+class ContentAddressedStorage(FileSystemStorage):
+
+    def get_available_name(self, name, max_length=None):
+        # Names are chosen from the content in _save(); nothing to de-duplicate here.
+        return name
+
+    def _save(self, name, content):
+        if DERIVED_NAME_RE.match(name):
+            target = name
+        else:
+            target = blob_name(hash_content(content), name)
+        self._add_reference(target, content.size)
+        if not self.exists(target):
+            try:
+                self._write(target, content)
+            except BaseException:
+                self._drop_reference(target)
+                raise
+        return target
+
+    def save_alongside(self, name, content):
+        """
+        Write `name` exactly as given, outside the blob store and its refcounts:
+        for copies that must sit next to a legacy (pre-blob) upload.
+        """
+        self._write(name, content)
+        return name
+
+    def _write(self, name, content):
+        """Write via a temp file + rename so concurrent identical uploads can't clash."""
+        full_path = self.path(name)
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        if self.directory_permissions_mode is not None:
+            os.chmod(directory, self.directory_permissions_mode)
+        if hasattr(content, 'temporary_file_path'):
+            # Large uploads are already on disk: move instead of copying.
+            file_move_safe(content.temporary_file_path(), full_path, allow_overwrite=True)
+        else:
+            with tempfile.NamedTemporaryFile(dir=directory, delete=False) as tmp:
+                for chunk in content.chunks():
+                    tmp.write(chunk if isinstance(chunk, bytes) else chunk.encode())
+            os.replace(tmp.name, full_path)
+        if self.file_permissions_mode is not None:
+            os.chmod(full_path, self.file_permissions_mode)
+
+    def _add_reference(self, name, size):
+        from .models import StoredBlob
+        if StoredBlob.objects.filter(name=name).update(refcount=F('refcount') + 1):
+            return
+        try:
+            with transaction.atomic():
+                StoredBlob.objects.create(name=name, size=size or 0, refcount=1)
+        except IntegrityError:
+            StoredBlob.objects.filter(name=name).update(refcount=F('refcount') + 1)
+
+    def delete(self, name):
+        if not name:
+            raise ValueError('The name must be given to delete().')
+        if not is_blob_name(name):
+            return super().delete(name)
+        self._drop_reference(name)
+
+    def _drop_reference(self, name):
+        from .models import StoredBlob
+        with transaction.atomic():
+            # The UPDATE locks the row until commit; a concurrent _add_reference waits for it.
+            StoredBlob.objects.filter(name=name, refcount__gt=0).update(refcount=F('refcount') - 1)
+            if StoredBlob.objects.filter(name=name, refcount__lte=0).delete()[0]:
+                super().delete(name)
+
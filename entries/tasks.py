@@ -0,0 +1,183 @@
+"""
+DB-backed background jobs for uploads: resize + responsive renditions for
+entry/event/diary images, metadata extraction for media library items.
+
+Model.save() queues an ImageJob instead of resizing inside the request; a
+worker (`python manage.py process_image_jobs`) claims jobs with a conditional
+UPDATE, so several workers can run side by side without a broker. Failed jobs
+are retried with exponential backoff up to `max_attempts`. Until a job is
+done the page simply shows the original upload.
+"""
+import logging
+import os
+from datetime import timedelta
+
+from django.apps import apps
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import images, metadata
+from .models import ImageJob, resize_image
+
+logger = logging.getLogger(__name__)
+
+# A job left 'running' this long is assumed to belong to a dead worker.
+STALE_AFTER = timedelta(minutes=10)
+RETRY_BACKOFF = timedelta(seconds=30)
+
+
+def enqueue_image_job(instance, field_name='image'):
+    return ImageJob.objects.create(
+        model_label=instance._meta.label_lower,
+        object_id=instance.pk,
+        field_name=field_name,
+        file_name=getattr(instance, field_name).name,
+    )
+
+
+def enqueue_missing_renditions():
+    """Queue a job for every stored image that has no renditions yet (e.g. pre-existing uploads)."""
+    from .models import JournalEntry, PathEvent, DiaryPage
+    queued = 0
+    for model in (JournalEntry, PathEvent, DiaryPage):
+        waiting = ImageJob.objects.filter(
+            model_label=model._meta.label_lower,
+            status__in=[ImageJob.STATUS_PENDING, ImageJob.STATUS_RUNNING],
+        ).values('object_id')
+        rows = (
+            model.objects.filter(image_renditions={}).exclude(image='').exclude(image__isnull=True)
+            .exclude(pk__in=waiting).only('pk', 'image')
+        )
+        jobs = [
+            ImageJob(model_label=model._meta.label_lower, object_id=row.pk, file_name=row.image.name)
+            for row in rows.iterator()
+        ]
+        ImageJob.objects.bulk_create(jobs, batch_size=500)
+        queued += len(jobs)
+    return queued
+
+
+def enqueue_missing_metadata():
+    """Queue a job for every media item whose metadata hasn't been extracted yet."""
+    from .models import MediaItem
+    label = MediaItem._meta.label_lower
+    waiting = ImageJob.objects.filter(
+        model_label=label, status__in=[ImageJob.STATUS_PENDING, ImageJob.STATUS_RUNNING],
+    ).values('object_id')
+    rows = MediaItem.objects.filter(metadata_extracted_at__isnull=True).exclude(pk__in=waiting).only('pk', 'file')
+    jobs = [
+        ImageJob(model_label=label, object_id=row.pk, field_name='file', file_name=row.file.name)
+        for row in rows.iterator()
+    ]
+    ImageJob.objects.bulk_create(jobs, batch_size=500)
+    return len(jobs)
+
+
+def claim_next_job(now=None):
+    """Atomically move the next due job to 'running' and return it (or None)."""
+    now = now or timezone.now()
+    due = ImageJob.objects.filter(
+        Q(status=ImageJob.STATUS_PENDING, run_after__lte=now)
+        | Q(status=ImageJob.STATUS_RUNNING, locked_at__lt=now - STALE_AFTER)
+    ).order_by('run_after', 'id')
+    for job in due.only('pk', 'status', 'locked_at')[:10]:
+        claimed = ImageJob.objects.filter(pk=job.pk, status=job.status, locked_at=job.locked_at).update(
+            status=ImageJob.STATUS_RUNNING, locked_at=now, attempts=F('attempts') + 1
+        )
+        if claimed:
+            return ImageJob.objects.get(pk=job.pk)
+    return None
+
+
+def process_image(job):
+    """Resize the image a job points at. Returns False if the job is obsolete."""
+    model = apps.get_model(job.model_label)
+    instance = model.objects.filter(pk=job.object_id).first()
+    if instance is None:
+        return False
+    field = getattr(instance, job.field_name)
+    if not field or field.name != job.file_name:
+        # Deleted or replaced since queueing; the replacement has its own job.
+        return False
+    original_name = field.name
+    resize_image(field)
+    renditions = images.make_renditions(field)
+    with transaction.atomic():
+        # Mark as already processed so save() doesn't queue another job.
+        instance._saved_image_name = field.name
+        instance.image_renditions = renditions
+        # updated_at too, so cached cards and page validators see the new renditions.
+        instance.save(update_fields=[job.field_name, 'image_renditions', 'updated_at'])
+    if field.name != original_name:
+        field.storage.delete(original_name)
+    return True
+
+
+def process_media_item(job):
+    """
+    Fill in a media item's dimensions/duration and its preview image (a video's
+    poster frame, or a small copy of a large image), correcting type/size from the stored file.
+    """
+    from .models import MediaItem
+    item = MediaItem.objects.filter(pk=job.object_id).first()
+    if item is None or item.file.name != job.file_name:
+        return False
+    path = item.file.path
+    item.file_type = metadata.classify(item.file.name)
+    item.mime_type = metadata.guess_mime(item.file.name)
+    item.file_size = item.file.size
+    preview = None
+    if item.file_type == MediaItem.FILE_TYPE_IMAGE:
+        item.width, item.height = metadata.probe_image(path)
+        preview = metadata.image_preview(path)
+    elif item.file_type == MediaItem.FILE_TYPE_VIDEO:
+        item.width, item.height, item.duration = metadata.probe_video(path)
+        preview = metadata.extract_poster(path, item.duration)
+    if preview:
+        item.release_poster()  # a retried job replaces, rather than leaks, an earlier preview
+        stem = os.path.splitext(os.path.basename(item.file.name))[0]
+        item.poster.save(f'{stem}.jpg', ContentFile(preview), save=False)
+    item.metadata_extracted_at = timezone.now()
+    item.save(update_fields=[
+        'file_type', 'mime_type', 'file_size', 'width', 'height', 'duration', 'metadata_extracted_at', 'poster',
+    ])
+    return True
+
+
+# Handler per model; anything else is an entry/event/diary image.
+JOB_HANDLERS = {
+    'entries.mediaitem': process_media_item,
+}
+
+
+def run_job(job):
+    try:
+        JOB_HANDLERS.get(job.model_label, process_image)(job)
+    except Exception as exc:
+        logger.exception('Image job %s failed', job.pk)
+        job.last_error = f'{exc.__class__.__name__}: {exc}'
+        if job.attempts >= job.max_attempts:
+            job.status = ImageJob.STATUS_FAILED
+        else:
+            job.status = ImageJob.STATUS_PENDING
+            job.run_after = timezone.now() + RETRY_BACKOFF * (2 ** (job.attempts - 1))
+    else:
+        job.status = ImageJob.STATUS_DONE
+        job.last_error = ''
+    job.locked_at = None
+    job.save(update_fields=['status', 'last_error', 'run_after', 'locked_at', 'updated_at'])
+    return job
+
+
+def process_jobs(limit=None):
+    """Run due jobs until the queue is empty (or `limit` jobs ran). Returns the count."""
+    processed = 0
+    while limit is None or processed < limit:
+        job = claim_next_job()
+        if job is None:
+            break
+        run_job(job)
+        processed += 1
+    return processed
@@ -0,0 +1,16 @@
+from django import template
+
+register = template.Library()
+
+
+@register.filter
+def card_role(obj, user):
+    """
+    Which variant of a cached card `user` sees: staff and owners get the
+    edit/delete dropdown, everyone else the same plain card.
+    """
+    if user.is_staff:
+        return 'staff'
+    if user.is_authenticated and getattr(obj, 'author_id', None) == user.id:
+        return 'owner'
+    return 'viewer'
@@ -1,3 +1,1578 @@
-from django.test import TestCase
+import importlib
+import json
+import marshal
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from PIL import Image
+from django.apps import apps as django_apps
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import connection, connections
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import images, metadata, page_cache, registrations, search, tasks, uploads
+from .media import parse_range
+from .pagination import decode_cursor, encode_cursor
+from .templatetags.entries_cards import card_role
+from .views import filter_media_items
+from .models import (
+    JournalEntry, Comment, PathEvent, PathEventComment, PathEventRegistration, DiaryPage, DiaryComment,
+    AboutPage, ImageJob, MediaItem, StoredBlob, UploadSession, EXCERPT_MAX_LENGTH, make_excerpt,
+)
+
+
+def image_bytes(width, height, format='JPEG'):
+    buffer = BytesIO()
+    Image.new('RGB', (width, height), '#d9825b').save(buffer, format=format)
+    return buffer.getvalue()
+
+
+class TempMediaMixin:
+    """Point MEDIA_ROOT at a fresh directory for each test."""
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+
+
+class QueryCountTests(TestCase):
+    """List and detail views must not issue a query per row (e.g. lazy author fetches)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', password='pw', is_staff=True)
+        cls.reader = User.objects.create_user('reader', password='pw')
+        cls.entry = JournalEntry.objects.create(title='Entry', content='Body', author=cls.staff)
+        cls.event = PathEvent.objects.create(
+            title='Run', description='Go', event_date=timezone.now(), created_by=cls.staff,
+        )
+        cls.page = DiaryPage.objects.create(title='Page', content='Body', status='public', author=cls.staff)
+
+    def add_rows(self, n):
+        for i in range(n):
+            author = User.objects.create(username=f'user{User.objects.count()}')
+            JournalEntry.objects.create(title=f'Entry {i}', content='Body', author=author)
+            DiaryPage.objects.create(title=f'Page {i}', content='Body', status='public', author=self.staff)
+            Comment.objects.create(entry=self.entry, author=author, content='Hi')
+            PathEventComment.objects.create(event=self.event, author=author, content='Hi')
+            DiaryComment.objects.create(page=self.page, author=author, content='Hi')
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def assertConstantQueries(self, url):
+        self.add_rows(1)
+        few = self.count_queries(url)
+        self.add_rows(5)
+        many = self.count_queries(url)
+        self.assertEqual(few, many, f'{url} issued {many - few} extra queries for 5 extra rows')
+
+    def test_home(self):
+        self.client.force_login(self.reader)
+        self.assertConstantQueries(reverse('home'))
+
+    def test_entries_list(self):
+        self.client.force_login(self.reader)
+        self.assertConstantQueries(reverse('entries_list'))
+
+    def test_entry_detail(self):
+        self.client.force_login(self.reader)
+        self.assertConstantQueries(reverse('entry_detail', args=[self.entry.pk]))
+
+    def test_diary_list(self):
+        self.assertConstantQueries(reverse('diary_list'))
+
+    def test_diary_page_detail(self):
+        self.client.force_login(self.reader)
+        self.assertConstantQueries(reverse('diary_page_detail', args=[self.page.pk]))
+
+    def test_path_event_detail(self):
+        self.client.force_login(self.reader)
+        self.assertConstantQueries(reverse('path_event_detail', args=[self.event.pk]))
+
+    def test_path_events_calendar(self):
+        # Events with every optional card field set, so a field left out of
+        # EVENT_CARD_FIELDS shows up as a deferred load per event. A month
+        # without `now` in it keeps the number of list queries fixed.
+        month_start = timezone.now().replace(year=timezone.now().year + 1, month=3, day=1, hour=9)
+
+        def add_events(n):
+            for i in range(n):
+                start = month_start + timedelta(days=i)
+                PathEvent.objects.create(
+                    title=f'Run {i}', description='Go', event_date=start, event_end_date=start + timedelta(hours=2),
+                    location='Park', max_participants=10, created_by=self.staff,
+                )
+
+        url = reverse('path_events_calendar') + f'?year={month_start.year}&month=3'
+        for user in (self.reader, self.staff):
+            self.client.force_login(user)
+            add_events(1)
+            few = self.count_queries(url)
+            add_events(5)
+            self.assertEqual(few, self.count_queries(url), f'{url} issued extra queries for 5 extra events')
+
+
+@skipUnlessDBFeature('supports_explaining_query_execution')
+class QueryPlanTests(TestCase):
+    """The hot list/lookup queries must be answered from the indexes in migration 0023."""
+
+    ROWS = 300
+
+    @classmethod
+    def setUpTestData(cls):
+        users = User.objects.bulk_create([User(username=f'user{i}', email=f'user{i}@example.com') for i in range(cls.ROWS)])
+        cls.author = users[0]
+        now = timezone.now()
+        JournalEntry.objects.bulk_create([
+            JournalEntry(title=f'Entry {i}', content='Body', author=users[i % 50], is_published=i % 3 > 0)
+            for i in range(cls.ROWS)
+        ])
+        DiaryPage.objects.bulk_create([
+            DiaryPage(title=f'Page {i}', content='Body', author=cls.author, status='public' if i % 3 else 'draft')
+            for i in range(cls.ROWS)
+        ])
+        PathEvent.objects.bulk_create([
+            PathEvent(
+                title=f'Run {i}', description='Go', created_by=cls.author,
+                event_date=now + timedelta(days=i - cls.ROWS // 2), is_published=i % 3 > 0,
+            )
+            for i in range(cls.ROWS)
+        ])
+
+    def setUp(self):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                # A few hundred rows fit in a page or two; make the planner show its index choice.
+                cursor.execute('SET LOCAL enable_seqscan = off')
+            elif connection.vendor == 'sqlite':
+                cursor.execute('ANALYZE')
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan, f'{index_name} not used:\n{plan}')
+
+    def test_published_entries(self):
+        self.assertUsesIndex(
+            JournalEntry.objects.filter(is_published=True).order_by('-created_at', '-pk')[:21],
+            'entries_entry_published_idx',
+        )
+
+    def entry_list_plans(self, url):
+        """Plans of the journal-entry queries entries_list really runs for a non-staff author."""
+        self.client.force_login(self.author)
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        plans = []
+        with connection.cursor() as cursor:
+            for query in ctx.captured_queries:
+                if query['sql'].startswith('SELECT') and 'FROM "entries_journalentry"' in query['sql']:
+                    cursor.execute(f'{connection.ops.explain_query_prefix()} {query["sql"]}')
+                    plans.append('\n'.join(' '.join(map(str, row)) for row in cursor.fetchall()))
+        return plans
+
+    def test_entries_list_for_author(self):
+        published, own = self.entry_list_plans(reverse('entries_list'))
+        self.assertIn('entries_entry_published_idx', published)
+        self.assertIn('entries_entry_author_idx', own)
+        page = self.client.get(reverse('entries_list')).context['page']
+        published, own = self.entry_list_plans(reverse('entries_list') + f'?before={page.older_cursor}')
+        self.assertIn('entries_entry_published_idx', published)
+        self.assertIn('entries_entry_author_idx', own)
+
+    def test_public_diary_pages(self):
+        self.assertUsesIndex(
+            DiaryPage.objects.filter(status='public').order_by('-created_at', '-pk')[:21],
+            'entries_diary_public_idx',
+        )
+
+    def test_upcoming_events(self):
+        self.assertUsesIndex(
+            PathEvent.objects.filter(is_published=True, event_date__gte=timezone.now()).order_by('event_date'),
+            'entries_event_published_idx',
+        )
+
+    def test_login_email_lookup(self):
+        self.assertUsesIndex(User.objects.filter(email='user7@example.com'), 'entries_user_email_idx')
+
+
+class RegistrationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', password='pw', is_staff=True)
+        cls.users = [User.objects.create_user(f'runner{i}', password='pw') for i in range(4)]
+        cls.event = PathEvent.objects.create(
+            title='Run', description='Go', event_date=timezone.now(), created_by=cls.staff, max_participants=2,
+        )
+
+    def statuses(self):
+        return dict(self.event.registrations.values_list('user__username', 'status'))
+
+    def test_join_past_capacity_waitlists(self):
+        results = [registrations.join(self.event, user) for user in self.users[:3]]
+        self.assertEqual(results, [registrations.CONFIRMED, registrations.CONFIRMED, registrations.WAITLISTED])
+        self.assertEqual(registrations.join(self.event, self.users[0]), registrations.ALREADY_JOINED)
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.participant_count, 2)
+
+    def test_leave_promotes_oldest_waitlisted(self):
+        for user in self.users:
+            registrations.join(self.event, user)
+        self.assertTrue(registrations.leave(self.event, self.users[0]))
+        self.assertEqual(self.statuses(), {'runner1': 'confirmed', 'runner2': 'confirmed', 'runner3': 'waitlisted'})
+        registrations.leave(self.event, self.users[3])  # a waitlisted user leaving frees nothing
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.participant_count, 2)
+
+    def test_raising_capacity_promotes(self):
+        for user in self.users:
+            registrations.join(self.event, user)
+        self.event.max_participants = 3
+        self.event.save()
+        self.assertEqual(self.event.registrations.filter(status='confirmed').count(), 3)
+
+    def test_join_view(self):
+        self.client.force_login(self.users[0])
+        url = reverse('path_event_join', args=[self.event.pk])
+        self.client.post(url)
+        response = self.client.post(url)  # double submit
+        self.assertRedirects(response, reverse('path_event_detail', args=[self.event.pk]))
+        self.assertEqual(self.event.registrations.count(), 1)
+
+
+class RegistrationConcurrencyTests(TransactionTestCase):
+    """Bursts of simultaneous joins/leaves must never confirm more people than max_participants."""
+
+    JOINERS = 20
+    PLACES = 5
+
+    def run_concurrently(self, func, event, users):
+        """Call func(event, user) for every user in its own thread, all released at once."""
+        barrier = threading.Barrier(len(users))
+        errors = []
+
+        def run(user):
+            try:
+                barrier.wait()
+                func(event, user)
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=run, args=(user,)) for user in users]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+    def assertPlaces(self, event, confirmed, total):
+        event.refresh_from_db()
+        self.assertEqual(event.participant_count, confirmed)
+        self.assertEqual(event.registrations.filter(status=PathEventRegistration.STATUS_CONFIRMED).count(), confirmed)
+        self.assertEqual(event.registrations.count(), total)
+
+    def test_concurrent_joins_and_leaves(self):
+        staff = User.objects.create_user('staff', password='pw', is_staff=True)
+        users = [User.objects.create_user(f'runner{i}') for i in range(self.JOINERS)]
+        event = PathEvent.objects.create(
+            title='Run', description='Go', event_date=timezone.now(), created_by=staff, max_participants=self.PLACES,
+        )
+
+        self.run_concurrently(registrations.join, event, users)
+        self.assertPlaces(event, self.PLACES, self.JOINERS)
+
+        # Every confirmed runner leaves at once; the waitlist takes each freed place.
+        leavers = [registration.user for registration in event.registrations.filter(status='confirmed').select_related('user')]
+        self.run_concurrently(registrations.leave, event, leavers)
+        self.assertPlaces(event, self.PLACES, self.JOINERS - self.PLACES)
+
+
+@override_settings(REQUEST_TIMING=True, REQUEST_TIMING_SLOW_MS=0, REQUEST_TIMING_REPORT_INTERVAL=0)
+class RequestTimingTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', password='pw', is_staff=True)
+        cls.reader = User.objects.create_user('reader', password='pw')
+
+    def test_server_timing_for_staff(self):
+        self.client.force_login(self.staff)
+        with self.assertLogs('entries.timing', 'WARNING') as logs:
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(reverse('entries_list'))
+        header = response['Server-Timing']
+        self.assertIn(f'desc="{len(ctx.captured_queries)} queries"', header)
+        self.assertRegex(header, r'tpl;dur=\d+\.\d, total;dur=\d+\.\d$')
+        self.assertIn('view=entries_list', logs.output[0])
+
+    def test_no_header_for_others(self):
+        self.client.force_login(self.reader)
+        with self.assertLogs('entries.timing', 'WARNING'):
+            response = self.client.get(reverse('entries_list'))
+        self.assertNotIn('Server-Timing', response)
+
+    def test_user_not_loaded_just_for_the_header(self):
+        # Serving an upload never looks at request.user; neither may the middleware.
+        self.client.force_login(self.staff)
+        with self.assertLogs('entries.timing', 'WARNING'):
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(reverse('media_file', args=['missing.jpg']))
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(len(ctx.captured_queries), 0)
+        self.assertNotIn('Server-Timing', response)
+
+    @override_settings(REQUEST_TIMING_PUBLIC_HEADER=True)
+    def test_public_header(self):
+        with self.assertLogs('entries.timing', 'WARNING'):
+            response = self.client.get(reverse('media_file', args=['missing.jpg']))
+        self.assertIn('desc="0 queries"', response['Server-Timing'])
+
+
+class BenchmarkCommandTests(TestCase):
+    """seed_data + benchmark must keep working as views change (and no page may 500)."""
+
+    def test_seed_and_benchmark(self):
+        call_command(
+            'seed_data', users=5, entries=30, events=6, diary_pages=6, media=0, stdout=StringIO(),
+        )
+        entry = JournalEntry.objects.filter(comments__isnull=False).first()
+        self.assertEqual(entry.comment_count, entry.comments.count())
+        # Seeded excerpts match what save() would have written.
+        for model in (JournalEntry, PathEvent, DiaryPage):
+            obj = model.objects.first()
+            stored = obj.excerpt
+            obj.update_excerpt()
+            self.assertEqual(stored, obj.excerpt)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'bench.json')
+            call_command('benchmark', requests=1, warmup=0, json=path, stdout=StringIO())
+            call_command('benchmark', requests=1, warmup=0, baseline=path, tolerance=10_000, stdout=StringIO())
+            with open(path) as fh:
+                results = json.load(fh)
+        self.assertIn('entry_detail [staff]', results)
+        self.assertEqual([label for label, result in results.items() if max(result['status']) >= 500], [])
+
+
+class ProfilingTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', password='pw', is_staff=True)
+        cls.reader = User.objects.create_user('reader', password='pw')
+        cls.event = PathEvent.objects.create(
+            title='Run', description='Go', event_date=timezone.now(), created_by=cls.staff,
+        )
+
+    def test_staff_report(self):
+        self.client.force_login(self.staff)
+        url = reverse('path_event_detail', args=[self.event.pk])
+        response = self.client.get(url, {'_profile': 'tottime'}, HTTP_IF_NONE_MATCH='*')
+        self.assertEqual(response['Content-Type'], 'text/plain; charset=utf-8')
+        report = response.content.decode()
+        self.assertIn('view: path_event_detail   status: 200', report)
+        self.assertIn('FROM "entries_pathevent"', report)
+        self.assertIn('top 60 by tottime', report)
+        self.assertIn('filename:lineno(function)', report)
+
+    def test_raw_stats_download(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('diary_list'), HTTP_X_PROFILE='prof')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="diary_list.prof"')
+        self.assertIsInstance(marshal.loads(response.content), dict)
+
+    def test_ignored_for_other_users(self):
+        self.client.force_login(self.reader)
+        response = self.client.get(reverse('path_event_detail', args=[self.event.pk]), {'_profile': '1'})
+        self.assertEqual(response['Content-Type'], 'text/html; charset=utf-8')
+
+
+class ChunkedUploadTests(TempMediaMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', password='pw', is_staff=True)
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.staff)
+        self.session = UploadSession.objects.create(uploaded_by=self.staff, filename='notes.txt', title='Notes', size=10)
+        self.url = reverse('media_upload_chunk', args=[self.session.pk])
+
+    def patch(self, data, offset):
+        return self.client.patch(
+            self.url, data, content_type='application/offset+octet-stream', HTTP_UPLOAD_OFFSET=str(offset),
+        )
+
+    def part_contents(self):
+        with open(uploads.part_path(self.session), 'rb') as fh:
+            return fh.read()
+
+    def test_offset_mismatch(self):
+        self.patch(b'hello', 0)
+        response = self.patch(b'XXXXX', 0)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response['Upload-Offset'], '5')
+        self.assertEqual(self.part_contents(), b'hello')
+
+    def test_duplicate_patch_while_chunk_in_flight(self):
+        token = uploads.claim_chunk(self.session, 0)
+        response = self.patch(b'XXXXX', 0)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response['Upload-Offset'], '0')
+        self.assertFalse(os.path.exists(uploads.part_path(self.session)))
+        self.assertTrue(uploads.release_chunk(self.session, token, 0))
+        self.assertEqual(self.patch(b'hello', 0).status_code, 200)
+
+    def test_stale_claim_is_taken_over(self):
+        uploads.claim_chunk(self.session, 0)
+        UploadSession.objects.filter(pk=self.session.pk).update(
+            writer_since=timezone.now() - uploads.CLAIM_TIMEOUT - timedelta(seconds=1),
+        )
+        self.assertEqual(self.patch(b'hello', 0).status_code, 200)
+
+    def test_short_chunk_resumes_from_received_bytes(self):
+        # The client promised 5 bytes and disconnected after 3.
+        offset = uploads.append_chunk(self.session, BytesIO(b'hel'), 0, 5)
+        self.assertEqual(offset, 3)
+        session = UploadSession.objects.get(pk=self.session.pk)
+        self.assertEqual((session.offset, session.writer), (3, None))
+        self.assertEqual(self.patch(b'lo', 3)['Upload-Offset'], '5')
+        self.assertEqual(self.part_contents(), b'hello')
+
+    def test_failed_write_releases_claim(self):
+        class Broken:
+            def read(self, size):
+                raise OSError('connection reset')
+
+        with self.assertRaises(OSError):
+            uploads.append_chunk(self.session, Broken(), 0, 5)
+        self.assertIsNone(UploadSession.objects.get(pk=self.session.pk).writer)
+        self.assertEqual(self.patch(b'hello', 0).status_code, 200)
+
+    def test_oversized_chunk(self):
+        self.assertEqual(self.patch(b'x' * 11, 0).status_code, 413)
+
+    def test_finish(self):
+        self.patch(b'hello', 0)
+        response = self.patch(b'world', 5)
+        self.assertEqual(response.status_code, 200)
+        item = MediaItem.objects.get(pk=response.json()['item'])
+        self.assertEqual(item.title, 'Notes')
+        with item.file.open('rb') as fh:
+            self.assertEqual(fh.read(), b'helloworld')
+        self.assertFalse(UploadSession.objects.filter(pk=self.session.pk).exists())
+        self.assertFalse(os.path.exists(uploads.part_path(self.session)))
+
+
+class ContentAddressedStorageTests(TempMediaMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', password='pw', is_staff=True)
+
+    def add_item(self, name, content):
+        with self.captureOnCommitCallbacks(execute=True):
+            return MediaItem.objects.create(file=ContentFile(content, name=name), uploaded_by=self.staff)
+
+    def refcount(self, name):
+        blob = StoredBlob.objects.filter(name=name).first()
+        return blob.refcount if blob else 0
+
+    def test_identical_uploads_share_one_blob(self):
+        first = self.add_item('a.txt', b'same bytes')
+        second = self.add_item('b.txt', b'same bytes')
+        self.assertEqual(first.file.name, second.file.name)
+        self.assertTrue(first.file.name.startswith('blobs/'))
+        self.assertEqual(self.refcount(first.file.name), 2)
+        self.assertNotEqual(self.add_item('c.txt', b'other bytes').file.name, first.file.name)
+
+    def test_original_name_is_kept(self):
+        item = self.add_item('Race Notes.txt', b'notes')
+        item.refresh_from_db()
+        self.assertEqual(item.original_name, 'Race Notes.txt')
+        self.assertEqual(str(item), 'Race Notes.txt')
+        item.title = 'Notes'
+        self.assertEqual(str(item), 'Notes')
+
+    def test_delete_releases_reference(self):
+        first = self.add_item('a.txt', b'same bytes')
+        second = self.add_item('b.txt', b'same bytes')
+        name = first.file.name
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertEqual(self.refcount(name), 1)
+        self.assertTrue(default_storage.exists(name))
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(StoredBlob.objects.filter(name=name).exists())
+        self.assertFalse(default_storage.exists(name))
+
+    def test_replacing_the_file_releases_the_old_blob(self):
+        item = MediaItem.objects.get(pk=self.add_item('a.txt', b'first').pk)
+        old_name = item.file.name
+        item.file = ContentFile(b'second', name='b.txt')
+        with self.captureOnCommitCallbacks(execute=True):
+            item.save()
+        self.assertFalse(default_storage.exists(old_name))
+        self.assertEqual(self.refcount(item.file.name), 1)
+        self.assertEqual(item.original_name, 'b.txt')
+
+    def test_save_rewrites_a_released_file(self):
+        name = default_storage.save('a.txt', ContentFile(b'bytes'))
+        default_storage.delete(name)
+        self.assertEqual(default_storage.save('a.txt', ContentFile(b'bytes')), name)
+        self.assertTrue(default_storage.exists(name))
+        self.assertEqual(self.refcount(name), 1)
+
+    def legacy_item(self, name, content):
+        path = os.path.join(self.media_root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as fh:
+            fh.write(content)
+        item = MediaItem.objects.create(file=name, uploaded_by=self.staff)
+        MediaItem.objects.filter(pk=item.pk).update(original_name='')
+        return item
+
+    def test_migrating_legacy_uploads_keeps_their_names(self):
+        item = self.legacy_item('media_library/Race Notes.txt', b'notes')
+        call_command('migrate_media_to_blobs', stdout=StringIO())
+        item.refresh_from_db()
+        self.assertTrue(item.file.name.startswith('blobs/'))
+        self.assertEqual(item.original_name, 'Race Notes.txt')
+        self.assertEqual(str(item), 'Race Notes.txt')
+
+    def test_original_name_backfill(self):
+        migration = importlib.import_module('entries.migrations.0025_mediaitem_original_name')
+        legacy = self.legacy_item('media_library/Race Notes.txt', b'notes')
+        blob = self.add_item('a.txt', b'bytes')
+        MediaItem.objects.filter(pk=blob.pk).update(original_name='')
+        migration.fill_original_names(django_apps, None)
+        self.assertEqual(MediaItem.objects.get(pk=legacy.pk).original_name, 'Race Notes.txt')
+        self.assertEqual(MediaItem.objects.get(pk=blob.pk).original_name, '')
+
+    def test_failed_write_drops_the_reference(self):
+        class Unreadable(ContentFile):
+            def chunks(self, chunk_size=None):
+                if self.read_once:
+                    raise OSError('disk full')
+                self.read_once = True
+                return super().chunks(chunk_size)
+
+        content = Unreadable(b'bytes', name='a.txt')
+        content.read_once = False
+        with self.assertRaises(OSError):
+            default_storage.save('a.txt', content)
+        self.assertEqual(StoredBlob.objects.count(), 0)
+
+
+class CounterTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author', password='pw')
+        cls.reader = User.objects.create_user('reader', password='pw')
+        cls.entry = JournalEntry.objects.create(title='Entry', content='Body', author=cls.author, is_published=True)
+
+    def test_comments_are_counted(self):
+        comment = Comment.objects.create(entry=self.entry, author=self.reader, content='Hi')
+        Comment.objects.create(entry=self.entry, author=self.reader, content='Again')
+        self.entry.refresh_from_db()
+        self.assertEqual(self.entry.comment_count, 2)
+        comment.delete()
+        self.entry.refresh_from_db()
+        self.assertEqual(self.entry.comment_count, 1)
+
+    def test_stale_save_keeps_counter(self):
+        stale = JournalEntry.objects.get(pk=self.entry.pk)
+        Comment.objects.create(entry=self.entry, author=self.reader, content='Hi')
+        stale.title = 'Renamed'
+        stale.save()
+        self.entry.refresh_from_db()
+        self.assertEqual((self.entry.title, self.entry.comment_count), ('Renamed', 1))
+
+    def test_deferred_fields_are_neither_loaded_nor_written(self):
+        partial = JournalEntry.objects.defer('is_published').get(pk=self.entry.pk)
+        JournalEntry.objects.filter(pk=self.entry.pk).update(is_published=False)
+        partial.title = 'Renamed'
+        with CaptureQueriesContext(connection) as ctx:
+            partial.save()
+        update, = [query['sql'] for query in ctx if 'entries_journalentry"' in query['sql']]
+        self.assertTrue(update.startswith('UPDATE'))  # no SELECT to load the deferred field
+        self.assertNotIn('is_published', update)
+        self.entry.refresh_from_db()
+        self.assertEqual((self.entry.title, self.entry.is_published), ('Renamed', False))
+
+    def test_reconcile(self):
+        Comment.objects.create(entry=self.entry, author=self.reader, content='Hi')
+        JournalEntry.objects.filter(pk=self.entry.pk).update(comment_count=7)
+        call_command('reconcile_counters', dry_run=True, stdout=StringIO())
+        self.entry.refresh_from_db()
+        self.assertEqual(self.entry.comment_count, 7)
+        call_command('reconcile_counters', stdout=StringIO())
+        self.entry.refresh_from_db()
+        self.assertEqual(self.entry.comment_count, 1)
+
+    def test_cached_card_shows_new_count(self):
+        self.client.force_login(self.reader)
+        url = reverse('entries_list')
+        self.assertContains(self.client.get(url), '0 comments')
+        Comment.objects.create(entry=self.entry, author=self.reader, content='Hi')
+        # updated_at is unchanged; the counter in the fragment key makes the card re-render.
+        self.assertContains(self.client.get(url), '1 comment<')
+
+
+class CursorPaginationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author', password='pw')
+        other = User.objects.create_user('other', password='pw')
+        start = timezone.now()
+        for i in range(25):
+            entry = JournalEntry.objects.create(
+                title=f'Entry {i}', content='Body', author=cls.author if i % 2 else other, is_published=i % 3 > 0,
+            )
+            # Two entries per timestamp, so ties are broken by pk across both querysets.
+            JournalEntry.objects.filter(pk=entry.pk).update(created_at=start - timedelta(minutes=i // 2))
+
+    def walk(self, url, direction='before', cursor=None):
+        titles = []
+        while True:
+            response = self.client.get(url, {'per_page': 4, direction: cursor} if cursor else {'per_page': 4})
+            page = response.context['page']
+            page_titles = [entry.title for entry in page]
+            # Newer pages come back one at a time, each newest first.
+            titles = titles + page_titles if direction == 'before' else page_titles + titles
+            cursor = page.older_cursor if direction == 'before' else page.newer_cursor
+            if cursor is None:
+                return titles, page
+
+    def test_published_and_own_entries_merge_in_order(self):
+        self.client.force_login(self.author)
+        visible = JournalEntry.objects.filter(is_published=True) | JournalEntry.objects.filter(author=self.author)
+        expected = list(visible.order_by('-created_at', '-pk').values_list('title', flat=True))
+        titles, last_page = self.walk(reverse('entries_list'))
+        self.assertEqual(titles, expected)
+        first = list(last_page)[0]
+        newer, _ = self.walk(reverse('entries_list'), 'after', encode_cursor(first))
+        self.assertEqual(newer, expected[:expected.index(first.title)])
+
+    def test_cursor_round_trip(self):
+        entry = JournalEntry.objects.first()
+        self.assertEqual(decode_cursor(encode_cursor(entry)), (entry.created_at, entry.pk))
+
+    def test_tampered_cursor_falls_back_to_first_page(self):
+        self.client.force_login(self.author)
+        first = self.client.get(reverse('entries_list'), {'per_page': 4}).context['page']
+        for cursor in ('not-a-cursor', encode_cursor(first.items[0])[:-3] + '!!!', 'bm90fGEtbnVtYmVy'):
+            page = self.client.get(reverse('entries_list'), {'per_page': 4, 'before': cursor}).context['page']
+            self.assertEqual([entry.pk for entry in page], [entry.pk for entry in first])
+
+
+LOCMEM_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests-default'},
+    'fragments': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests-fragments'},
+}
+
+
+@override_settings(CACHES=LOCMEM_CACHES, PAGE_CACHE_TIMEOUT=600)
+class PageCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', password='pw', is_staff=True)
+        cls.page = DiaryPage.objects.create(title='First page', content='Body', status='public', author=cls.staff)
+
+    def setUp(self):
+        caches['default'].clear()
+        self.url = reverse('diary_list')
+
+    def test_miss_then_hit(self):
+        self.assertEqual(self.client.get(self.url)[page_cache.CACHE_HEADER], 'miss')
+        response = self.client.get(self.url)
+        self.assertEqual(response[page_cache.CACHE_HEADER], 'hit')
+        self.assertContains(response, 'First page')
+
+    def test_key_uses_only_known_params(self):
+        self.client.get(self.url, {'per_page': 5})
+        self.assertEqual(self.client.get(self.url, {'per_page': 5, 'utm_source': 'x', 'v': 1})[page_cache.CACHE_HEADER], 'hit')
+        self.assertEqual(self.client.get(self.url, {'per_page': 6})[page_cache.CACHE_HEADER], 'miss')
+        self.assertNotIn(page_cache.CACHE_HEADER, self.client.get(self.url, {'before': 'x' * 500}))
+
+    def test_saves_invalidate(self):
+        self.client.get(self.url)
+        DiaryPage.objects.create(title='Second page', content='Body', status='public', author=self.staff)
+        response = self.client.get(self.url)
+        self.assertEqual(response[page_cache.CACHE_HEADER], 'miss')
+        self.assertContains(response, 'Second page')
+
+    def test_logged_in_users_bypass(self):
+        self.client.get(self.url)
+        self.client.force_login(self.staff)
+        self.assertNotIn(page_cache.CACHE_HEADER, self.client.get(self.url))
+
+    def test_pending_messages_bypass(self):
+        self.client.get(self.url)
+        self.client.cookies['messages'] = 'pending'
+        self.assertNotIn(page_cache.CACHE_HEADER, self.client.get(self.url))
+
+    def test_response_setting_cookies_is_not_stored(self):
+        @page_cache.cache_anonymous
+        def view(request):
+            response = HttpResponse('hello')
+            response.set_cookie('seen', '1')
+            return response
+
+        request = RequestFactory().get('/cookie/')
+        request.user = AnonymousUser()
+        view(request)
+        self.assertNotIn(page_cache.CACHE_HEADER, view(request))
+
+
+@override_settings(CACHES=LOCMEM_CACHES, PAGE_CACHE_TIMEOUT=600)
+class ConditionalDetailTests(TestCase):
+    """Detail pages answer 304 until something they show changes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', password='pw', is_staff=True)
+        cls.reader = User.objects.create_user('reader', password='pw')
+        cls.other = User.objects.create_user('other', password='pw')
+        cls.entry = JournalEntry.objects.create(title='Entry', content='Body', author=cls.staff, is_published=True)
+        cls.event = PathEvent.objects.create(
+            title='Run', description='Go', event_date=timezone.now() + timedelta(days=3),
+            created_by=cls.staff, is_published=True, max_participants=1,
+        )
+        cls.page = DiaryPage.objects.create(title='Page', content='Body', status='public', author=cls.staff)
+
+    def setUp(self):
+        caches['default'].clear()
+        self.client.force_login(self.reader)
+
+    def etag(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('private', response['Cache-Control'])
+        return response['ETag']
+
+    def revalidate(self, url, etag):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code
+
+    def assertChanged(self, url, change):
+        etag = self.etag(url)
+        self.assertEqual(self.revalidate(url, etag), 304)
+        change()
+        self.assertEqual(self.revalidate(url, etag), 200)
+
+    def test_comment_added_and_deleted(self):
+        url = reverse('entry_detail', args=[self.entry.pk])
+        self.assertChanged(url, lambda: Comment.objects.create(entry=self.entry, author=self.other, content='Hi'))
+        self.assertChanged(url, lambda: Comment.objects.filter(entry=self.entry).delete())
+
+    def test_edit(self):
+        url = reverse('entry_detail', args=[self.entry.pk])
+
+        def edit():
+            self.entry.title = 'Renamed'
+            self.entry.save()
+        self.assertChanged(url, edit)
+
+    def test_registration_join_leave_and_promotion(self):
+        url = reverse('path_event_detail', args=[self.event.pk])
+        self.assertChanged(url, lambda: registrations.join(self.event, self.other))
+        # The reader is waitlisted, then promoted when the other participant leaves.
+        self.assertChanged(url, lambda: registrations.join(self.event, self.reader))
+        self.assertChanged(url, lambda: registrations.leave(self.event, self.other))
+        self.assertTrue(
+            PathEventRegistration.objects.filter(user=self.reader, status=PathEventRegistration.STATUS_CONFIRMED).exists()
+        )
+
+    def test_login_and_logout_change_the_etag(self):
+        url = reverse('entry_detail', args=[self.entry.pk])
+        self.assertChanged(url, lambda: self.client.force_login(self.other))
+        self.assertChanged(url, lambda: self.client.force_login(self.staff))
+        self.assertChanged(url, self.client.logout)
+
+    def test_pending_messages_bypass_validation(self):
+        url = reverse('path_event_detail', args=[self.event.pk])
+        etag = self.etag(url)
+        self.client.post(reverse('path_event_join', args=[self.event.pk]))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'See you there.')
+        self.assertNotIn('ETag', response)
+        # Once shown, the messages are gone and the page validates again.
+        etag = self.etag(url)
+        self.assertEqual(self.revalidate(url, etag), 304)
+
+    def test_diary_page_with_page_cache(self):
+        self.client.logout()
+        url = reverse('diary_page_detail', args=[self.page.pk])
+        first = self.client.get(url)
+        self.assertEqual(first[page_cache.CACHE_HEADER], 'miss')
+        second = self.client.get(url)
+        self.assertEqual(second[page_cache.CACHE_HEADER], 'hit')
+        self.assertEqual(first['ETag'], second['ETag'])
+        self.assertEqual(self.revalidate(url, first['ETag']), 304)
+        DiaryComment.objects.create(page=self.page, author=self.reader, content='Hi')
+        third = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(third.status_code, 200)
+        self.assertEqual(third[page_cache.CACHE_HEADER], 'miss')
+        self.assertNotEqual(third['ETag'], first['ETag'])
+
+    def test_missing_row_404s(self):
+        self.assertEqual(self.client.get(reverse('entry_detail', args=[0])).status_code, 404)
+
+
+class ParseRangeTests(SimpleTestCase):
+
+    def test_ranges(self):
+        cases = [
+            ('bytes=0-9', (0, 9)),
+            ('bytes=90-', (90, 99)),
+            ('bytes=-10', (90, 99)),
+            ('bytes=-500', (0, 99)),
+            ('bytes=50-500', (50, 99)),
+            (' bytes=5-5 ', (5, 5)),
+        ]
+        for header, expected in cases:
+            with self.subTest(header):
+                self.assertEqual(parse_range(header, 100), expected)
+
+    def test_unsatisfiable(self):
+        for header in ('bytes=100-', 'bytes=100-200', 'bytes=9-5', 'bytes=-0'):
+            with self.subTest(header):
+                self.assertIs(parse_range(header, 100), False)
+        self.assertIs(parse_range('bytes=-5', 0), False)
+
+    def test_ignored(self):
+        for header in (None, '', 'bytes=-', 'bytes=0-1,5-6', 'items=0-1', 'bytes=a-b', 'bytes 0-1'):
+            with self.subTest(header):
+                self.assertIsNone(parse_range(header, 100))
+
+
+class ServeMediaTests(TempMediaMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.data = bytes(range(100))
+        os.makedirs(os.path.join(self.media_root, 'docs'))
+        with open(os.path.join(self.media_root, 'docs', 'file.bin'), 'wb') as fh:
+            fh.write(self.data)
+        self.url = reverse('media_file', args=['docs/file.bin'])
+
+    def body(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_full_response(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.body(response), self.data)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+
+    def test_partial_responses(self):
+        for header, start, end in (('bytes=10-19', 10, 19), ('bytes=90-', 90, 99), ('bytes=-5', 95, 99)):
+            with self.subTest(header):
+                response = self.client.get(self.url, HTTP_RANGE=header)
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(response['Content-Range'], f'bytes {start}-{end}/100')
+                self.assertEqual(response['Content-Length'], str(end - start + 1))
+                self.assertEqual(self.body(response), self.data[start:end + 1])
+
+    def test_not_modified(self):
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_unsatisfiable_range(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=200-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */100')
+
+    def test_if_range(self):
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=etag).status_code, 206)
+        for header in ('bytes=0-9', 'bytes=200-'):
+            with self.subTest(header):
+                response = self.client.get(self.url, HTTP_RANGE=header, HTTP_IF_RANGE='"stale"')
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(self.body(response), self.data)
+
+    def test_missing_and_traversal(self):
+        self.assertEqual(self.client.get(reverse('media_file', args=['docs/nope.bin'])).status_code, 404)
+        self.assertEqual(self.client.get('/media/../journal/settings.py').status_code, 404)
+
+
+class MediaGcTests(TempMediaMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', password='pw', is_staff=True)
+
+    def setUp(self):
+        super().setUp()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.item = MediaItem.objects.create(file=ContentFile(b'kept', name='kept.txt'), uploaded_by=self.staff)
+        self.old_orphan = self.write('media_library/old.txt', age_hours=48)
+        self.new_orphan = self.write('media_library/new.txt', age_hours=0)
+
+    def write(self, name, age_hours):
+        path = os.path.join(self.media_root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as fh:
+            fh.write(b'orphan')
+        stamp = time.time() - age_hours * 3600
+        os.utime(path, (stamp, stamp))
+        return path
+
+    def gc(self, *args):
+        out = StringIO()
+        call_command('media_gc', *args, '--list', stdout=out)
+        return out.getvalue()
+
+    def test_dry_run_changes_nothing(self):
+        StoredBlob.objects.update(refcount=5)
+        os.remove(self.item.file.path)
+        output = self.gc()
+        self.assertIn('orphan  media_library/old.txt', output)
+        self.assertNotIn('new.txt', output)
+        self.assertIn(f'missing {self.item.file.name}', output)
+        self.assertIn('Blob refcount mismatches: 1', output)
+        self.assertTrue(os.path.exists(self.old_orphan))
+        self.item.refresh_from_db()
+        self.assertTrue(self.item.file)
+        self.assertEqual(StoredBlob.objects.get().refcount, 5)
+
+    def test_delete_respects_min_age(self):
+        self.gc('--delete')
+        self.assertFalse(os.path.exists(self.old_orphan))
+        self.assertTrue(os.path.exists(self.new_orphan))
+        self.assertTrue(os.path.exists(self.item.file.path))
+        self.gc('--delete', '--min-age', '0')
+        self.assertFalse(os.path.exists(self.new_orphan))
+        self.assertTrue(os.path.exists(self.item.file.path))
+
+    def test_clear_dangling(self):
+        os.remove(self.item.file.path)
+        self.assertIn('Dangling references: 1 (cleared)', self.gc('--clear-dangling'))
+        self.item.refresh_from_db()
+        self.assertFalse(self.item.file)
+
+    def test_fix_refcounts(self):
+        StoredBlob.objects.update(refcount=5)
+        self.gc('--fix-refcounts')
+        self.assertEqual(StoredBlob.objects.get().refcount, 1)
+
+    def test_renditions_are_referenced_across_batches(self):
+        author = User.objects.create_user('author', password='pw')
+        with self.captureOnCommitCallbacks(execute=True):
+            JournalEntry.objects.create(
+                title='Run', content='Body', author=author,
+                image=ContentFile(image_bytes(1000, 500), name='photo.jpg'),
+            )
+            tasks.process_jobs()
+        self.item.file = ContentFile(b'replaced', name='new.txt')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.item.save()
+        with mock.patch('entries.management.commands.media_gc.BATCH_SIZE', 2):
+            output = self.gc('--delete', '--min-age', '0', '--fix-refcounts')
+        self.assertIn('Orphans deleted: 2 file(s)', output)  # old.txt and new.txt
+        self.assertIn('Dangling references: 0', output)
+        self.assertIn('Blob refcount mismatches: 0', output)
+        entry = JournalEntry.objects.get()
+        for info in entry.image_renditions.values():
+            for name in [info['name'], *info['formats'].values()]:
+                self.assertTrue(default_storage.exists(name), name)
+
+
+class SqliteSearchTests(TestCase):
+    """The FTS5 tables are kept in step with the rows by signals (PostgreSQL uses triggers)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author', password='pw')
+
+    def setUp(self):
+        if not search.has_fts_table(connection, JournalEntry._meta.db_table):
+            self.skipTest('SQLite FTS5 search tables are not available')
+
+    def entry(self, title, content='Body'):
+        return JournalEntry.objects.create(title=title, content=content, author=self.author, is_published=True)
+
+    def found(self, query):
+        return list(search.search(JournalEntry.objects.all(), query).values_list('title', flat=True))
+
+    def test_save_indexes_and_reindexes(self):
+        entry = self.entry('Marathon training')
+        self.assertEqual(self.found('marathon'), ['Marathon training'])
+        self.assertEqual(self.found('marath'), ['Marathon training'])
+        entry.title = 'Sunrise swim'
+        entry.save()
+        self.assertEqual(self.found('marathon'), [])
+        self.assertEqual(self.found('swim'), ['Sunrise swim'])
+
+    def test_delete_unindexes(self):
+        entry = self.entry('Marathon training')
+        pk = entry.pk
+        entry.delete()
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM entries_journalentry_fts WHERE rowid = %s', [pk])
+            self.assertEqual(cursor.fetchone()[0], 0)
+
+    def test_title_matches_rank_first(self):
+        self.entry('Notes', content='A long trail run by the river')
+        self.entry('Trail run')
+        self.assertEqual(self.found('trail'), ['Trail run', 'Notes'])
+
+    def test_every_word_must_match_and_punctuation_is_harmless(self):
+        self.entry('Trail run')
+        self.assertEqual(self.found('trail river'), [])
+        self.assertEqual(self.found('"trail" OR'), [])
+        self.assertEqual(self.found('"*'), [])
+
+    def test_search_page(self):
+        self.entry('Morning trail')
+        JournalEntry.objects.create(title='Secret trail', content='Body', author=self.author, is_published=False)
+        response = self.client.get(reverse('search'), {'q': 'trail'})
+        self.assertContains(response, 'Morning trail')
+        self.assertNotContains(response, 'Secret trail')
+
+
+class ExcerptTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author', password='pw')
+
+    def test_matches_truncatewords(self):
+        self.assertEqual(make_excerpt('one two three four', 3), 'one two three …')
+        self.assertEqual(make_excerpt('one two', 3), 'one two')
+        self.assertEqual(make_excerpt(None, 3), '')
+        self.assertEqual(len(make_excerpt('x' * 1000, 30)), EXCERPT_MAX_LENGTH)
+
+    def test_save_keeps_excerpt_in_sync(self):
+        entry = JournalEntry.objects.create(title='Run', content='word ' * 40, author=self.author)
+        self.assertEqual(entry.excerpt, make_excerpt('word ' * 40, JournalEntry.excerpt_words))
+        entry.content = 'Short now'
+        entry.save()
+        self.assertEqual(JournalEntry.objects.get(pk=entry.pk).excerpt, 'Short now')
+        event = PathEvent.objects.create(
+            title='Run', description='step ' * 40, event_date=timezone.now(), created_by=self.author,
+        )
+        self.assertEqual(event.excerpt.count('step'), PathEvent.excerpt_words)
+
+    def test_backfill_command(self):
+        entry = JournalEntry.objects.create(title='Run', content='Morning miles', author=self.author)
+        page = DiaryPage.objects.create(title='Day', content='Quiet river', status='public', author=self.author)
+        JournalEntry.objects.filter(pk=entry.pk).update(excerpt='')
+        DiaryPage.objects.filter(pk=page.pk).update(content='Edited with raw SQL')
+        call_command('backfill_excerpts', stdout=StringIO())
+        self.assertEqual(JournalEntry.objects.get(pk=entry.pk).excerpt, 'Morning miles')
+        # Only empty excerpts unless --all.
+        self.assertEqual(DiaryPage.objects.get(pk=page.pk).excerpt, 'Quiet river')
+        call_command('backfill_excerpts', '--all', stdout=StringIO())
+        self.assertEqual(DiaryPage.objects.get(pk=page.pk).excerpt, 'Edited with raw SQL')
+
+    def test_list_cards_show_the_excerpt(self):
+        JournalEntry.objects.create(title='Run', content='word ' * 40, author=self.author, is_published=True)
+        self.client.force_login(self.author)
+        response = self.client.get(reverse('entries_list'))
+        self.assertContains(response, make_excerpt('word ' * 40, 30))
+
+
+class ImageJobTests(TempMediaMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author', password='pw')
+
+    def entry(self, width=2000, height=1000):
+        with self.captureOnCommitCallbacks(execute=True):
+            return JournalEntry.objects.create(
+                title='Run', content='Body', author=self.author,
+                image=ContentFile(image_bytes(width, height), name='photo.jpg'),
+            )
+
+    def test_save_queues_one_job_per_new_image(self):
+        entry = self.entry()
+        job = ImageJob.objects.get()
+        self.assertEqual((job.model_label, job.object_id, job.file_name), ('entries.journalentry', entry.pk, entry.image.name))
+        entry.title = 'Renamed'
+        entry.save()
+        self.assertEqual(ImageJob.objects.count(), 1)
+
+    def test_job_resizes_and_stores_renditions(self):
+        entry = self.entry()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(tasks.process_jobs(), 1)
+        job = ImageJob.objects.get()
+        self.assertEqual((job.status, job.attempts, job.locked_at), (ImageJob.STATUS_DONE, 1, None))
+        entry.refresh_from_db()
+        self.assertEqual(entry.image.width, 1200)
+        self.assertEqual(set(entry.image_renditions), {'full', 'thumb', 'medium'})
+        # Marking the job done must not queue another one.
+        self.assertEqual(ImageJob.objects.count(), 1)
+
+    def test_claim_is_exclusive_until_stale(self):
+        self.entry()
+        job = tasks.claim_next_job()
+        self.assertEqual(job.status, ImageJob.STATUS_RUNNING)
+        self.assertIsNone(tasks.claim_next_job())
+        later = timezone.now() + tasks.STALE_AFTER + timedelta(seconds=1)
+        self.assertEqual(tasks.claim_next_job(now=later).pk, job.pk)
+        self.assertEqual(ImageJob.objects.get(pk=job.pk).attempts, 2)
+
+    def test_failed_job_backs_off_then_gives_up(self):
+        job = ImageJob.objects.create(model_label='entries.nosuchmodel', object_id=1, file_name='x.jpg', max_attempts=2)
+        with self.assertLogs('entries.tasks', 'ERROR'):
+            tasks.process_jobs()
+        job.refresh_from_db()
+        self.assertEqual(job.status, ImageJob.STATUS_PENDING)
+        self.assertIn('LookupError', job.last_error)
+        self.assertGreater(job.run_after, timezone.now())
+        self.assertEqual(tasks.process_jobs(), 0)  # not due yet
+        ImageJob.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        with self.assertLogs('entries.tasks', 'ERROR'):
+            tasks.process_jobs()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (ImageJob.STATUS_FAILED, 2))
+
+    def test_job_for_a_replaced_image_is_skipped(self):
+        entry = self.entry()
+        entry.image = ContentFile(image_bytes(100, 100), name='other.jpg')
+        with self.captureOnCommitCallbacks(execute=True):
+            entry.save()
+        stale = tasks.claim_next_job()
+        self.assertNotEqual(stale.file_name, entry.image.name)
+        self.assertFalse(tasks.process_image(stale))
+        entry.refresh_from_db()
+        self.assertEqual(entry.image_renditions, {})
+
+
+class RenditionTests(TempMediaMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author', password='pw')
+
+    def processed_entry(self, width, height):
+        with self.captureOnCommitCallbacks(execute=True):
+            entry = JournalEntry.objects.create(
+                title='Run', content='Body', author=self.author, is_published=True,
+                image=ContentFile(image_bytes(width, height), name='photo.jpg'),
+            )
+            tasks.process_jobs()
+        entry.refresh_from_db()
+        return entry
+
+    def test_sizes(self):
+        renditions = self.processed_entry(1000, 500).image_renditions
+        self.assertEqual(
+            {label: (info['width'], info['height']) for label, info in renditions.items()},
+            {'full': (1000, 500), 'medium': (800, 400), 'thumb': (400, 200)},
+        )
+        # Nothing is upscaled: a small upload is its own only rendition.
+        self.assertEqual(list(self.processed_entry(300, 200).image_renditions), ['full'])
+
+    def test_srcset_and_card_url(self):
+        entry = self.processed_entry(1000, 500)
+        renditions = entry.image_renditions
+        storage = entry.image.storage
+        self.assertEqual(entry.image_srcset, ', '.join([
+            f"{storage.url(renditions['thumb']['name'])} 400w",
+            f"{storage.url(renditions['medium']['name'])} 800w",
+            f"{storage.url(entry.image.name)} 1000w",
+        ]))
+        self.assertEqual(entry.image_card_url, storage.url(renditions['thumb']['name']))
+        self.client.force_login(self.author)
+        response = self.client.get(reverse('entry_detail', args=[entry.pk]))
+        self.assertContains(response, f'srcset="{entry.image_srcset}"')
+
+    def test_unprocessed_image_falls_back_to_the_upload(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            entry = JournalEntry.objects.create(
+                title='Run', content='Body', author=self.author,
+                image=ContentFile(image_bytes(1000, 500), name='photo.jpg'),
+            )
+        self.assertEqual(entry.image_srcset, '')
+        self.assertEqual(entry.image_card_url, entry.image.url)
+
+    def test_reuploading_the_same_bytes_rebuilds_the_renditions(self):
+        entry = self.processed_entry(1000, 500)
+        name = entry.image.name
+        entry.image = ContentFile(image_bytes(1000, 500), name='again.jpg')
+        with self.captureOnCommitCallbacks(execute=True):
+            entry.save()
+            tasks.process_jobs()
+        entry.refresh_from_db()
+        self.assertEqual(entry.image.name, name)
+        self.assertEqual(set(entry.image_renditions), {'full', 'thumb', 'medium'})
+        storage = entry.image.storage
+        self.assertTrue(all(storage.exists(info['name']) for info in entry.image_renditions.values()))
+
+    @skipUnless(images.available_formats(), 'Pillow has no WebP/AVIF encoder')
+    def test_legacy_upload_gets_full_size_alternates(self):
+        name = 'entries/legacy/photo.jpg'
+        os.makedirs(os.path.join(self.media_root, 'entries', 'legacy'))
+        with open(os.path.join(self.media_root, name), 'wb') as fh:
+            fh.write(image_bytes(1000, 500))
+        entry = JournalEntry.objects.create(title='Run', content='Body', author=self.author, image=name)
+        tasks.enqueue_missing_renditions()
+        with self.captureOnCommitCallbacks(execute=True):
+            tasks.process_jobs()
+        entry.refresh_from_db()
+        ext, _, _, mime = images.available_formats()[0]
+        self.assertEqual(entry.image_renditions['full']['formats'][ext], f'{name}.{ext}')
+        response = self.client.get(reverse('media_file', args=[name]), HTTP_ACCEPT=mime)
+        self.assertEqual(response['Content-Type'], mime)
+
+    def test_replacing_the_image_deletes_its_renditions(self):
+        entry = self.processed_entry(1000, 500)
+        storage = entry.image.storage
+        generated = [info['name'] for label, info in entry.image_renditions.items() if label != 'full']
+        generated += [name for info in entry.image_renditions.values() for name in info['formats'].values()]
+        entry.image = ContentFile(image_bytes(600, 600), name='other.jpg')
+        with self.captureOnCommitCallbacks(execute=True):
+            entry.save()
+        self.assertEqual(entry.image_renditions, {})
+        self.assertEqual([name for name in generated if storage.exists(name)], [])
+
+
+class AcceptNegotiationTests(TempMediaMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        os.makedirs(os.path.join(self.media_root, 'photos'))
+        for name, data in (('a.jpg', b'jpeg'), ('a.jpg.webp', b'webp'), ('a.jpg.avif', b'avif'), ('b.jpg', b'jpeg')):
+            with open(os.path.join(self.media_root, 'photos', name), 'wb') as fh:
+                fh.write(data)
+        self.url = reverse('media_file', args=['photos/a.jpg'])
+
+    def get(self, url, accept):
+        response = self.client.get(url, HTTP_ACCEPT=accept)
+        return response, b''.join(response.streaming_content)
+
+    def test_parse_accept(self):
+        self.assertEqual(
+            images.parse_accept('image/avif;q=0, IMAGE/WEBP;q=0.8, image/*, */*;q=bad'),
+            {'image/webp', 'image/*', '*/*'},
+        )
+        self.assertEqual(images.parse_accept(None), set())
+
+    def test_negotiate(self):
+        stored = {'a.jpg.webp'}.__contains__
+        self.assertEqual(images.negotiate('a.jpg', 'image/avif,image/webp', stored), ('a.jpg.webp', 'image/webp'))
+        self.assertEqual(images.negotiate('a.jpg', 'image/*', stored), ('a.jpg', None))
+        self.assertEqual(images.negotiate('a.gif', 'image/webp', lambda name: True), ('a.gif', None))
+
+    def test_best_stored_variant_is_served(self):
+        for accept, body, content_type in (
+            ('image/avif,image/webp,*/*', b'avif', 'image/avif'),
+            ('image/webp,*/*', b'webp', 'image/webp'),
+            ('image/avif;q=0,image/webp,*/*', b'webp', 'image/webp'),
+            ('*/*', b'jpeg', 'image/jpeg'),
+        ):
+            with self.subTest(accept):
+                response, content = self.get(self.url, accept)
+                self.assertEqual((content, response['Content-Type']), (body, content_type))
+                self.assertEqual(response['Vary'], 'Accept')
+
+    def test_without_a_stored_variant_the_original_is_served(self):
+        response, content = self.get(reverse('media_file', args=['photos/b.jpg']), 'image/avif,image/webp')
+        self.assertEqual(content, b'jpeg')
+        self.assertEqual(response['Vary'], 'Accept')
+
+    def test_variants_have_their_own_etag(self):
+        webp, _ = self.get(self.url, 'image/webp')
+        jpeg, _ = self.get(self.url, '*/*')
+        self.assertNotEqual(webp['ETag'], jpeg['ETag'])
+        response = self.client.get(self.url, HTTP_ACCEPT='image/webp', HTTP_IF_NONE_MATCH=webp['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['Vary'], 'Accept')
+        response = self.client.get(self.url, HTTP_ACCEPT='*/*', HTTP_IF_NONE_MATCH=webp['ETag'])
+        self.assertEqual(response.status_code, 200)
+
+    def test_other_files_do_not_vary(self):
+        with open(os.path.join(self.media_root, 'photos', 'notes.txt'), 'wb') as fh:
+            fh.write(b'notes')
+        response = self.client.get(reverse('media_file', args=['photos/notes.txt']), HTTP_ACCEPT='image/webp')
+        self.assertNotIn('Vary', response)
+
+
+class MediaMetadataTests(TempMediaMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', password='pw', is_staff=True)
+
+    def add_item(self, name, content):
+        with self.captureOnCommitCallbacks(execute=True):
+            return MediaItem.objects.create(file=ContentFile(content, name=name), uploaded_by=self.staff)
+
+    def test_classify_and_guess_mime(self):
+        for name, file_type, mime in (
+            ('a.JPG', 'image', 'image/jpeg'),
+            ('a.svg', 'image', 'image/svg+xml'),
+            ('clip.mov', 'video', 'video/quicktime'),
+            ('notes.pdf', 'other', 'application/pdf'),
+            ('README', 'other', 'application/octet-stream'),
+            (None, 'other', 'application/octet-stream'),
+        ):
+            with self.subTest(name):
+                self.assertEqual((metadata.classify(name), metadata.guess_mime(name)), (file_type, mime))
+
+    def test_save_fills_the_cheap_fields_and_the_worker_the_rest(self):
+        data = image_bytes(300, 200, 'PNG')
+        item = self.add_item('photo.png', data)
+        self.assertEqual((item.file_type, item.mime_type, item.file_size), ('image', 'image/png', len(data)))
+        self.assertIsNone(item.metadata_extracted_at)
+        tasks.process_jobs()
+        item.refresh_from_db()
+        self.assertEqual((item.width, item.height), (300, 200))
+        self.assertIsNotNone(item.metadata_extracted_at)
+
+    def test_unreadable_image_keeps_empty_dimensions(self):
+        item = self.add_item('broken.jpg', b'not an image')
+        self.assertEqual(metadata.probe_image(item.file.path), (None, None))
+        tasks.process_jobs()
+        item.refresh_from_db()
+        self.assertEqual((item.width, item.height), (None, None))
+        self.assertFalse(item.poster)
+        self.assertIsNotNone(item.metadata_extracted_at)
+        self.assertEqual(ImageJob.objects.get().status, ImageJob.STATUS_DONE)
+
+
+class PosterTests(TempMediaMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', password='pw', is_staff=True)
+
+    def processed_item(self, name, content):
+        with self.captureOnCommitCallbacks(execute=True):
+            item = MediaItem.objects.create(file=ContentFile(content, name=name), uploaded_by=self.staff)
+            tasks.process_jobs()
+        item.refresh_from_db()
+        return item
+
+    def test_large_image_gets_a_preview(self):
+        item = self.processed_item('big.jpg', image_bytes(1600, 800))
+        self.assertEqual((item.poster.width, item.poster.height), (metadata.IMAGE_PREVIEW_SIZE, 200))
+        self.assertEqual(item.preview_url, item.poster.url)
+        small = self.processed_item('small.jpg', image_bytes(300, 200))
+        self.assertFalse(small.poster)
+        self.assertEqual(small.preview_url, small.file.url)
+
+    def test_replacing_the_file_releases_the_preview(self):
+        item = self.processed_item('big.jpg', image_bytes(1600, 800))
+        poster = item.poster.name
+        item.file = ContentFile(b'notes', name='notes.txt')
+        with self.captureOnCommitCallbacks(execute=True):
+            item.save()
+        self.assertFalse(item.poster)
+        self.assertFalse(default_storage.exists(poster))
+
+    def test_video_without_decoders_gets_a_placeholder(self):
+        with mock.patch('entries.metadata.shutil.which', return_value=None), mock.patch.dict('sys.modules', {'cv2': None}):
+            self.assertEqual(metadata.probe_video('clip.mp4'), (None, None, None))
+            item = self.processed_item('clip.mp4', b'not really a video')
+        self.assertEqual(item.file_type, 'video')
+        self.assertFalse(item.poster)
+        self.assertIsNotNone(item.metadata_extracted_at)
+        self.client.force_login(self.staff)
+        self.assertContains(self.client.get(reverse('media_library')), 'media-preview-no-poster')
+
+    def test_poster_falls_back_to_the_first_frame(self):
+        frame = Image.new('RGB', (1280, 720), '#6b9080')
+        with mock.patch('entries.metadata._poster_with_ffmpeg', side_effect=lambda path, at: None if at else frame) as ffmpeg:
+            poster = metadata.extract_poster('clip.mp4', duration=10)
+            self.assertEqual([call.args for call in ffmpeg.call_args_list], [('clip.mp4', 1.0), ('clip.mp4', 0)])
+            ffmpeg.reset_mock()
+            metadata.extract_poster('clip.mp4', duration=1)
+            self.assertEqual([call.args for call in ffmpeg.call_args_list], [('clip.mp4', 0)])
+        with Image.open(BytesIO(poster)) as img:
+            self.assertEqual((img.format, img.width, img.height), ('JPEG', metadata.POSTER_MAX_SIZE, 360))
+
+
+class MediaLibraryTests(TempMediaMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', password='pw', is_staff=True)
+        cls.other = User.objects.create_user('other', password='pw', is_staff=True)
+        cls.reader = User.objects.create_user('reader', password='pw')
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.staff)
+        self.factory = RequestFactory()
+        day = timezone.make_aware(datetime(2025, 3, 10, 12))
+        for i, (name, user) in enumerate([
+            ('a.jpg', self.staff), ('b.mp4', self.staff), ('c.txt', self.other), ('d.jpg', self.other), ('e.png', self.staff),
+        ]):
+            item = MediaItem.objects.create(file=ContentFile(name.encode(), name=name), uploaded_by=user)
+            MediaItem.objects.filter(pk=item.pk).update(created_at=day + timedelta(days=i))
+
+    def filtered(self, **params):
+        items, filters = filter_media_items(self.factory.get('/', params))
+        return [item.original_name for item in items.order_by('created_at')], filters
+
+    def test_filters(self):
+        self.assertEqual(self.filtered(type='image'), (['a.jpg', 'd.jpg', 'e.png'], {'type': 'image'}))
+        self.assertEqual(self.filtered(uploader=str(self.other.pk))[0], ['c.txt', 'd.jpg'])
+        # Both ends of the date range are inclusive.
+        self.assertEqual(
+            self.filtered(**{'from': '2025-03-11', 'to': '2025-03-13'}),
+            (['b.mp4', 'c.txt', 'd.jpg'], {'from': '2025-03-11', 'to': '2025-03-13'}),
+        )
+        self.assertEqual(self.filtered(type='image', uploader=str(self.staff.pk), to='2025-03-13')[0], ['a.jpg'])
+
+    def test_invalid_filters_are_ignored(self):
+        for params in ({'type': 'audio'}, {'uploader': 'me'}, {'from': '2025-02-30'}, {'to': 'yesterday'}):
+            with self.subTest(params):
+                names, filters = self.filtered(**params)
+                self.assertEqual((len(names), filters), (5, {}))
+
+    def test_json_pages_keep_the_filters(self):
+        url = reverse('media_library_json') + '?type=image&per_page=2'
+        seen = []
+        while url:
+            data = self.client.get(url).json()
+            seen += [item['title'] for item in data['items']]
+            url = data['next']
+            if url:
+                self.assertIn('type=image', url)
+        self.assertEqual(seen, ['e.png', 'd.jpg', 'a.jpg'])
+
+    def test_json_item(self):
+        item = self.client.get(reverse('media_library_json'), {'type': 'video'}).json()['items'][0]
+        self.assertEqual(
+            {key: item[key] for key in ('title', 'file_type', 'mime_type', 'file_size', 'uploaded_by')},
+            {'title': 'b.mp4', 'file_type': 'video', 'mime_type': 'video/mp4', 'file_size': 5, 'uploaded_by': 'staff'},
+        )
+        self.assertIn('media-card', item['html'])
+
+    def test_json_query_count_does_not_grow_with_the_page(self):
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(reverse('media_library_json'), {'per_page': 1})
+        with CaptureQueriesContext(connection) as many:
+            self.client.get(reverse('media_library_json'), {'per_page': 5})
+        self.assertEqual(len(few), len(many))
+
+    def test_staff_only(self):
+        self.client.force_login(self.reader)
+        self.assertEqual(self.client.get(reverse('media_library_json')).status_code, 302)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, PAGE_CACHE_TIMEOUT=0)
+class FragmentCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author', password='pw')
+        cls.reader = User.objects.create_user('reader', password='pw')
+        cls.staff = User.objects.create_user('staff', password='pw', is_staff=True)
+        cls.entry = JournalEntry.objects.create(title='Morning run', content='Body', author=cls.author, is_published=True)
+
+    def setUp(self):
+        caches['fragments'].clear()
+        self.url = reverse('entries_list')
+        self.edit_url = reverse('entry_edit', args=[self.entry.pk])
+
+    def get_as(self, user):
+        self.client.force_login(user)
+        return self.client.get(self.url)
+
+    def test_card_role(self):
+        self.assertEqual(card_role(self.entry, self.staff), 'staff')
+        self.assertEqual(card_role(self.entry, self.author), 'owner')
+        self.assertEqual(card_role(self.entry, self.reader), 'viewer')
+        self.assertEqual(card_role(self.entry, AnonymousUser()), 'viewer')
+
+    def test_card_is_served_from_the_cache(self):
+        self.get_as(self.reader)
+        # An update that bypasses save() leaves updated_at, and so the key, alone.
+        JournalEntry.objects.filter(pk=self.entry.pk).update(title='Changed behind the cache')
+        self.assertContains(self.get_as(self.reader), 'Morning run')
+
+    def test_saving_changes_the_key(self):
+        self.get_as(self.reader)
+        entry = JournalEntry.objects.get(pk=self.entry.pk)
+        entry.title = 'Evening run'
+        entry.save()
+        response = self.get_as(self.reader)
+        self.assertContains(response, 'Evening run')
+        self.assertNotContains(response, 'Morning run')
+
+    def test_new_comment_changes_the_key(self):
+        self.get_as(self.reader)
+        Comment.objects.create(entry=self.entry, author=self.reader, content='Nice')
+        self.assertContains(self.get_as(self.reader), '💬 1 comment<')
+
+    def test_owner_and_viewer_get_their_own_variant(self):
+        self.assertContains(self.get_as(self.author), self.edit_url)
+        self.assertNotContains(self.get_as(self.reader), self.edit_url)
+        self.assertContains(self.get_as(self.staff), self.edit_url)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, PAGE_CACHE_TIMEOUT=0)
+class AboutPageCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', password='pw', is_staff=True)
+
+    def setUp(self):
+        caches['default'].clear()
+
+    def test_load_is_cached(self):
+        self.assertEqual(AboutPage.load().pk, AboutPage.SINGLETON_PK)
+        with self.assertNumQueries(0):
+            AboutPage.load()
+
+    def test_save_and_delete_clear_the_cache(self):
+        about = AboutPage.load()
+        about.content = 'We run together.'
+        with self.captureOnCommitCallbacks(execute=True):
+            about.save()
+        self.assertEqual(AboutPage.load().content, 'We run together.')
+        with self.captureOnCommitCallbacks(execute=True):
+            AboutPage.objects.get().delete()
+        self.assertEqual(AboutPage.load().content, '')
+
+    def test_staff_edit_shows_on_the_landing_page(self):
+        self.client.force_login(self.staff)
+        response = self.client.post(reverse('about_page'), {'content': 'See you there.'})
+        self.assertRedirects(response, reverse('about_page'))
+        self.client.logout()
+        self.assertContains(self.client.get(reverse('home')), 'See you there.')
+
+    def test_pages_without_the_snippet_do_not_load_it(self):
+        AboutPage.clear_cache()
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse('diary_list'))
+        self.assertEqual([query['sql'] for query in ctx if 'entries_aboutpage' in query['sql']], [])
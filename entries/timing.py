@@ -0,0 +1,155 @@
+"""
+Per-request timing: query count, DB time, template time and total time.
+
+Enabled with REQUEST_TIMING=True. Every response then carries a header like
+
+    Server-Timing: db;dur=12.4;desc="9 queries", tpl;dur=8.1, total;dur=31.0
+
+(shown in the browser's network panel; staff only unless
+REQUEST_TIMING_PUBLIC_HEADER is set, and only when the request already loaded
+the user, so the check itself never adds an untimed query). Requests slower than
+REQUEST_TIMING_SLOW_MS are logged as warnings on the 'entries.timing' logger,
+and every REQUEST_TIMING_REPORT_INTERVAL seconds each worker logs count,
+mean/max time and mean queries per view, then starts over.
+
+Queries are timed with a connection execute_wrapper and templates by wrapping
+the Django template backend's render(). When disabled the middleware removes
+itself at startup (MiddlewareNotUsed), so it costs nothing.
+"""
+import logging
+import threading
+import time
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.backends.django import Template
+from django.utils.functional import SimpleLazyObject, empty
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar('request_timing', default=None)
+
+
+class Timings:
+    __slots__ = ('queries', 'db', 'templates')
+
+    def __init__(self):
+        self.queries = 0
+        self.db = 0.0
+        self.templates = 0.0
+
+
+def record_query(execute, sql, params, many, context):
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.db += time.perf_counter() - start
+        timings.queries += 1
+
+
+_template_render = Template.render
+
+
+def timed_render(self, context=None, request=None):
+    timings = _current.get()
+    if timings is None:
+        return _template_render(self, context, request)
+    start = time.perf_counter()
+    try:
+        return _template_render(self, context, request)
+    finally:
+        timings.templates += time.perf_counter() - start
+
+
+class ViewStats:
+    """Per-view aggregates for this worker, logged and reset every `interval` seconds."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.views = {}
+        self.started = time.monotonic()
+
+    def add(self, view, total, timings):
+        with self.lock:
+            # [requests, total seconds, max seconds, queries, db seconds]
+            stats = self.views.setdefault(view, [0, 0.0, 0.0, 0, 0.0])
+            stats[0] += 1
+            stats[1] += total
+            stats[2] = max(stats[2], total)
+            stats[3] += timings.queries
+            stats[4] += timings.db
+            if time.monotonic() - self.started < self.interval:
+                return
+            views = self.views
+            self.reset()
+        for view, (count, total, slowest, queries, db) in sorted(views.items(), key=lambda item: -item[1][1]):
+            logger.info(
+                'view=%s requests=%d mean_ms=%.1f max_ms=%.1f mean_queries=%.1f mean_db_ms=%.1f',
+                view, count, total / count * 1000, slowest * 1000, queries / count, db / count * 1000,
+            )
+
+
+def loaded_user(request):
+    """request.user if the view (or a context processor) already resolved it, else None."""
+    user = getattr(request, 'user', None)
+    if isinstance(user, SimpleLazyObject) and user._wrapped is empty:
+        return None
+    return user
+
+
+def server_timing(total, timings):
+    return (
+        f'db;dur={timings.db * 1000:.1f};desc="{timings.queries} queries", '
+        f'tpl;dur={timings.templates * 1000:.1f}, total;dur={total * 1000:.1f}'
+    )
+
+
+class RequestTimingMiddleware:
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_TIMING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.slow = settings.REQUEST_TIMING_SLOW_MS / 1000
+        self.public_header = settings.REQUEST_TIMING_PUBLIC_HEADER
+        interval = settings.REQUEST_TIMING_REPORT_INTERVAL
+        self.stats = ViewStats(interval) if interval else None
+        Template.render = timed_render
+
+    def __call__(self, request):
+        timings = Timings()
+        token = _current.set(timings)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(record_query))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        total = time.perf_counter() - start
+
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        if self.public_header or getattr(loaded_user(request), 'is_staff', False):
+            response['Server-Timing'] = server_timing(total, timings)
+        if total >= self.slow:
+            logger.warning(
+                'Slow request: %s %s view=%s status=%s total_ms=%.1f queries=%d db_ms=%.1f template_ms=%.1f',
+                request.method, request.path, view, response.status_code,
+                total * 1000, timings.queries, timings.db * 1000, timings.templates * 1000,
+            )
+        if self.stats is not None:
+            self.stats.add(view, total, timings)
+        return response
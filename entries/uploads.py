@@ -0,0 +1,150 @@
+"""
+Resumable, chunked uploads for the media library (large videos).
+
+A simple offset-based protocol, in the spirit of tus:
+
+    POST   /media/uploads/        {"filename", "size", "title"} -> 201 {"id", "offset", "chunk_size", "url"}
+    GET    /media/uploads/<id>/   -> {"offset", ...}   (ask where to resume after a dropped connection)
+    PATCH  /media/uploads/<id>/   raw bytes, header Upload-Offset: <offset> -> {"offset", ...}
+    DELETE /media/uploads/<id>/   abandon the upload
+
+Each chunk is streamed from the request straight into
+<MEDIA_ROOT>/chunked_uploads/<id>.part (never buffered in memory). Before
+touching the file a request claims the chunk with a conditional UPDATE on the
+session, so a retried PATCH for the same offset gets a 409 instead of writing
+over the bytes of the one still in flight. When the last
+byte arrives the part file is handed to storage as an already-on-disk upload, so
+it is renamed into place rather than copied, and the MediaItem is created.
+"""
+import os
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.db.models import Q
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import MediaItem, UploadSession
+
+UPLOAD_DIR = 'chunked_uploads'
+SESSION_TTL = timedelta(days=1)
+# A claim older than this belongs to a request that died without releasing it.
+CLAIM_TIMEOUT = timedelta(minutes=15)
+COPY_BUFFER_SIZE = 64 * 1024
+
+
+class OffsetMismatch(Exception):
+    """The client's Upload-Offset isn't where the stored upload ends."""
+
+
+class AssembledUpload(File):
+    """A finished part file; temporary_file_path() lets storage move it instead of copying."""
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def part_path(session):
+    return os.path.join(settings.MEDIA_ROOT, UPLOAD_DIR, f'{session.pk}.part')
+
+
+def describe(session):
+    return {
+        'id': str(session.pk),
+        'filename': session.filename,
+        'size': session.size,
+        'offset': session.offset,
+        'chunk_size': settings.MEDIA_UPLOAD_CHUNK_SIZE,
+        'url': reverse('media_upload_chunk', args=[session.pk]),
+    }
+
+
+def claim_chunk(session, offset):
+    """
+    Reserve the chunk at `offset` for this request; returns a token for
+    release_chunk(). OffsetMismatch if the upload isn't at `offset` or another
+    request is writing it.
+    """
+    token = uuid.uuid4()
+    now = timezone.now()
+    claimed = (
+        UploadSession.objects.filter(pk=session.pk, offset=offset)
+        .filter(Q(writer__isnull=True) | Q(writer_since__lt=now - CLAIM_TIMEOUT))
+        .update(writer=token, writer_since=now)
+    )
+    if not claimed:
+        session.refresh_from_db(fields=['offset'])
+        raise OffsetMismatch(session.offset)
+    return token
+
+
+def release_chunk(session, token, new_offset):
+    """Record the bytes written under `token` and free the session. False if the claim was lost."""
+    released = UploadSession.objects.filter(pk=session.pk, writer=token).update(
+        offset=new_offset, writer=None, writer_since=None, updated_at=timezone.now()
+    )
+    return bool(released)
+
+
+def append_chunk(session, stream, offset, length):
+    """
+    Write `length` bytes read from `stream` at `offset` and return the new offset.
+    A client that disconnects mid-chunk keeps whatever arrived; it resumes from there.
+    """
+    if length > settings.MEDIA_UPLOAD_CHUNK_SIZE or offset + length > session.size:
+        raise ValueError('Chunk is larger than allowed')
+    token = claim_chunk(session, offset)
+    path = part_path(session)
+    written = 0
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'r+b' if os.path.exists(path) else 'wb') as fh:
+            fh.seek(offset)
+            fh.truncate()  # drop the tail of a chunk that was never acknowledged
+            while written < length:
+                data = stream.read(min(COPY_BUFFER_SIZE, length - written))
+                if not data:
+                    break
+                fh.write(data)
+                written += len(data)
+    finally:
+        released = release_chunk(session, token, offset + written)
+    if not released:
+        session.refresh_from_db(fields=['offset'])
+        raise OffsetMismatch(session.offset)
+    session.offset = offset + written
+    return session.offset
+
+
+def finish(session):
+    """Turn a complete upload into a MediaItem and forget the session."""
+    path = part_path(session)
+    with transaction.atomic():
+        item = MediaItem(title=session.title, original_name=session.filename, uploaded_by_id=session.uploaded_by_id)
+        with open(path, 'rb') as fh:
+            item.file.save(session.filename, AssembledUpload(fh, name=session.filename), save=False)
+        item.save()
+        session.delete()
+    if os.path.exists(path):
+        # Identical content was already stored, so the part file wasn't moved.
+        os.remove(path)
+    return item
+
+
+def discard(session):
+    path = part_path(session)
+    if os.path.exists(path):
+        os.remove(path)
+    session.delete()
+
+
+def purge_stale_sessions(now=None):
+    """Remove uploads nobody has touched for SESSION_TTL. Returns how many."""
+    cutoff = (now or timezone.now()) - SESSION_TTL
+    stale = list(UploadSession.objects.filter(updated_at__lt=cutoff))
+    for session in stale:
+        discard(session)
+    return len(stale)
@@ -1,58 +1,83 @@
+import json
+import os
+
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import HttpResponse, HttpResponseForbidden
+from django.http import HttpResponse, HttpResponseForbidden, HttpResponseNotAllowed, JsonResponse
 from django.contrib.auth.decorators import login_required, user_passes_test
-from django.contrib.auth import login, logout, authenticate
+from django.contrib.auth import login, logout, authenticate, get_user_model
 from django.contrib.auth.forms import AuthenticationForm
 from django.contrib import messages
 from django.conf import settings
 from django.db.models import Q
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils.dateparse import parse_date
+from django.utils.http import urlencode
 from .models import (
     JournalEntry, Comment, PathEvent, PathEventRegistration, PathEventComment,
-    DiaryPage, DiaryComment, MediaItem, AboutPage,
+    DiaryPage, DiaryComment, MediaItem, AboutPage, UploadSession,
 )
 from .forms import (
     JournalEntryForm, CommentForm, PathEventForm, PathEventCommentForm,
     DiaryPageForm, DiaryCommentForm, MediaItemForm, AboutPageForm,
 )
+from .pagination import cursor_paginate
+from .page_cache import cache_anonymous
+from .conditional import conditional_detail
+from . import search, event_calendar, uploads, registrations
 from django.utils import timezone
-from datetime import datetime, timedelta, timezone as dt_timezone
-import calendar
+from datetime import datetime, time, timedelta, timezone as dt_timezone
 
 DEBUG = settings.DEBUG
 
+# Columns the list/card templates actually render; the rest stay in the DB.
+ENTRY_CARD_FIELDS = (
+    'title', 'excerpt', 'image', 'image_renditions', 'is_published', 'author', 'comment_count', 'created_at', 'updated_at',
+)
+DIARY_CARD_FIELDS = ('title', 'excerpt', 'image', 'image_renditions', 'status', 'comment_count', 'created_at', 'updated_at')
+EVENT_CARD_FIELDS = (
+    'title', 'excerpt', 'event_type', 'event_date', 'event_end_date', 'location', 'max_participants',
+    'participant_count', 'comment_count', 'image', 'image_renditions', 'is_published', 'updated_at',
+)
+COMMENT_FIELDS = ('content', 'created_at', 'author__username')
+
 def is_admin(user):
     return user.is_authenticated and user.is_staff
 
+
+def visible_entries(user):
+    """
+    Entries `user` may list: all for staff, else published + their own drafts as
+    two querysets (each served by its index) for cursor_paginate to merge.
+    """
+    entries = JournalEntry.objects.only(*ENTRY_CARD_FIELDS)
+    if user.is_staff:
+        return entries
+    return [entries.filter(is_published=True), entries.filter(author=user, is_published=False)]
+
+@cache_anonymous
 def home(request):
     # Landing for guests; dedicated home page for logged-in users
     if request.user.is_authenticated:
-        if request.user.is_staff:
-            entries = JournalEntry.objects.all().order_by('-created_at')
-        else:
-            entries = JournalEntry.objects.filter(
-                Q(is_published=True) | Q(author=request.user)
-            ).order_by('-created_at')
-        return render(request, 'entries/home.html', {'entries': entries})
-    entries = JournalEntry.objects.filter(is_published=True)[:3]
+        page = cursor_paginate(request, visible_entries(request.user))
+        return render(request, 'entries/home.html', {'entries': page, 'page': page})
+    entries = JournalEntry.objects.filter(is_published=True).only(*ENTRY_CARD_FIELDS)[:3]
     return render(request, 'entries/landing.html', {'entries': entries})
 
 
+@login_required
 def entries_list(request):
     """Journal / stories list (logged-in users; staff see all, others see published + their own)."""
-    if request.user.is_staff:
-        entries = JournalEntry.objects.all().order_by('-created_at')
-    else:
-        entries = JournalEntry.objects.filter(
-            Q(is_published=True) | Q(author=request.user)
-        ).order_by('-created_at')
-    return render(request, 'entries/entries_list.html', {'entries': entries})
+    page = cursor_paginate(request, visible_entries(request.user))
+    return render(request, 'entries/entries_list.html', {'entries': page, 'page': page})
 
+@conditional_detail(JournalEntry, ('comments', 'created_at'))
 def entry_detail(request, pk):
     # Staff see all; others see if published or they are the author
     entry = get_object_or_404(JournalEntry, pk=pk)
-    if not entry.is_published and not request.user.is_staff and entry.author != request.user:
+    if not entry.is_published and not request.user.is_staff and entry.author_id != request.user.id:
         return HttpResponseForbidden("This entry is not available.")
-    comments = entry.comments.all()
+    comments = list(entry.comments.select_related('author').only('entry', *COMMENT_FIELDS))
     comment_form = None
     
     if request.user.is_authenticated:
@@ -71,6 +96,7 @@ def entry_detail(request, pk):
     return render(request, 'entries/entry_detail.html', {
         'entry': entry,
         'comments': comments,
+        'comment_count': len(comments),
         'comment_form': comment_form,
     })
 
@@ -95,7 +121,7 @@ def entry_create(request):
 def entry_edit(request, pk):
     """Author or staff can edit."""
     entry = get_object_or_404(JournalEntry, pk=pk)
-    if not request.user.is_staff and entry.author != request.user:
+    if not request.user.is_staff and entry.author_id != request.user.id:
         return HttpResponseForbidden("You can only edit your own entries.")
     if request.method == 'POST':
         form = JournalEntryForm(request.POST, request.FILES, instance=entry)
@@ -111,7 +137,7 @@ def entry_edit(request, pk):
 def entry_delete(request, pk):
     """Author or staff can delete."""
     entry = get_object_or_404(JournalEntry, pk=pk)
-    if not request.user.is_staff and entry.author != request.user:
+    if not request.user.is_staff and entry.author_id != request.user.id:
         return HttpResponseForbidden("You can only delete your own entries.")
     if request.method == 'POST':
         entry.delete()
@@ -227,6 +253,7 @@ def admin_login_view(request):
     return render(request, 'entries/admin_login.html', {'form': form, 'error_message': error_message})
 
 # Define Your Path - Events Calendar Views
+@cache_anonymous
 def path_events_calendar(request):
     """Calendar view showing all upcoming path events"""
     now = timezone.now()
@@ -237,18 +264,13 @@ def path_events_calendar(request):
     
     # Base queryset - show all events for staff, only published for others
     if request.user.is_staff:
-        base_events = PathEvent.objects.all()
+        base_events = PathEvent.objects.only(*EVENT_CARD_FIELDS)
     else:
-        base_events = PathEvent.objects.filter(is_published=True)
+        base_events = PathEvent.objects.filter(is_published=True).only(*EVENT_CARD_FIELDS)
     
-    # Apply search filters
+    # Apply search filters (full-text index; see entries/search.py)
     if search_query:
-        base_events = base_events.filter(
-            Q(title__icontains=search_query) |
-            Q(description__icontains=search_query) |
-            Q(location__icontains=search_query) |
-            Q(event_type__icontains=search_query)
-        )
+        base_events = search.search(base_events, search_query)
     
     if search_date:
         try:
@@ -263,100 +285,27 @@ def path_events_calendar(request):
         except (ValueError, TypeError):
             pass  # Invalid date format, ignore
     
-    upcoming_events = base_events.filter(event_date__gte=now).order_by('event_date')
-    past_events = base_events.filter(event_date__lt=now).order_by('-event_date')[:5]
-    
-    # Get current month/year for calendar
-    year = request.GET.get('year', now.year)
-    month = request.GET.get('month', now.month)
-    try:
-        year = int(year)
-        month = int(month)
-    except (ValueError, TypeError):
-        year = now.year
-        month = now.month
-    
-    # Get events for this month - use timezone-aware datetime
-    month_start = timezone.make_aware(datetime(year, month, 1))
-    if month == 12:
-        month_end = timezone.make_aware(datetime(year + 1, 1, 1))
-    else:
-        month_end = timezone.make_aware(datetime(year, month + 1, 1))
-    
-    # Apply search filters to month events too
-    month_events = base_events.filter(
-        event_date__gte=month_start,
-        event_date__lt=month_end
+    year, month = event_calendar.parse_month(
+        request.GET.get('year', now.year), request.GET.get('month', now.month), now
     )
-    
-    # Create calendar
-    cal = calendar.monthcalendar(year, month)
-    events_by_date = {}
-    for event in month_events:
-        # Get the day from the event date (in the same timezone)
-        event_day_local = event.event_date.astimezone(timezone.get_current_timezone()).day
-        # Also check if it's the same month/year to avoid cross-month issues
-        event_month = event.event_date.astimezone(timezone.get_current_timezone()).month
-        event_year = event.event_date.astimezone(timezone.get_current_timezone()).year
-        
-        if event_month == month and event_year == year:
-            if event_day_local not in events_by_date:
-                events_by_date[event_day_local] = []
-            events_by_date[event_day_local].append(event)
-    
-    # Navigation
-    prev_month = month - 1
-    prev_year = year
-    if prev_month == 0:
-        prev_month = 12
-        prev_year -= 1
-    
-    next_month = month + 1
-    next_year = year
-    if next_month == 13:
-        next_month = 1
-        next_year += 1
-    
-    month_name = calendar.month_name[month]
-    
-    # Create a calendar grid with events for easier template rendering
-    calendar_with_events = []
-    for week in cal:
-        week_data = []
-        for day in week:
-            day_data = {
-                'day': day,
-                'events': events_by_date.get(day, []) if day != 0 else []
-            }
-            week_data.append(day_data)
-        calendar_with_events.append(week_data)
-    
-    return render(request, 'entries/path_events_calendar.html', {
-        'upcoming_events': upcoming_events,
-        'past_events': past_events,
-        'calendar': cal,
-        'calendar_with_events': calendar_with_events,
-        'events_by_date': events_by_date,
-        'year': year,
-        'month': month,
-        'month_name': month_name,
-        'prev_month': prev_month,
-        'prev_year': prev_year,
-        'next_month': next_month,
-        'next_year': next_year,
+    context = event_calendar.build_month(base_events, year, month, now)
+    context.update({
         'now': now,
         'search_query': search_query,
         'search_date': search_date,
     })
+    return render(request, 'entries/path_events_calendar.html', context)
 
+@conditional_detail(PathEvent, ('event_comments', 'created_at'), ('registrations', 'joined_at'))
 def path_event_detail(request, pk):
     """View individual path event. Logged-in users can join, leave, and comment on published events."""
+    events = PathEvent.objects.select_related('created_by')
     if request.user.is_staff:
-        event = get_object_or_404(PathEvent, pk=pk)
+        event = get_object_or_404(events, pk=pk)
     else:
-        event = get_object_or_404(PathEvent, pk=pk, is_published=True)
+        event = get_object_or_404(events, pk=pk, is_published=True)
 
-    comments = event.event_comments.all()
+    comments = list(event.event_comments.select_related('author').only('event', *COMMENT_FIELDS))
     comment_form = PathEventCommentForm() if request.user.is_authenticated else None
     if request.method == 'POST' and request.user.is_authenticated:
         if 'comment' in request.POST:
@@ -370,51 +319,52 @@ def path_event_detail(request, pk):
                 return redirect('path_event_detail', pk=event.pk)
             comment_form = form
 
-    registrations = event.registrations.all()
-    participant_count = registrations.count()
-    user_has_joined = request.user.is_authenticated and event.registrations.filter(user=request.user).exists()
-    comment_count = comments.count()
+    registration_status = None
+    if request.user.is_authenticated:
+        registration_status = event.registrations.filter(user=request.user).values_list('status', flat=True).first()
+    user_has_joined = registration_status == PathEventRegistration.STATUS_CONFIRMED
+    user_waitlisted = registration_status == PathEventRegistration.STATUS_WAITLISTED
+    comment_count = len(comments)
 
     return render(request, 'entries/path_event_detail.html', {
         'event': event,
         'comments': comments,
         'comment_count': comment_count,
         'comment_form': comment_form,
-        'registrations': registrations,
-        'participant_count': participant_count,
+        'participant_count': event.participant_count,
         'user_has_joined': user_has_joined,
+        'user_waitlisted': user_waitlisted,
     })
 
 @login_required
 def path_event_join(request, pk):
-    """Join a published event. Respects max_participants. POST only."""
+    """Join a published event; past max_participants the user is waitlisted. POST only."""
     if request.method != 'POST':
         return redirect('path_event_detail', pk=pk)
     if request.user.is_staff:
         event = get_object_or_404(PathEvent, pk=pk)
     else:
         event = get_object_or_404(PathEvent, pk=pk, is_published=True)
-    if event.registrations.filter(user=request.user).exists():
+    status = registrations.join(event, request.user)
+    if status == registrations.ALREADY_JOINED:
         messages.info(request, "You're already joined.")
-        return redirect('path_event_detail', pk=event.pk)
-    if event.max_participants and event.registrations.count() >= event.max_participants:
-        messages.warning(request, "This event is full.")
-        return redirect('path_event_detail', pk=event.pk)
-    PathEventRegistration.objects.create(event=event, user=request.user)
-    messages.success(request, "You're in! See you there.")
+    elif status == registrations.WAITLISTED:
+        messages.warning(request, "This event is full. You're on the waitlist and will get the next free place.")
+    else:
+        messages.success(request, "You're in! See you there.")
     return redirect('path_event_detail', pk=event.pk)
 
 
 @login_required
 def path_event_leave(request, pk):
-    """Leave an event. POST only."""
+    """Leave an event (or its waitlist); a freed place goes to the waitlist. POST only."""
     if request.method != 'POST':
         return redirect('path_event_detail', pk=pk)
     if request.user.is_staff:
         event = get_object_or_404(PathEvent, pk=pk)
     else:
         event = get_object_or_404(PathEvent, pk=pk, is_published=True)
-    event.registrations.filter(user=request.user).delete()
+    registrations.leave(event, request.user)
     messages.success(request, "You've left this event.")
     return redirect('path_event_detail', pk=event.pk)
 
@@ -478,20 +428,24 @@ def is_deanna(user):
     """Check if user is DeAnna (staff)"""
     return user.is_authenticated and user.is_staff
 
+@cache_anonymous
 def diary_list(request):
     """List all diary pages - only DeAnna can see drafts, public pages visible to all"""
     if not request.user.is_authenticated:
         # Show only public pages to non-authenticated users
-        pages = DiaryPage.objects.filter(status='public').order_by('-created_at')
+        pages = DiaryPage.objects.filter(status='public')
     elif request.user.is_staff:
         # DeAnna/staff can see all pages
-        pages = DiaryPage.objects.all().order_by('-created_at')
+        pages = DiaryPage.objects.all()
     else:
         # Regular users see only public pages
-        pages = DiaryPage.objects.filter(status='public').order_by('-created_at')
-    
-    return render(request, 'entries/diary_list.html', {'pages': pages})
+        pages = DiaryPage.objects.filter(status='public')
 
+    page = cursor_paginate(request, pages.only(*DIARY_CARD_FIELDS))
+    return render(request, 'entries/diary_list.html', {'pages': page, 'page': page})
+
+@conditional_detail(DiaryPage, ('diary_comments', 'created_at'))
+@cache_anonymous
 def diary_page_detail(request, pk):
     """View individual diary page. Public pages show comments; any logged-in user can comment."""
     page = get_object_or_404(DiaryPage, pk=pk)
@@ -499,7 +453,7 @@ def diary_page_detail(request, pk):
     if page.status == 'draft' and not request.user.is_staff:
         return HttpResponseForbidden("This page is private.")
 
-    comments = page.diary_comments.all()
+    comments = list(page.diary_comments.select_related('author').only('page', *COMMENT_FIELDS))
     comment_form = None
     if request.user.is_authenticated and (page.status == 'public' or request.user.is_staff):
         comment_form = DiaryCommentForm()
@@ -519,7 +473,7 @@ def diary_page_detail(request, pk):
         return render(request, 'entries/diary_page_detail.html', {
             'page': page,
             'comments': comments,
-            'comment_count': comments.count(),
+            'comment_count': len(comments),
             'comment_form': comment_form,
         })
     return HttpResponseForbidden("You don't have permission to view this page.")
@@ -564,11 +518,45 @@ def diary_page_delete(request, pk):
     return render(request, 'entries/diary_page_confirm_delete.html', {'page': page})
 
 
+# ---- Search ----
+
+def search_view(request):
+    """Ranked full-text search across stories, path events and diary pages."""
+    query = request.GET.get('q', '').strip()
+    limit = settings.SEARCH_RESULTS_PER_TYPE
+
+    if request.user.is_staff:
+        entries = JournalEntry.objects.all()
+        events = PathEvent.objects.all()
+        pages = DiaryPage.objects.all()
+    else:
+        if request.user.is_authenticated:
+            entries = JournalEntry.objects.filter(Q(is_published=True) | Q(author=request.user))
+        else:
+            entries = JournalEntry.objects.filter(is_published=True)
+        events = PathEvent.objects.filter(is_published=True)
+        pages = DiaryPage.objects.filter(status='public')
+
+    results = {}
+    if query:
+        results = {
+            'entries': list(search.search(entries.only(*ENTRY_CARD_FIELDS), query)[:limit]),
+            'events': list(search.search(events.only(*EVENT_CARD_FIELDS), query)[:limit]),
+            'pages': list(search.search(pages.only(*DIARY_CARD_FIELDS), query)[:limit]),
+        }
+    return render(request, 'entries/search.html', {
+        'query': query,
+        'results': results,
+        'has_results': any(results.values()),
+    })
+
+
 # ---- About page (public view; staff only edit) ----
 
+@cache_anonymous
 def about_page(request):
     """About page. Everyone can view; only staff can edit content."""
-    about, _ = AboutPage.objects.get_or_create(pk=1, defaults={'content': ''})
+    about = AboutPage.load()
     form = None
     if request.user.is_staff:
         form = AboutPageForm(instance=about)
@@ -583,10 +571,40 @@ def about_page(request):
 
 # ---- Media Library (staff only) ----
 
+def filter_media_items(request):
+    """
+    Media library rows narrowed by ?type=, ?uploader= (user id) and ?from= / ?to=
+    (YYYY-MM-DD, inclusive). Returns the queryset and the filters that applied.
+    """
+    items = MediaItem.objects.select_related('uploaded_by')
+    filters = {}
+    file_type = request.GET.get('type', '')
+    if file_type in dict(MediaItem.FILE_TYPE_CHOICES):
+        items = items.filter(file_type=file_type)
+        filters['type'] = file_type
+    uploader = request.GET.get('uploader', '')
+    if uploader.isdigit():
+        items = items.filter(uploaded_by_id=int(uploader))
+        filters['uploader'] = uploader
+    for param in ('from', 'to'):
+        try:
+            day = parse_date(request.GET.get(param, ''))
+        except ValueError:
+            day = None
+        if day is None:
+            continue
+        # Compare against datetimes (not created_at__date) so the created_at index is usable.
+        if param == 'from':
+            items = items.filter(created_at__gte=timezone.make_aware(datetime.combine(day, time.min)))
+        else:
+            items = items.filter(created_at__lt=timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min)))
+        filters[param] = day.isoformat()
+    return items, filters
+
+
 @user_passes_test(is_admin)
 def media_library(request):
-    """List all media items and show upload form."""
-    items = MediaItem.objects.all()
+    """Browse media items a page at a time (with filters) and show upload form."""
     if request.method == 'POST':
         form = MediaItemForm(request.POST, request.FILES)
         if form.is_valid():
@@ -595,9 +613,56 @@ def media_library(request):
             item.save()
             messages.success(request, 'File uploaded.')
             return redirect('media_library')
-        return render(request, 'entries/media_library.html', {'items': items, 'form': form})
-    form = MediaItemForm()
-    return render(request, 'entries/media_library.html', {'items': items, 'form': form})
+    else:
+        form = MediaItemForm()
+    items, filters = filter_media_items(request)
+    page = cursor_paginate(request, items)
+    filter_query = urlencode(filters)
+    next_url = ''
+    if page.has_older:
+        next_url = reverse('media_library_json') + '?' + urlencode({**filters, 'before': page.older_cursor})
+    return render(request, 'entries/media_library.html', {
+        'items': page,
+        'page': page,
+        'form': form,
+        'filters': filters,
+        'filter_query': filter_query,
+        'next_url': next_url,
+        'file_type_choices': MediaItem.FILE_TYPE_CHOICES,
+        'uploaders': get_user_model().objects.filter(media_uploads__isnull=False).distinct().order_by('username').only('id', 'username'),
+        'chunk_size': settings.MEDIA_UPLOAD_CHUNK_SIZE,
+    })
+
+
+@user_passes_test(is_admin)
+def media_library_json(request):
+    """The next page of media cards for infinite scroll (same filters and cursors as the library page)."""
+    items, filters = filter_media_items(request)
+    page = cursor_paginate(request, items)
+    next_url = None
+    if page.has_older:
+        next_url = reverse('media_library_json') + '?' + urlencode({**filters, 'before': page.older_cursor})
+    return JsonResponse({
+        'items': [
+            {
+                'id': item.pk,
+                'title': str(item),
+                'url': item.file.url,
+                'preview_url': item.preview_url,
+                'file_type': item.file_type,
+                'mime_type': item.mime_type,
+                'file_size': item.file_size,
+                'width': item.width,
+                'height': item.height,
+                'duration': item.duration,
+                'uploaded_by': item.uploaded_by.username,
+                'created_at': item.created_at.isoformat(),
+                'html': render_to_string('entries/_media_card.html', {'item': item}, request=request),
+            }
+            for item in page
+        ],
+        'next': next_url,
+    })
 
 
 @user_passes_test(is_admin)
@@ -609,3 +674,62 @@ def media_delete(request, pk):
         messages.success(request, 'Media item deleted.')
         return redirect('media_library')
     return redirect('media_library')
+
+
+@user_passes_test(is_admin)
+def media_upload_start(request):
+    """Open a resumable upload (see entries/uploads.py for the protocol)."""
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    try:
+        data = json.loads(request.body)
+        size = int(data['size'])
+        filename = os.path.basename(str(data['filename']).replace('\\', '/'))[:255]
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': 'filename and size are required.'}, status=400)
+    if not filename or size <= 0:
+        return JsonResponse({'error': 'filename and size are required.'}, status=400)
+    if size > settings.MEDIA_UPLOAD_MAX_SIZE:
+        return JsonResponse({'error': 'File is too large.'}, status=413)
+    session = UploadSession.objects.create(
+        uploaded_by=request.user,
+        filename=filename,
+        title=str(data.get('title') or '')[:255],
+        size=size,
+    )
+    return JsonResponse(uploads.describe(session), status=201)
+
+
+@user_passes_test(is_admin)
+def media_upload_chunk(request, upload_id):
+    """Report progress (GET), append a chunk (PATCH) or abandon (DELETE) an upload."""
+    session = get_object_or_404(UploadSession, pk=upload_id, uploaded_by=request.user)
+    if request.method in ('GET', 'HEAD'):
+        response = JsonResponse(uploads.describe(session))
+    elif request.method == 'DELETE':
+        uploads.discard(session)
+        return HttpResponse(status=204)
+    elif request.method == 'PATCH':
+        try:
+            offset = int(request.headers['Upload-Offset'])
+            length = int(request.headers['Content-Length'])
+        except (KeyError, ValueError):
+            return JsonResponse({'error': 'Upload-Offset and Content-Length are required.'}, status=400)
+        try:
+            uploads.append_chunk(session, request, offset, length)
+        except uploads.OffsetMismatch:
+            response = JsonResponse(uploads.describe(session), status=409)
+            response['Upload-Offset'] = str(session.offset)
+            return response
+        except ValueError:
+            return JsonResponse({'error': 'Chunk is too large.'}, status=413)
+        response = JsonResponse(uploads.describe(session))
+        if session.is_complete:
+            item = uploads.finish(session)
+            messages.success(request, 'File uploaded.')
+            response = JsonResponse({'offset': session.size, 'size': session.size, 'item': item.pk})
+    else:
+        return HttpResponseNotAllowed(['GET', 'HEAD', 'PATCH', 'DELETE'])
+    response['Upload-Offset'] = str(session.offset)
+    response['Cache-Control'] = 'no-store'
+    return response
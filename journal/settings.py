@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/6.0/ref/settings/
 
 from pathlib import Path
 import os
+import tempfile
 
 # Load .env so DATABASE_URL is set when running manage.py locally (migrate, createsuperuser)
 try:
@@ -118,6 +119,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'entries.timing.RequestTimingMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -125,6 +127,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'entries.profiling.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'journal.urls'
@@ -144,6 +147,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'entries.context_processors.about',
             ],
         },
     },
@@ -166,6 +170,16 @@ else:
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': BASE_DIR / 'db.sqlite3',
+            # Transactions take the write lock up front (BEGIN IMMEDIATE) and wait up
+            # to `timeout` seconds for it, instead of failing with "database is
+            # locked" when two requests try to upgrade a read lock at the same time.
+            'OPTIONS': {'transaction_mode': 'IMMEDIATE', 'timeout': 20},
+            # A file, not the default shared in-memory database, so tests see the
+            # same locking as the server (shared-cache tables don't wait, they fail).
+            # Kept in the temp directory, out of the checkout.
+            'TEST': {'NAME': os.environ.get(
+                'SQLITE_TEST_NAME', os.path.join(tempfile.gettempdir(), 'medefino-test.sqlite3'),
+            )},
         }
     }
 
@@ -212,3 +226,73 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = '/media/'
 _media_volume = os.environ.get('RAILWAY_VOLUME_MOUNT_PATH')
 MEDIA_ROOT = Path(_media_volume) / 'media' if _media_volume else BASE_DIR / 'media'
+
+# Uploads are stored once per unique content and reference-counted (entries/storage.py)
+STORAGES = {
+    'default': {
+        'BACKEND': 'entries.storage.ContentAddressedStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
+
+# Journal / diary list pagination (keyset cursors on created_at, id)
+LIST_PAGE_SIZE = int(os.environ.get('LIST_PAGE_SIZE', '20'))
+LIST_MAX_PAGE_SIZE = int(os.environ.get('LIST_MAX_PAGE_SIZE', '100'))
+
+# Full-text search (/search/): max results shown per content type
+SEARCH_RESULTS_PER_TYPE = int(os.environ.get('SEARCH_RESULTS_PER_TYPE', '20'))
+
+# Media serving (entries/media.py): browser cache lifetime for uploads outside
+# blobs/ (blob files never change and are cached for a year). Behind nginx, set
+# MEDIA_ACCEL_REDIRECT_PREFIX (e.g. /protected-media/) to hand file transfer to it.
+MEDIA_CACHE_MAX_AGE = int(os.environ.get('MEDIA_CACHE_MAX_AGE', '3600'))
+MEDIA_ACCEL_REDIRECT_PREFIX = os.environ.get('MEDIA_ACCEL_REDIRECT_PREFIX', '')
+
+# Resumable media library uploads (entries/uploads.py)
+MEDIA_UPLOAD_CHUNK_SIZE = int(os.environ.get('MEDIA_UPLOAD_CHUNK_SIZE', str(8 * 1024 * 1024)))
+MEDIA_UPLOAD_MAX_SIZE = int(os.environ.get('MEDIA_UPLOAD_MAX_SIZE', str(2 * 1024 * 1024 * 1024)))
+
+# Caching. The default file-based cache is shared by all gunicorn workers on a
+# machine and needs no Redis; set CACHE_DIR to put it on the volume.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('CACHE_DIR', os.path.join(tempfile.gettempdir(), 'medefino-cache')),
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+    # Card fragments are keyed by row id + updated_at (+ the counters they show),
+    # so they never need invalidating and a fast per-process cache is enough.
+    'fragments': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'card-fragments',
+        'OPTIONS': {'MAX_ENTRIES': 2000},
+    },
+}
+
+# Anonymous page cache (entries/page_cache.py); 0 disables it
+PAGE_CACHE_ALIAS = 'default'
+PAGE_CACHE_TIMEOUT = int(os.environ.get('PAGE_CACHE_TIMEOUT', '600'))
+
+# Request timing (entries/timing.py): Server-Timing headers, slow-request log and
+# per-view aggregates. Off unless REQUEST_TIMING=True.
+REQUEST_TIMING = os.environ.get('REQUEST_TIMING', 'False') == 'True'
+REQUEST_TIMING_SLOW_MS = int(os.environ.get('REQUEST_TIMING_SLOW_MS', '1000'))
+REQUEST_TIMING_REPORT_INTERVAL = int(os.environ.get('REQUEST_TIMING_REPORT_INTERVAL', '300'))  # seconds; 0 = never
+REQUEST_TIMING_PUBLIC_HEADER = os.environ.get('REQUEST_TIMING_PUBLIC_HEADER', 'False') == 'True'  # else staff only
+
+# Staff-only per-request profiling (?_profile=1, see entries/profiling.py)
+REQUEST_PROFILING = os.environ.get('REQUEST_PROFILING', 'True') == 'True'
+REQUEST_PROFILING_LIMIT = int(os.environ.get('REQUEST_PROFILING_LIMIT', '60'))  # rows per report section
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'entries.timing': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}
@@ -15,10 +15,10 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path
+from django.urls import path, re_path
 from django.conf import settings
 from django.conf.urls.static import static
-from entries import views
+from entries import views, media
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -45,17 +45,24 @@ urlpatterns = [
     path('deannas-diary/new/', views.diary_page_create, name='diary_page_create'),
     path('deannas-diary/<int:pk>/edit/', views.diary_page_edit, name='diary_page_edit'),
     path('deannas-diary/<int:pk>/delete/', views.diary_page_delete, name='diary_page_delete'),
+    path('search/', views.search_view, name='search'),
     path('about/', views.about_page, name='about_page'),
     path('media/', views.media_library, name='media_library'),
+    path('media/items.json', views.media_library_json, name='media_library_json'),
     path('media/<int:pk>/delete/', views.media_delete, name='media_delete'),
+    path('media/uploads/', views.media_upload_start, name='media_upload_start'),
+    path('media/uploads/<uuid:upload_id>/', views.media_upload_chunk, name='media_upload_chunk'),
 ]
 
 # Serve static and media files
 if settings.DEBUG:
     urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
 else:
     # In production, static files should be served by web server (Nginx, etc.)
     # But we'll serve them via Django for Railway
     urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+
+# Uploads go through entries.media so images can be negotiated to WebP/AVIF
+urlpatterns += [
+    re_path(r'^%s(?P<path>.+)$' % settings.MEDIA_URL.lstrip('/'), media.serve_media, name='media_file'),
+]